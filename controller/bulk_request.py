@@ -0,0 +1,149 @@
+from PyQt5 import QtWidgets, QtCore
+from ui.bulk_request import Ui_BulkRequestDialog
+import logging
+import resource_rc  # Used for loading images
+
+from library.api_handler import ApiHandler
+from library.api_worker import ApiWorker
+from library.webhook_listener import WebhookListener
+from library.bulk_proof_request import BulkProofRequest
+from library.schema_catalog import SchemaCatalog
+
+
+class BulkRequest(QtWidgets.QDialog, Ui_BulkRequestDialog):
+    def __init__(self, api_instance: ApiHandler, schemas: SchemaCatalog, parent=None, webhooks: WebhookListener = None):
+        """
+        Bulk request dialog class constructor, sends a proof request to a selection (cohort) of patients at once
+        :param api_instance: The ApiHandler instance
+        :param schemas: The catalog of the record types that can be requested
+        :param parent: Not used, can be left empty
+        :param webhooks: The WebhookListener instance, used to count the received presentations of the job (optional)
+        """
+        QtWidgets.QDialog.__init__(self, parent)
+        self.setupUi(self)
+        self.api = api_instance
+        self.schemas = schemas
+        self.job = None
+        self.sent = 0
+        self.failed = 0
+        self.received = set()
+        # Execute the ApiHandler calls in the background
+        self.worker = ApiWorker(self.api, self)
+        self.worker.busyChanged.connect(self.__onWorkerBusyChanged)
+        self.recordTypeBox.addItems(self.schemas.keys())
+        self.__fillPatientList()
+
+        # Set handlers
+        self.filterEdit.textChanged.connect(self.__filterPatients)
+        self.selectAllBox.toggled.connect(self.__selectAllPatients)
+        self.sendBtn.clicked.connect(self.__sendButtonHandler)
+        # Count the received presentations of the sent proof requests
+        self.webhooks = webhooks
+        if webhooks is not None:
+            webhooks.presentProofEvent.connect(self.__onPresentProofEvent)
+
+    def __onWorkerBusyChanged(self, busy: bool):
+        if busy:
+            self.setCursor(QtCore.Qt.BusyCursor)
+        else:
+            self.unsetCursor()
+
+    def done(self, result: int):
+        # The listener outlives the dialog, stop receiving its events once the dialog is closed
+        if self.webhooks is not None:
+            self.webhooks.presentProofEvent.disconnect(self.__onPresentProofEvent)
+            self.webhooks = None
+        super(BulkRequest, self).done(result)
+
+    def reject(self):
+        # Stop sending the proof requests when the dialog is closed
+        if self.job is not None:
+            self.job.cancel()
+        super(BulkRequest, self).reject()
+
+    def __fillPatientList(self):
+        # The active connections are added to the list while they are being received
+        self.patientList.clear()
+        self.worker.stream("iter_connections", state="active", chunk_callback=self.__addPatients, key="patients")
+
+    def __addPatients(self, connections: list):
+        for connection in connections:
+            item = QtWidgets.QListWidgetItem(connection.get("alias", ""))
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Checked if self.selectAllBox.isChecked() else QtCore.Qt.Unchecked)
+            item.setData(QtCore.Qt.UserRole, connection["connection_id"])
+            item.setHidden(not self.__matchesFilter(item))
+            self.patientList.addItem(item)
+
+    def __matchesFilter(self, item: QtWidgets.QListWidgetItem) -> bool:
+        return self.filterEdit.text().lower() in item.text().lower()
+
+    def __filterPatients(self, text: str):
+        for i in range(self.patientList.count()):
+            item = self.patientList.item(i)
+            item.setHidden(not self.__matchesFilter(item))
+
+    def __selectAllPatients(self, checked: bool):
+        # Only the patients that match the filter are (de)selected
+        for i in range(self.patientList.count()):
+            item = self.patientList.item(i)
+            if not item.isHidden():
+                item.setCheckState(QtCore.Qt.Checked if checked else QtCore.Qt.Unchecked)
+
+    def __showStatus(self, text: str, error: bool = False):
+        self.statusLabel.setStyleSheet("color: rgb(255, 0, 0);" if error else "")
+        self.statusLabel.setText(text)
+
+    def __sendButtonHandler(self):
+        logging.info("Clicked on send bulk request button")
+        record_type = self.recordTypeBox.currentText()
+        if self.recordTypeBox.currentIndex() == 0:
+            self.__showStatus("Er is geen type geselecteerd", error=True)
+            return
+        conn_ids = [self.patientList.item(i).data(QtCore.Qt.UserRole) for i in range(self.patientList.count())
+                    if self.patientList.item(i).checkState() == QtCore.Qt.Checked]
+        if not conn_ids:
+            self.__showStatus("Er zijn geen patiënten geselecteerd", error=True)
+            return
+        # The proof request is serialized once for every patient
+        self.job = BulkProofRequest(
+            self.api,
+            name=record_type,
+            requested_attributes=self.schemas.requested_attributes(record_type),
+            comment=self.reasonInput.text() or "Geen reden opgegeven",
+            max_workers=self.concurrencyBox.value()
+        )
+        self.sent = 0
+        self.failed = 0
+        self.received = set()
+        self.sendBtn.setEnabled(False)
+        self.progressBar.setMaximum(len(conn_ids))
+        self.progressBar.setValue(0)
+        self.__showStatus(f"Verzoeken worden verstuurd naar {len(conn_ids)} patiënt(en)...")
+        self.worker.stream(self.job.iter_run, conn_ids, chunk_callback=self.__onProgress, callback=self.__onSent,
+                           error_callback=lambda e: self.__onSent(None), key="send", chunk_size=5)
+
+    def __onProgress(self, outcomes: list):
+        for outcome in outcomes:
+            if outcome["sent"]:
+                self.sent += 1
+            else:
+                self.failed += 1
+        self.progressBar.setValue(self.sent + self.failed)
+
+    def __onSent(self, total):
+        self.sendBtn.setEnabled(True)
+        if total is None:
+            self.__showStatus("De verzoeken konden niet worden verstuurd", error=True)
+            return
+        text = f"{self.sent} van de {total} verzoek(en) verstuurd"
+        if self.failed:
+            text += f", {self.failed} mislukt"
+        self.__showStatus(text, error=bool(self.failed))
+
+    def __onPresentProofEvent(self, record: dict):
+        if self.job is None or record.get("state") not in ("presentation_received", "verified"):
+            return
+        if record.get("presentation_exchange_id") in self.job.pres_ex_ids.values():
+            self.received.add(record["presentation_exchange_id"])
+            self.__showStatus(f"{self.sent} verzoek(en) verstuurd, {len(self.received)} ontvangen")
@@ -5,52 +5,85 @@ import logging
 import resource_rc  # Used for loading images
 
 from library.api_handler import ApiHandler
+from library.api_worker import ApiWorker
+from library.webhook_listener import WebhookListener
+from library.table_models import TableModel, TableFilterModel, ButtonDelegate, Column, setupTableView
 
 
 class Connections(QtWidgets.QDialog, Ui_PendingConnectionsDialog):
-    def __init__(self, api_instance: ApiHandler, parent=None):
+    def __init__(self, api_instance: ApiHandler, parent=None, webhooks: WebhookListener = None):
         """
         Connections dialog class constructor
         :param api_instance: The ApiHandler instance
         :param parent: Not used, can be left empty
+        :param webhooks: The WebhookListener instance, the table is refreshed on connection events (optional)
         """
         QtWidgets.QDialog.__init__(self, parent)
         self.setupUi(self)
         self.api = api_instance
-        # Resize section
-        header = self.tableWidget.horizontalHeader()
-        for i in range(3):
-            header.setSectionResizeMode(i, QtWidgets.QHeaderView.Stretch)
-        header.setSectionResizeMode(3, QtWidgets.QHeaderView.ResizeToContents)
+        # Execute the ApiHandler calls in the background
+        self.worker = ApiWorker(self.api, self)
+        self.worker.busyChanged.connect(self.__onWorkerBusyChanged)
         # Load icon
         self.icon = QtGui.QIcon()
         self.icon.addPixmap(QtGui.QPixmap(":/images/img/remove.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
+        # Table model, only the visible rows are painted
+        self.model = TableModel([
+            Column("Naam", lambda c: " ".join(c["alias"].split(" ")[:-1])),
+            Column("BSN", lambda c: ApiHandler.bsn_from_alias(c["alias"]) or ""),
+            Column("Aangemaakt op", lambda c: self.__formatDate(c["created_at"]), sort=lambda c: c["created_at"]),
+            Column("Verwijderen", lambda c: "Verwijder", sort=lambda c: "", button=lambda c: True),
+        ], key=lambda c: c["connection_id"], parent=self)
+        self.proxy = TableFilterModel(self.model, self)
+        setupTableView(self.tableView, self.proxy, stretch=(0, 1, 2))
+        self.tableView.horizontalHeader().resizeSection(3, 120)
+        self.tableView.sortByColumn(2, QtCore.Qt.DescendingOrder)
+        self.delegate = ButtonDelegate(self.icon, self.tableView)
+        self.delegate.clicked.connect(self.__removeButtonHandler)
+        self.tableView.setItemDelegateForColumn(3, self.delegate)
+        self.filterEdit.textChanged.connect(self.proxy.setFilterFixedString)
         self.__fillTable()
+        # Refresh the table when a connection changes state
+        self.webhooks = webhooks
+        if webhooks is not None:
+            webhooks.connectionEvent.connect(self.__onConnectionEvent)
 
-    def __removeButtonHandler(self, connection_id):
+    def __onWorkerBusyChanged(self, busy: bool):
+        if busy:
+            self.setCursor(QtCore.Qt.BusyCursor)
+        else:
+            self.unsetCursor()
+
+    def done(self, result: int):
+        # The listener outlives the dialog, stop receiving its events once the dialog is closed
+        if self.webhooks is not None:
+            self.webhooks.connectionEvent.disconnect(self.__onConnectionEvent)
+            self.webhooks = None
+        super(Connections, self).done(result)
+
+    def __onConnectionEvent(self, connection: dict):
+        # Only invitations that are accepted or removed change the pending connections
+        if connection.get("state") != "invitation":
+            self.__fillTable()
+
+    @staticmethod
+    def __formatDate(created_at: str) -> str:
+        return datetime.fromisoformat(created_at).strftime("%d %B %Y om %H:%M")
+
+    def __removeButtonHandler(self, connection: dict):
         logging.info("Clicked on removeButtonHandler")
-        self.api.delete_connection(connection_id)
-        button = self.sender()
-        if button:
-            row = self.tableWidget.indexAt(button.pos()).row()
-            self.tableWidget.removeRow(row)
+        conn_id = connection["connection_id"]
+        self.model.setRowEnabled(conn_id, False)
+        self.worker.run("delete_connection", conn_id, callback=lambda deleted: self.__removeRow(conn_id, deleted),
+                        error_callback=lambda e: self.__removeRow(conn_id, False))
+
+    def __removeRow(self, conn_id: str, deleted: bool):
+        if deleted:
+            self.model.removeRowByKey(conn_id)
+        else:
+            self.model.setRowEnabled(conn_id, True)
 
     def __fillTable(self):
-        pending = self.api.get_pending_connections()
-        self.tableWidget.setRowCount(len(pending))
-        for i, connection in enumerate(pending):
-            btn = QtWidgets.QPushButton(self.tableWidget)
-            btn.setMinimumSize(QtCore.QSize(0, 27))
-            btn.setText("Verwijder")
-            btn.setIcon(self.icon)
-            btn.clicked.connect(lambda: self.__removeButtonHandler(connection["connection_id"]))
-            alias = " ".join(connection["alias"].split(" ")[:2])
-            bsn = connection["alias"].split(" ")[2]
-            date = datetime.fromisoformat(connection["created_at"]).strftime("%d %B %Y om %H:%M")
-            # Fill the table
-            self.tableWidget.setItem(i, 0, QtWidgets.QTableWidgetItem(alias))
-            self.tableWidget.setItem(i, 1, QtWidgets.QTableWidgetItem(bsn))
-            self.tableWidget.setItem(i, 2, QtWidgets.QTableWidgetItem(date))
-            self.tableWidget.setCellWidget(i, 3, btn)
-        self.tableWidget.resizeColumnsToContents()
-        self.tableWidget.viewport().update()
+        # The pending connections are added to the table while they are being received
+        if self.worker.stream("iter_pending_connections", chunk_callback=self.model.appendRows, key="pending"):
+            self.model.setRows([])
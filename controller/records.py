@@ -5,69 +5,98 @@ import logging
 import resource_rc  # Used for loading images
 
 from library.api_handler import ApiHandler
+from library.api_worker import ApiWorker
+from library.webhook_listener import WebhookListener
+from library.table_models import TableModel, TableFilterModel, ButtonDelegate, Column, setupTableView
 
 
 class Records(QtWidgets.QDialog, Ui_PendingRecordsDialog):
-    def __init__(self, api_instance: ApiHandler, parent=None):
+    def __init__(self, api_instance: ApiHandler, parent=None, webhooks: WebhookListener = None):
         """
         Records dialog class constructor
         :param api_instance: The ApiHandler instance
         :param parent: Not used, can be left empty
+        :param webhooks: The WebhookListener instance, the table is refreshed on present proof events (optional)
         """
         QtWidgets.QDialog.__init__(self, parent)
         self.setupUi(self)
         self.api = api_instance
-        # Resize headers section
-        header = self.tableWidget.horizontalHeader()
-        for i in range(3):
-            header.setSectionResizeMode(i, QtWidgets.QHeaderView.Stretch)
-        header.setSectionResizeMode(3, QtWidgets.QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(4, QtWidgets.QHeaderView.ResizeToContents)
+        # Execute the ApiHandler calls in the background
+        self.worker = ApiWorker(self.api, self)
+        self.worker.busyChanged.connect(self.__onWorkerBusyChanged)
         # Load icon
         self.icon = QtGui.QIcon()
         self.icon.addPixmap(QtGui.QPixmap(":/images/img/check.png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
+        # Table model, only the visible rows are painted
+        self.model = TableModel([
+            Column("Naam", lambda r: r["name"]),
+            Column("BSN", lambda r: r["bsn"] or ""),
+            Column("Type", lambda r: r["type"]),
+            Column("Aangemaakt op", lambda r: self.__formatDate(r["created_at"]), sort=lambda r: r["created_at"]),
+            Column("Status", lambda r: "Verifieer" if r["state"] == "presentation_received" else "Verzoek verstuurd",
+                   sort=lambda r: int(r["state"] != "presentation_received"),
+                   button=lambda r: r["state"] == "presentation_received"),
+        ], key=lambda r: r["pres_ex_id"], parent=self)
+        self.proxy = TableFilterModel(self.model, self)
+        setupTableView(self.tableView, self.proxy, stretch=(0, 1, 2, 3))
+        self.tableView.horizontalHeader().resizeSection(4, 140)
+        # The received presentations first
+        self.tableView.sortByColumn(4, QtCore.Qt.AscendingOrder)
+        self.delegate = ButtonDelegate(self.icon, self.tableView)
+        self.delegate.clicked.connect(self.__verifyButtonHandler)
+        self.tableView.setItemDelegateForColumn(4, self.delegate)
+        self.filterEdit.textChanged.connect(self.proxy.setFilterFixedString)
         # Fill the table widget with proof records
         self.__fillTable()
 
         # Set handler for refresh button
         self.refreshBtn.clicked.connect(self.__refreshButtonHandler)
+        # Refresh the table when a presentation is received
+        self.webhooks = webhooks
+        if webhooks is not None:
+            webhooks.presentProofEvent.connect(self.__onPresentProofEvent)
+
+    def __onWorkerBusyChanged(self, busy: bool):
+        if busy:
+            self.setCursor(QtCore.Qt.BusyCursor)
+        else:
+            self.unsetCursor()
+
+    def done(self, result: int):
+        # The listener outlives the dialog, stop receiving its events once the dialog is closed
+        if self.webhooks is not None:
+            self.webhooks.presentProofEvent.disconnect(self.__onPresentProofEvent)
+            self.webhooks = None
+        super(Records, self).done(result)
+
+    def __onPresentProofEvent(self, record: dict):
+        if record.get("state") in ("presentation_received", "request_sent", "verified"):
+            self.__fillTable()
 
     def __refreshButtonHandler(self):
         logging.info("Clicked on refresh button")
         self.__fillTable()
 
-    def __verifyButtonHandler(self, presentation_exchange_id: str):
-        logging.info("Clicked on removeButtonHandler")
-        response = self.api.verify_presentation(presentation_exchange_id)
-        button = self.sender()
-        if button:
-            row = self.tableWidget.indexAt(button.pos()).row()
-            self.tableWidget.removeRow(row)
+    @staticmethod
+    def __formatDate(created_at: str) -> str:
+        return datetime.fromisoformat(created_at).strftime("%d %B %Y om %H:%M")
+
+    def __verifyButtonHandler(self, record: dict):
+        logging.info("Clicked on verifyButtonHandler")
+        pres_ex_id = record["pres_ex_id"]
+        self.model.setRowEnabled(pres_ex_id, False)
+        self.worker.run("verify_presentation", pres_ex_id,
+                        callback=lambda response: self.model.removeRowByKey(pres_ex_id),
+                        error_callback=lambda e: self.model.setRowEnabled(pres_ex_id, True))
 
     def __fillTable(self):
-        all_records = []
-        [all_records.append(i) for i in self.api.get_proof_records(state="presentation_received")]
-        [all_records.append(i) for i in self.api.get_proof_records(state="request_sent")]
-        self.tableWidget.setRowCount(len(all_records))
-        # Fill the table with the received presentations first
-        for i, item in enumerate(all_records):
-            alias = self.api.get_alias_by_conn_id(conn_id=item["connection_id"])
-            if alias is None:
-                continue
-            if item["state"] == "presentation_received":
-                btn = QtWidgets.QPushButton(self.tableWidget)
-                btn.setMinimumSize(QtCore.QSize(0, 27))
-                btn.setText("Verifieer")
-                btn.setIcon(self.icon)
-                btn.clicked.connect(lambda: self.__verifyButtonHandler(item["pres_ex_id"]))
-                self.tableWidget.setCellWidget(i, 4, btn)
-            else:
-                self.tableWidget.setItem(i, 4, QtWidgets.QTableWidgetItem("Verzoek verstuurd"))
-            name = " ".join(alias.split(" ")[:2])
-            bsn = alias.split(" ")[2]
-            date = datetime.fromisoformat(item["created_at"]).strftime("%d %B %Y om %H:%M")
-            # Fill the table
-            self.tableWidget.setItem(i, 0, QtWidgets.QTableWidgetItem(name))
-            self.tableWidget.setItem(i, 1, QtWidgets.QTableWidgetItem(bsn))
-            self.tableWidget.setItem(i, 2, QtWidgets.QTableWidgetItem(item["type"]))
-            self.tableWidget.setItem(i, 3, QtWidgets.QTableWidgetItem(date))
+        # Show the loading state until the records are received
+        self.refreshBtn.setEnabled(False)
+        self.tableView.setEnabled(False)
+        self.worker.run("get_pending_work", callback=self.__showRecords,
+                        error_callback=lambda e: self.__showRecords([]), key="records")
+
+    def __showRecords(self, records: list):
+        self.refreshBtn.setEnabled(True)
+        self.tableView.setEnabled(True)
+        self.model.setRows(records)
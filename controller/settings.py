@@ -1,7 +1,13 @@
-from PyQt5 import QtWidgets
+from PyQt5 import QtWidgets, QtCore
 from ui.settings import Ui_SettingsDialog
+import logging
 
 from library.api_handler import ApiHandler
+from library.api_worker import ApiWorker
+from library.table_models import TableModel, TableFilterModel, Column, setupTableView
+
+# The amount of milliseconds between the refreshes of the diagnostics table
+metrics_refresh_interval = 2000
 
 
 class Settings(QtWidgets.QDialog, Ui_SettingsDialog):
@@ -14,12 +20,48 @@ class Settings(QtWidgets.QDialog, Ui_SettingsDialog):
         QtWidgets.QDialog.__init__(self, parent)
         self.setupUi(self)
         self.api = api_instance
+        # Execute the ApiHandler calls in the background
+        self.worker = ApiWorker(self.api, self)
         self.__setConnectionLabel()
         # Set handler for test connection button
         self.testConnectionBtn.clicked.connect(self.onTestConnectionClicked)
+        # Diagnostics table with the metrics per ACA-Py endpoint, the slowest endpoints first
+        self.metricsModel = TableModel([
+            Column("Endpoint", lambda r: r[0]),
+            Column("Aantal", lambda r: str(r[1]["calls"]), sort=lambda r: r[1]["calls"]),
+            Column("Fouten", lambda r: str(r[1]["errors"]), sort=lambda r: r[1]["errors"]),
+            Column("Gem. ms", lambda r: f"{r[1]['latency_avg_ms']:.1f}", sort=lambda r: r[1]["latency_avg_ms"]),
+            Column("p95 ms", lambda r: f"{r[1]['latency_p95_ms']:.1f}", sort=lambda r: r[1]["latency_p95_ms"]),
+            Column("Max ms", lambda r: f"{r[1]['latency_max_ms']:.1f}", sort=lambda r: r[1]["latency_max_ms"]),
+            Column("KiB", lambda r: f"{r[1]['response_bytes'] / 1024:.1f}",
+                   sort=lambda r: r[1]["response_bytes"]),
+        ], key=lambda r: r[0], parent=self)
+        self.metricsProxy = TableFilterModel(self.metricsModel, self)
+        setupTableView(self.metricsView, self.metricsProxy, row_height=24)
+        # The metrics table is small, the columns are sized to their contents
+        self.metricsView.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        self.metricsView.horizontalHeader().setStretchLastSection(True)
+        self.metricsView.sortByColumn(4, QtCore.Qt.DescendingOrder)
+        self.__refreshMetrics()
+        self.refreshMetricsBtn.clicked.connect(self.__refreshMetrics)
+        self.resetMetricsBtn.clicked.connect(self.__resetMetrics)
+        self.exportMetricsBtn.clicked.connect(self.__exportMetrics)
+        # Keep the metrics up-to-date while the dialog is open
+        self.metricsTimer = QtCore.QTimer(self)
+        self.metricsTimer.timeout.connect(self.__refreshMetrics)
+        self.metricsTimer.start(metrics_refresh_interval)
 
     def __setConnectionLabel(self):
-        if self.api.test_connection():
+        # Show the loading state until the connection has been tested
+        self.testConnectionBtn.setEnabled(False)
+        self.connstatus.setStyleSheet("")
+        self.connstatus.setText("Verbinden...")
+        self.worker.run("test_connection", callback=self.__showConnectionStatus,
+                        error_callback=lambda e: self.__showConnectionStatus(False), key="status")
+
+    def __showConnectionStatus(self, connected: bool):
+        self.testConnectionBtn.setEnabled(True)
+        if connected:
             self.connstatus.setStyleSheet("color: rgb(12, 240, 14);")
             self.connstatus.setText("Verbonden")
         else:
@@ -33,3 +75,29 @@ class Settings(QtWidgets.QDialog, Ui_SettingsDialog):
         if ip and port != 0:
             self.api.set_url(ip, port)
             self.__setConnectionLabel()
+
+    def __refreshMetrics(self):
+        snapshot = self.api.metrics.snapshot()
+        self.metricsModel.setRows(list(snapshot.items()))
+        calls = sum(metrics["calls"] for metrics in snapshot.values())
+        errors = sum(metrics["errors"] for metrics in snapshot.values())
+        self.metricsSummary.setText(f"{calls} aanroep(en), {errors} fout(en)")
+
+    def __resetMetrics(self):
+        self.api.metrics.reset()
+        self.__refreshMetrics()
+
+    def __exportMetrics(self):
+        filename, selected = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Diagnostiek exporteren", "metrics.json", "JSON (*.json);;Prometheus (*.prom)")
+        if not filename:
+            return
+        prometheus = selected.startswith("Prometheus") or filename.endswith(".prom")
+        try:
+            with open(filename, "w") as f:
+                f.write(self.api.metrics.to_prometheus() if prometheus else self.api.metrics.to_json())
+        except OSError as e:
+            logging.error(f"Unable to export the metrics: {e}")
+            QtWidgets.QMessageBox.warning(self, "Diagnostiek exporteren", f"Het bestand kon niet worden opgeslagen: {e}")
+            return
+        logging.info(f"Exported the metrics to {filename}")
@@ -0,0 +1,165 @@
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import datetime
+import logging
+import atexit
+import queue
+import copy
+import gzip
+import json
+import time
+import sys
+import os
+
+# The default log file, rotated to MNNU-Desktop.log.1.gz, MNNU-Desktop.log.2.gz, ...
+log_file = "MNNU-Desktop.log"
+
+# The log file is rotated when it grows larger than max_bytes or is older than rotate_interval seconds
+max_bytes = 5 * 1024 * 1024
+rotate_interval = 24 * 60 * 60
+backup_count = 5
+
+# The attributes of every LogRecord, the other attributes (passed using extra=) are added to the JSON record
+record_attributes = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# The running queue listener, see setup_logging
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Format a record as a single line JSON object
+        :param record: The log record
+        :return: The JSON object with: time, level, logger, thread, message, exception (optional) and the extra fields
+        """
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in record_attributes and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    def __init__(self, filename: str, max_bytes: int = max_bytes, backup_count: int = backup_count,
+                 interval: float = rotate_interval):
+        """
+        CompressedRotatingFileHandler constructor, rotates the log file on size and age, the backups are gzipped
+        :param filename: The log file
+        :param max_bytes: Rotate when the file grows larger than this amount of bytes (0 disables size based rotation)
+        :param backup_count: The amount of compressed backups to keep
+        :param interval: Rotate when the file is older than this amount of seconds (0 disables time based rotation)
+        """
+        super(CompressedRotatingFileHandler, self).__init__(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval = interval
+        # The backups are compressed, see BaseRotatingHandler.rotation_filename and rotate
+        self.namer = self.compressed_name
+        self.rotator = self.compress
+        # An existing log file is rotated once it is older than the interval
+        started = os.path.getmtime(filename) if os.path.exists(filename) and os.path.getsize(filename) else time.time()
+        self.rollover_at = started + interval
+
+    @staticmethod
+    def compressed_name(name: str) -> str:
+        """
+        Get the file name of a compressed backup (the namer of the handler)
+        :param name: The default backup file name eq. MNNU-Desktop.log.1
+        :return: The backup file name with the .gz extension
+        """
+        return f"{name}.gz"
+
+    @staticmethod
+    def compress(source: str, dest: str) -> None:
+        """
+        Compress the rotated log file into a gzipped backup and remove it (the rotator of the handler)
+        Executed by the listener thread, the UI never waits for the compression
+        :param source: The rotated log file
+        :param dest: The backup file (see compressed_name)
+        :return: None
+        """
+        if not os.path.exists(source):
+            return
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            while True:
+                chunk = f_in.read(1024 * 1024)
+                if not chunk:
+                    break
+                f_out.write(chunk)
+        os.remove(source)
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        """
+        Check if the log file needs to be rotated before the record is written
+        :param record: The log record
+        :return: True if the file is older than the interval (and not empty) or the record does not fit inside
+        max_bytes, False if not
+        """
+        if self.interval and time.time() >= self.rollover_at:
+            # An empty log file is not rotated
+            if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+                return True
+            self.rollover_at = time.time() + self.interval
+        return bool(super(CompressedRotatingFileHandler, self).shouldRollover(record))
+
+    def doRollover(self) -> None:
+        """
+        Rotate (and compress) the log file and restart the interval
+        :return: None
+        """
+        super(CompressedRotatingFileHandler, self).doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class LogQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Prepare a record for the queue, the message and traceback are formatted inside the calling thread (while
+        the arguments are unchanged) and the extra fields are kept for the JSON records
+        :param record: The log record
+        :return: The copy of the record that is put on the queue
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(filename: str = log_file, level: int = logging.INFO, console: bool = True) -> QueueListener:
+    """
+    Configure the root logger, the records are put on a queue and written by a background thread so a slow disk never
+    blocks the logging thread (eq. the UI thread)
+    The log file contains a JSON record per line and is rotated and compressed, see CompressedRotatingFileHandler
+    :param filename: The log file
+    :param level: The log level
+    :param console: Also log the messages to stdout?
+    :return: The running queue listener, it is stopped at exit (flushing the queue)
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    file_handler = CompressedRotatingFileHandler(filename)
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(LogQueueHandler(log_queue))
+    return _listener
@@ -0,0 +1,31 @@
+from PyQt5 import QtCore, QtGui
+
+
+def render_qr_image(data: str, size: int = 224, border: int = 5) -> QtGui.QImage:
+    """
+    Render a qr-code directly into a QImage, without writing (or encoding) an image file
+    NOTE: A QImage (unlike a QPixmap) can be created outside the UI thread, convert it using QPixmap.fromImage
+    :param data: The data of the qr-code (eq. the Base64 encoded invite string)
+    :param size: The width and height of the image in pixels
+    :param border: The width of the (white) border in modules
+    :return: The qr-code as a QImage
+    """
+    # Imported on first use to speed up startup
+    import qrcode
+    qr = qrcode.QRCode(version=1, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    modules = len(matrix)
+    # One byte per module (grayscale), every row is padded to a multiple of 4 bytes as required by QImage
+    stride = (modules + 3) & ~3
+    pixels = bytearray(b"\xff" * stride * modules)
+    for y, row in enumerate(matrix):
+        offset = y * stride
+        for x, dark in enumerate(row):
+            if dark:
+                pixels[offset + x] = 0
+    # copy() so the image owns its pixels instead of referencing the (temporary) buffer
+    image = QtGui.QImage(bytes(pixels), modules, modules, stride, QtGui.QImage.Format_Grayscale8).copy()
+    # Nearest neighbour scaling keeps the modules sharp
+    return image.scaled(size, size, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.FastTransformation)
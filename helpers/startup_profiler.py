@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+import logging
+import time
+
+# The time the profiler is imported, main.py imports it first so this is (almost) the process start
+start_time = time.perf_counter()
+
+
+class StartupProfiler:
+    def __init__(self, enabled: bool = False):
+        """
+        StartupProfiler constructor, measures the time spent per startup phase (--profile-startup)
+        :param enabled: Measure the phases, when disabled every method does nothing
+        """
+        self.enabled = enabled
+        self.phases = []
+        self.__last = start_time
+        self.__depth = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Measure the time spent inside a with block
+        :param name: The phase name
+        :return: Context manager
+        """
+        if not self.enabled:
+            yield
+            return
+        # Reserve the position so nested phases are reported below this phase
+        position = len(self.phases)
+        self.phases.append(None)
+        self.__depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.__depth -= 1
+            self.__last = time.perf_counter()
+            self.phases[position] = ("  " * self.__depth + name, self.__last - started)
+
+    def mark(self, name: str) -> None:
+        """
+        Measure the time spent since the previous phase or mark
+        :param name: The phase name
+        :return: None
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append(("  " * self.__depth + name, now - self.__last))
+        self.__last = now
+
+    def report(self) -> str:
+        """
+        Log the time spent per phase and the total time since the process started
+        :return: The report as a str
+        """
+        if not self.enabled:
+            return ""
+        lines = ["Startup profile:"]
+        lines += [f"  {name:<24}{duration * 1000:>8.1f} ms" for name, duration in self.phases]
+        lines.append(f"  {'total':<24}{(time.perf_counter() - start_time) * 1000:>8.1f} ms")
+        report = "\n".join(lines)
+        logging.info(report)
+        return report
+
+
+# Global profiler, enabled by main.py when the --profile-startup argument is given
+profiler = StartupProfiler()
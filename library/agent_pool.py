@@ -0,0 +1,1025 @@
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect, insort
+import threading
+import hashlib
+import logging
+from typing import Any, Callable, Iterator, Tuple, Union
+
+import requests
+
+from library.api_handler import ApiHandler
+from library.api_metrics import ApiMetrics
+from library.schema_registry import SchemaRegistry
+
+# The amount of virtual nodes per agent on the hash ring, more nodes divide the patients more evenly
+ring_replicas = 64
+
+
+class UnknownConnectionError(LookupError):
+    """
+    Raised when a connection (or presentation exchange record) does not exist on any agent of the pool
+    """
+
+
+class PartialResultError(requests.exceptions.ConnectionError):
+    """
+    Raised when one or more agents of the pool could not be reached (or failed), the result of the other agents is
+    available so callers can show it together with the unavailable agents
+    """
+
+    def __init__(self, message: str, failed: dict, result: Any = None):
+        """
+        PartialResultError constructor
+        :param message: The error message
+        :param failed: The failed agents, a dict with the agent name as key and the exception as value
+        :param result: The (merged) result of the available agents
+        """
+        super(PartialResultError, self).__init__(message)
+        self.failed = failed
+        self.result = result
+
+
+class HashRing:
+    def __init__(self, replicas: int = ring_replicas):
+        """
+        HashRing constructor, consistent hashing of keys to nodes
+        Adding or removing a node only moves the keys of that node, about 1 / {amount of nodes} of the keys
+        :param replicas: The amount of virtual nodes per node
+        """
+        self.replicas = replicas
+        # The sorted hashes of the virtual nodes and virtual node hash -> node
+        self.__hashes = []
+        self.__nodes = {}
+
+    @staticmethod
+    def hash(key: str) -> int:
+        """
+        Hash a key, stable between processes (unlike the builtin hash)
+        :param key: The key as a str
+        :return: The hash as a int
+        """
+        return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node: str) -> None:
+        """
+        Add a node to the ring
+        :param node: The name of the node
+        :return: None
+        """
+        for i in range(self.replicas):
+            key = self.hash(f"{node}#{i}")
+            if key not in self.__nodes:
+                insort(self.__hashes, key)
+                self.__nodes[key] = node
+
+    def remove(self, node: str) -> None:
+        """
+        Remove a node from the ring
+        :param node: The name of the node
+        :return: None
+        """
+        for key in [key for key, name in self.__nodes.items() if name == node]:
+            del self.__nodes[key]
+            self.__hashes.remove(key)
+
+    def get(self, key: str) -> Union[str, None]:
+        """
+        Get the node of a key, the first virtual node clockwise from the hash of the key
+        :param key: The key as a str
+        :return: The name of the node, None if the ring is empty
+        """
+        if not self.__hashes:
+            return None
+        return self.__nodes[self.__hashes[bisect(self.__hashes, self.hash(key)) % len(self.__hashes)]]
+
+
+class AgentPool:
+    # The helpers that do not depend on an agent are shared with the ApiHandler
+    format_bool = staticmethod(ApiHandler.format_bool)
+    bsn_from_alias = staticmethod(ApiHandler.bsn_from_alias)
+    build_credential_template = staticmethod(ApiHandler.build_credential_template)
+    build_proof_request_template = staticmethod(ApiHandler.build_proof_request_template)
+    format_proof_record = staticmethod(ApiHandler.format_proof_record)
+    format_verified_record = staticmethod(ApiHandler.format_verified_record)
+
+    def __init__(self, agents: dict = None, replicas: int = ring_replicas, max_workers: int = 8,
+                 metrics: ApiMetrics = None):
+        """
+        AgentPool constructor, divides the patients over several ACA-Py instances, offers the calls of the ApiHandler
+        New patients are placed on an agent using consistent hashing of their BSN, the connection and presentation
+        exchange ids are routed to the agent that owns them and the listings are retrieved from every agent
+        concurrently and merged, a PartialResultError is raised when an agent can not be reached
+        :param agents: The agents as a dict with the name as key and the ApiHandler as value (optional)
+        :param replicas: The amount of virtual nodes per agent on the hash ring
+        :param max_workers: The maximum amount of agents that are requested at the same time
+        :param metrics: The collector of the per endpoint metrics of every agent (optional, a new collector is created)
+        """
+        self.max_workers = max_workers
+        # Every agent records its requests inside the collector of the pool
+        self.metrics = metrics or ApiMetrics()
+        self.__lock = threading.RLock()
+        self.__agents = {}
+        self.__ring = HashRing(replicas)
+        # Lookup tables: patient key (BSN) -> agent, connection_id -> agent and presentation_exchange_id -> agent
+        self.__patients = {}
+        self.__connections = {}
+        self.__records = {}
+        # connection_id -> patient key, used to release the placement of a patient when its connection is deleted
+        self.__connection_patients = {}
+        self.__placements_complete = False
+        # Credential definition id of the first agent -> {agent name: credential definition id}, see
+        # create_credential_definition
+        self.__cred_defs = {}
+        self.__webhooks_active = False
+        for name, api in (agents or {}).items():
+            self.add_agent(name, api, rebalance=False)
+
+    @property
+    def agents(self) -> dict:
+        """
+        Get the agents of the pool
+        :return: A copy of the agents dict, name -> ApiHandler
+        """
+        with self.__lock:
+            return dict(self.__agents)
+
+    @staticmethod
+    def patient_key(alias: str) -> str:
+        """
+        Get the key used to place a patient, the BSN or the alias when it does not end with a BSN
+        :param alias: The alias of the connection (or a BSN)
+        :return: The key as a str
+        """
+        return ApiHandler.bsn_from_alias(alias) or alias
+
+    def add_agent(self, name: str, api: ApiHandler, rebalance: bool = True) -> dict:
+        """
+        Add an agent to the pool, the new patients of its part of the hash ring are placed on it from now on
+        :param name: The unique name of the agent
+        :param api: The ApiHandler of the agent
+        :param rebalance: Retrieve the placements of every patient afterwards? (see rebalance)
+        :return: The rebalance report (see rebalance), an empty report when rebalance is False
+        """
+        with self.__lock:
+            if name in self.__agents:
+                raise ValueError(f"The pool already contains an agent named {name}")
+            self.__agents[name] = api
+            self.__ring.add(name)
+            api.metrics = self.metrics
+            webhooks_active = self.__webhooks_active
+        if webhooks_active:
+            api.set_webhooks_active(True)
+        return self.rebalance() if rebalance else {"patients": {}, "misplaced": {}, "unavailable": []}
+
+    def remove_agent(self, name: str) -> ApiHandler:
+        """
+        Remove an agent from the pool, its patients are no longer reachable through the pool
+        :param name: The name of the agent
+        :return: The ApiHandler of the removed agent
+        """
+        with self.__lock:
+            api = self.__agents.pop(name)
+            self.__ring.remove(name)
+            self.__forget(name)
+        return api
+
+    def __forget(self, name: str) -> None:
+        """
+        Remove the connections, records and credential definitions of an agent from the lookup tables
+        :param name: The name of the agent
+        :return: None
+        """
+        with self.__lock:
+            for table in (self.__patients, self.__connections, self.__records):
+                for key in [key for key, agent in table.items() if agent == name]:
+                    del table[key]
+            for conn_id in [conn_id for conn_id in self.__connection_patients if conn_id not in self.__connections]:
+                del self.__connection_patients[conn_id]
+            for cred_def_ids in self.__cred_defs.values():
+                cred_def_ids.pop(name, None)
+
+    def set_url(self, api_url: str, port: int, pool_connections: int = None, pool_maxsize: int = None,
+                name: str = None) -> None:
+        """
+        Configure the url and port of an agent (see ApiHandler.set_url), its placements are cleared
+        :param api_url: The url as a str
+        :param port: The port as a int
+        :param pool_connections: The amount of connection pools to keep alive (optional, keeps the current value)
+        :param pool_maxsize: The maximum amount of keep-alive connections inside a pool (optional)
+        :param name: The name of the agent, can be left empty when the pool contains a single agent
+        :return: None
+        """
+        with self.__lock:
+            if name is None:
+                if len(self.__agents) != 1:
+                    raise ValueError("The name of the agent is required when the pool does not contain a single agent")
+                name = next(iter(self.__agents))
+            api = self.__agents[name]
+            self.__forget(name)
+            self.__placements_complete = False
+        api.set_url(api_url, port, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    def owner(self, key: str) -> Union[str, None]:
+        """
+        Get the agent the hash ring assigns a patient to
+        :param key: The patient key (see patient_key)
+        :return: The name of the agent, None if the pool is empty
+        """
+        with self.__lock:
+            return self.__ring.get(key)
+
+    def agent_for_patient(self, alias: str) -> Tuple[str, ApiHandler]:
+        """
+        Get the agent of a patient, the agent of its existing connection or the agent assigned by the hash ring
+        :param alias: The alias of the connection (or a BSN)
+        :return: A tuple containing the agent name and ApiHandler
+        """
+        key = self.patient_key(alias)
+        with self.__lock:
+            name = self.__patients.get(key) or self.__ring.get(key)
+            if name is None:
+                raise UnknownConnectionError("The pool does not contain any agent")
+            return name, self.__agents[name]
+
+    def __place(self, name: str, connection: dict) -> None:
+        """
+        Add a connection to the lookup tables
+        :param name: The name of the agent that owns the connection
+        :param connection: The connection (as returned by ACA-Py)
+        :return: None
+        """
+        with self.__lock:
+            if name not in self.__agents:
+                return
+            self.__connections[connection["connection_id"]] = name
+            if "alias" in connection:
+                key = self.__connection_patients[connection["connection_id"]] = self.patient_key(connection["alias"])
+                # A patient with connections on several agents is placed on the agent assigned by the hash ring
+                if self.__patients.get(key) in (None, name) or self.__ring.get(key) == name:
+                    self.__patients[key] = name
+
+    def __unplace(self, conn_id: str) -> None:
+        """
+        Remove a connection from the lookup tables, the patient is placed using the hash ring again
+        :param conn_id: The connection id
+        :return: None
+        """
+        with self.__lock:
+            name = self.__connections.pop(conn_id, None)
+            key = self.__connection_patients.pop(conn_id, None)
+            if name is None or key is None or self.__patients.get(key) != name:
+                return
+            # The patient keeps its placement while it has another connection on the same agent
+            if not any(patient == key and self.__connections.get(other) == name
+                       for other, patient in self.__connection_patients.items()):
+                del self.__patients[key]
+
+    def __fan_out(self, call: Callable[[ApiHandler], Any], names: list = None) -> Tuple[dict, dict]:
+        """
+        Execute a call on every agent concurrently, agents that are unavailable (or fail) are logged and returned
+        :param call: Function that receives the ApiHandler of an agent
+        :param names: Only execute the call on these agents (optional)
+        :return: A tuple containing a dict with the agent name as key and the return value as value (ordered by agent
+        name) and a dict with the failed agents, name -> exception (see __complete)
+        """
+        agents = self.agents
+        if names is not None:
+            agents = {name: agents[name] for name in names if name in agents}
+        futures = {}
+        results = {}
+        failed = {}
+        # A single agent is called directly, without the overhead of a thread
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(agents))) if len(agents) > 1 else None
+        try:
+            for name in sorted(agents):
+                try:
+                    if executor is None:
+                        results[name] = call(agents[name])
+                    else:
+                        futures[name] = executor.submit(call, agents[name])
+                except requests.exceptions.RequestException as e:
+                    logging.warning(f"Agent {name} failed: {e}")
+                    failed[name] = e
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except requests.exceptions.RequestException as e:
+                    logging.warning(f"Agent {name} failed: {e}")
+                    failed[name] = e
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return results, failed
+
+    @staticmethod
+    def __complete(result: Any, failed: dict) -> Any:
+        """
+        Check that a fanned out call succeeded on every agent
+        :param result: The (merged) result of the available agents
+        :param failed: The failed agents (see __fan_out)
+        :return: The result, raises a PartialResultError containing the result when an agent failed
+        """
+        if failed:
+            raise PartialResultError(f"Unable to reach agent(s): {', '.join(sorted(failed))}", failed, result)
+        return result
+
+    def __connection_agent_name(self, conn_id: str) -> str:
+        """
+        Get the name of the agent that owns a connection, every agent is asked when the connection is not placed yet
+        :param conn_id: The connection id
+        :return: The name of the agent
+        """
+        with self.__lock:
+            name = self.__connections.get(conn_id)
+            if name in self.__agents:
+                return name
+        connections, failed = self.__fan_out(lambda api: api.get_connection(conn_id))
+        for name, connection in connections.items():
+            if connection is not None:
+                self.__place(name, connection)
+                return name
+        # The connection might exist on an agent that could not be reached
+        self.__complete(None, failed)
+        raise UnknownConnectionError(f"The connection {conn_id} does not exist on any (available) agent")
+
+    def __connection_agent(self, conn_id: str) -> ApiHandler:
+        """
+        Get the agent that owns a connection (see __connection_agent_name)
+        :param conn_id: The connection id
+        :return: The ApiHandler of the agent
+        """
+        return self.agents[self.__connection_agent_name(conn_id)]
+
+    def __record_agent(self, pres_ex_id: str) -> ApiHandler:
+        """
+        Get the agent that owns a presentation exchange record, every agent is asked when the record is not known yet
+        :param pres_ex_id: The presentation exchange id
+        :return: The ApiHandler of the agent
+        """
+        with self.__lock:
+            name = self.__records.get(pres_ex_id)
+            if name in self.__agents:
+                return self.__agents[name]
+        records, failed = self.__fan_out(lambda api: api.get_proof_record(pres_ex_id))
+        for name, record in records.items():
+            if record is not None:
+                self.__place_records(name, [pres_ex_id])
+                return self.__agents[name]
+        self.__complete(None, failed)
+        raise UnknownConnectionError(
+            f"The presentation exchange record {pres_ex_id} does not exist on any (available) agent")
+
+    def __place_records(self, name: str, pres_ex_ids: list) -> None:
+        """
+        Add presentation exchange records to the lookup table
+        :param name: The name of the agent that owns the records
+        :param pres_ex_ids: The presentation exchange ids
+        :return: None
+        """
+        with self.__lock:
+            if name in self.__agents:
+                self.__records.update(dict.fromkeys(pres_ex_ids, name))
+
+    def refresh_placements(self) -> list:
+        """
+        Retrieve the connections of every agent and rebuild the lookup tables of the patients and connections
+        The placements of agents that are unavailable are kept
+        :return: The names of the agents that could not be reached
+        """
+        listings, failed = self.__fan_out(lambda api: api.get_connections()["results"])
+        with self.__lock:
+            for name in listings:
+                for table in (self.__patients, self.__connections):
+                    for key in [key for key, agent in table.items() if agent == name]:
+                        del table[key]
+            for conn_id in [conn_id for conn_id in self.__connection_patients if conn_id not in self.__connections]:
+                del self.__connection_patients[conn_id]
+            for name, connections in listings.items():
+                for connection in connections:
+                    self.__place(name, connection)
+            self.__placements_complete = not failed
+        return sorted(failed)
+
+    def rebalance(self) -> dict:
+        """
+        Retrieve the placements of every patient and report how the patients are divided over the agents
+        A connection (and its records) lives inside the wallet of its agent and can not be moved, patients stay on the
+        agent of their existing connection and new patients are placed using the hash ring
+        The misplaced patients move to the agent assigned by the hash ring once their connection is recreated
+        :return: A dict with the amount of patients per agent, the misplaced patients: {key: (agent, owner)} and the
+        names of the unavailable agents (their patients are counted from the previous placements)
+        """
+        unavailable = self.refresh_placements()
+        with self.__lock:
+            patients = dict.fromkeys(sorted(self.__agents), 0)
+            misplaced = {}
+            for key, name in self.__patients.items():
+                patients[name] += 1
+                owner = self.__ring.get(key)
+                if owner != name:
+                    misplaced[key] = (name, owner)
+        return {"patients": patients, "misplaced": misplaced, "unavailable": unavailable}
+
+    def refresh_connection_index(self) -> None:
+        """
+        Retrieve every connection of every agent and rebuild the connection indexes and lookup tables
+        :return: None
+        """
+        self.refresh_placements()
+
+    def invalidate_connection_index(self) -> None:
+        """
+        Clear the lookup tables and the connection index of every agent
+        :return: None
+        """
+        with self.__lock:
+            self.__patients.clear()
+            self.__connections.clear()
+            self.__records.clear()
+            self.__connection_patients.clear()
+            self.__placements_complete = False
+            agents = list(self.__agents.values())
+        for api in agents:
+            api.invalidate_connection_index()
+
+    def set_webhooks_active(self, active: bool) -> None:
+        """
+        Tell every agent if the webhooks are received (see ApiHandler.set_webhooks_active)
+        :param active: True if the webhooks are received, False if not
+        :return: None
+        """
+        with self.__lock:
+            self.__webhooks_active = active
+            agents = list(self.__agents.values())
+        for api in agents:
+            api.set_webhooks_active(active)
+
+    def apply_webhook_event(self, topic: str, payload: dict) -> None:
+        """
+        Update the caches with an event received from the ACA-Py webhooks, the event is passed to the agent that owns
+        the connection (or every agent when it is unknown)
+        :param topic: The webhook topic eq. connections or present_proof
+        :param payload: The webhook payload (the updated record)
+        :return: None
+        """
+        with self.__lock:
+            name = self.__connections.get(payload.get("connection_id"))
+            agents = [self.__agents[name]] if name in self.__agents else list(self.__agents.values())
+        if topic == "connections" and payload.get("state") == "deleted":
+            self.__unplace(payload["connection_id"])
+        for api in agents:
+            api.apply_webhook_event(topic, payload)
+
+    def test_connection(self) -> bool:
+        """
+        Test the connection with the agents
+        :return: True if at least one agent is available, False if not
+        """
+        return any(self.__fan_out(lambda api: api.test_connection())[0].values())
+
+    def get_agent_name(self) -> str:
+        """
+        Get the names of the available agents
+        :return: The ACA-Py agent names separated by a comma
+        """
+        names, _ = self.__fan_out(lambda api: api.get_agent_name() if api.test_connection() else None)
+        return ", ".join(name for name in names.values() if name)
+
+    def get_agent_state(self) -> str:
+        """
+        Get the combined state of the circuit breakers of the agents
+        :return: closed (every agent is available), open (no agent is available) or half_open (some agents are)
+        """
+        states = set(self.get_agent_states().values())
+        if states <= {"closed"}:
+            return "closed"
+        return "open" if states == {"open"} else "half_open"
+
+    def get_agent_states(self) -> dict:
+        """
+        Get the state of the circuit breaker of every agent
+        :return: A dict with the agent name as key and the state as value (see ApiHandler.get_agent_state)
+        """
+        return {name: api.get_agent_state() for name, api in sorted(self.agents.items())}
+
+    def create_invitation(self, alias: str, multi_use: bool, auto_accept: bool) -> Tuple[str, str]:
+        """
+        Create a connection invitation on the agent of the patient (see agent_for_patient)
+        :param alias: The alias to give to the connection as a str
+        :param multi_use: Can this invite be used multiple times?
+        :param auto_accept: Auto accept connection handshake?
+        :return: A tuple containing the connection id and base64 encoded invite url
+        """
+        name, api = self.agent_for_patient(alias)
+        conn_id, invitation = api.create_invitation(alias, multi_use, auto_accept)
+        self.__place(name, {"connection_id": conn_id, "alias": alias})
+        return conn_id, invitation
+
+    def receive_invitation(self, invitation_url: str, alias: str, auto_accept: bool) -> str:
+        """
+        Receive an invitation url on the agent of the patient (see agent_for_patient)
+        :param invitation_url: The base64 encoded invite url str
+        :param alias: The alias to give to the connection as a str
+        :param auto_accept: Auto accept connection handshake?
+        :return: The connection id as a str
+        """
+        name, api = self.agent_for_patient(alias)
+        conn_id = api.receive_invitation(invitation_url, alias, auto_accept)
+        self.__place(name, {"connection_id": conn_id, "alias": alias})
+        return conn_id
+
+    def accept_invitation(self, conn_id: str) -> None:
+        """
+        Accept the invitation of the given conn id on the agent of the connection
+        :param conn_id: The connection id of the connection to accept
+        :return: None
+        """
+        self.__connection_agent(conn_id).accept_invitation(conn_id)
+
+    def accept_request(self, conn_id: str) -> None:
+        """
+        Accept the connection request of the given conn id on the agent of the connection
+        :param conn_id: The connection id of the connection to accept
+        :return: None
+        """
+        self.__connection_agent(conn_id).accept_request(conn_id)
+
+    def get_connection_state(self, connection_id: str) -> int:
+        """
+        Get the connection state of a given connection id from the agent of the connection
+        :param connection_id: The connection id
+        :return: The state (see states dict)
+        """
+        return self.__connection_agent(connection_id).get_connection_state(connection_id)
+
+    def get_connections(self, alias: str = None, state: str = None) -> dict:
+        """
+        Get connection(s) of every agent by: alias, state or if both are left empty every connection
+        :param alias: The alias to retrieve (optional), only the agent of a placed patient is asked
+        :param state: The state the connection needs to be in (optional), see states dict for possible options
+        :return: A dict with the requested connections of every agent, raises a PartialResultError when an agent is
+        unavailable
+        """
+        names = None
+        if alias:
+            with self.__lock:
+                name = self.__patients.get(self.patient_key(alias))
+            names = [name] if name else None
+        results = []
+        listings, failed = self.__fan_out(lambda api: api.get_connections(alias=alias, state=state)["results"], names)
+        for name, connections in listings.items():
+            for connection in connections:
+                self.__place(name, connection)
+            results += connections
+        return self.__complete({"results": results}, failed)
+
+    def get_connection(self, conn_id: str) -> Union[dict, None]:
+        """
+        Get a connection by its connection id from the agent that owns it
+        :param conn_id: The connection id as a str
+        :return: The connection as a dict, None if the connection does not exist on any agent
+        """
+        try:
+            return self.__connection_agent(conn_id).get_connection(conn_id)
+        except UnknownConnectionError:
+            return None
+
+    def get_connection_by_alias(self, alias: str) -> Union[dict, None]:
+        """
+        Get a connection by its alias, the connections of every agent are placed on the first call
+        :param alias: The alias as a str
+        :return: The connection as a dict, None if there is no connection with this alias
+        """
+        api = self.__placed_agent(self.patient_key(alias))
+        return api.get_connection_by_alias(alias) if api is not None else None
+
+    def get_connection_id(self, alias: str) -> str:
+        """
+        Get the connection id of a given alias
+        :param alias: The requested connection id alias as a str
+        :return: The connection id as a str
+        """
+        try:
+            connections = self.get_connections(alias=alias)["results"]
+        except PartialResultError as e:
+            # The connection might exist on an agent that could not be reached
+            connections = e.result["results"]
+            if not connections:
+                raise
+        if not connections:
+            raise UnknownConnectionError(f"There is no connection with the alias {alias} on any agent")
+        return connections[0]["connection_id"]
+
+    def get_connection_id_by_bsn(self, bsn: str) -> Union[str, None]:
+        """
+        Get the connection id of a given BSN, the connections of every agent are placed on the first call
+        :param bsn: The BSN as a str
+        :return: The connection id as a str, None if there is no connection with this BSN
+        """
+        api = self.__placed_agent(bsn)
+        return api.get_connection_id_by_bsn(bsn) if api is not None else None
+
+    def __placed_agent(self, key: str) -> Union[ApiHandler, None]:
+        """
+        Get the agent of a placed patient, the connections of every agent are placed on the first call
+        :param key: The patient key (see patient_key)
+        :return: The ApiHandler of the agent, None if the patient is not placed, raises a PartialResultError when the
+        patient is not placed and an agent could not be reached
+        """
+        unavailable = [] if self.__placements_complete else self.refresh_placements()
+        with self.__lock:
+            api = self.__agents.get(self.__patients.get(key))
+        if api is None and unavailable:
+            raise PartialResultError(f"Unable to reach agent(s): {', '.join(unavailable)}",
+                                     dict.fromkeys(unavailable))
+        return api
+
+    def get_active_connection_aliases(self) -> list:
+        """
+        Retrieve the aliases of all active connections of every agent
+        :return: The aliases inside a list, raises a PartialResultError when an agent is unavailable
+        """
+        # The ApiHandler returns no aliases for an unavailable agent, the connections are retrieved instead so the
+        # unavailable agents are reported
+        listings, failed = self.__fan_out(lambda api: api.get_connections(state="active")["results"])
+        return self.__complete([connection["alias"] for connections in listings.values()
+                                for connection in connections if "alias" in connection], failed)
+
+    def get_alias_by_conn_id(self, conn_id: str) -> Union[str, None]:
+        """
+        Get the alias of the given connection id from the agent of the connection
+        :param conn_id: The connection id
+        :return: The alias as a str if found (and active), None if not
+        """
+        try:
+            return self.__connection_agent(conn_id).get_alias_by_conn_id(conn_id)
+        except UnknownConnectionError:
+            return None
+
+    def __iter_agents(self, call: Callable[[ApiHandler], Iterator[dict]], names: list = None) -> Iterator[tuple]:
+        """
+        Iterate over the results of a streamed call of every agent, one agent after the other
+        :param call: Function that receives the ApiHandler of an agent and returns an iterator
+        :param names: Only execute the call on these agents (optional)
+        :return: An iterator of tuples containing the agent name and a result, raises a PartialResultError after the
+        results of the other agents when an agent failed
+        """
+        failed = {}
+        for name, api in sorted(self.agents.items()):
+            if names is not None and name not in names:
+                continue
+            try:
+                for item in call(api):
+                    yield name, item
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"Agent {name} failed: {e}")
+                failed[name] = e
+        self.__complete(None, failed)
+
+    def iter_connections(self, alias: str = None, state: str = None) -> Iterator[dict]:
+        """
+        Iterate over connection(s) of every agent by: alias, state or if both are left empty every connection
+        The connections are yielded while the responses are being parsed
+        :param alias: The alias to retrieve (optional), only the agent of a placed patient is asked
+        :param state: The state the connection needs to be in (optional), see states dict for possible options
+        :return: An iterator of the requested connections
+        """
+        names = None
+        if alias:
+            with self.__lock:
+                name = self.__patients.get(self.patient_key(alias))
+            names = [name] if name else None
+        for name, connection in self.__iter_agents(lambda api: api.iter_connections(alias=alias, state=state), names):
+            self.__place(name, connection)
+            yield connection
+
+    def iter_pending_connections(self) -> Iterator[dict]:
+        """
+        Iterate over the pending connections of every agent, yielded while the responses are being parsed
+        :return: An iterator of the pending connections (see ApiHandler.iter_pending_connections)
+        """
+        for name, connection in self.__iter_agents(lambda api: api.iter_pending_connections()):
+            self.__place(name, connection)
+            yield connection
+
+    def get_pending_connections(self) -> list:
+        """
+        Retrieve all pending connections of every agent
+        :return: All pending connections (state=invitation) inside a list, raises a PartialResultError when an agent
+        is unavailable
+        """
+        listings, failed = self.__fan_out(lambda api: api.get_pending_connections())
+        for name, connections in listings.items():
+            for connection in connections:
+                self.__place(name, connection)
+        return self.__complete([connection for connections in listings.values() for connection in connections],
+                               failed)
+
+    def delete_connection(self, conn_id: str, delete_records: bool = True, missing_ok: bool = False) -> bool:
+        """
+        Delete the connection with a given connection id, the patient is placed using the hash ring again
+        :param conn_id: The connection id to delete
+        :param delete_records: Also delete the proof records of the connection? (default True)
+        :param missing_ok: Count a connection that does not exist (anymore) on any agent as deleted? (default False)
+        :return: True if deletion is successful, False if not
+        """
+        try:
+            api = self.__connection_agent(conn_id)
+        except UnknownConnectionError:
+            if not missing_ok:
+                raise
+            self.__unplace(conn_id)
+            return True
+        deleted = api.delete_connection(conn_id, delete_records=delete_records, missing_ok=missing_ok)
+        if deleted:
+            self.__unplace(conn_id)
+        return deleted
+
+    def delete_proof_records(self, conn_id: str) -> bool:
+        """
+        Delete all proof records of a connection on the agent of the connection
+        :param conn_id: The connection id to delete the records of
+        :return: True if every record is deleted (or there are no records), False if not
+        """
+        return self.__connection_agent(conn_id).delete_proof_records(conn_id)
+
+    def delete_proof_record(self, pres_ex_id: str) -> bool:
+        """
+        Delete a single proof record on the agent that owns it
+        :param pres_ex_id: The presentation exchange id of the record
+        :return: True if the record is deleted or did not exist, False if not
+        """
+        try:
+            api = self.__record_agent(pres_ex_id)
+        except UnknownConnectionError:
+            # Same as the ApiHandler, a record that does not exist counts as deleted
+            return True
+        with self.__lock:
+            self.__records.pop(pres_ex_id, None)
+        return api.delete_proof_record(pres_ex_id)
+
+    def create_schema(self, schema: dict) -> dict:
+        """
+        Create a schema on every agent that did not create it yet
+        :param schema: The schema to create
+        :return: The schema of the first agent (by name) as a dict, only the id, name and version when it already
+        existed
+        """
+        key = (schema["schema_name"], schema["schema_version"])
+
+        def create(api: ApiHandler) -> dict:
+            for schema_id in api.get_schemas():
+                if SchemaRegistry.parse_schema_id(schema_id) == key:
+                    return {"id": schema_id, "name": key[0], "version": key[1]}
+            return api.create_schema(schema)
+        schemas = self.__complete(*self.__fan_out(create))
+        if not schemas:
+            raise UnknownConnectionError("The pool does not contain any agent")
+        return schemas[min(schemas)]
+
+    def get_schemas(self) -> list:
+        """
+        Get the schemas that are created on every agent, a schema that is missing on an agent is left out so it is
+        created again (see create_schema)
+        :return: The schema ids of the first agent (by name) as a list, raises a PartialResultError when an agent is
+        unavailable
+        """
+        created = self.__complete(*self.__fan_out(lambda api: api.get_schemas()))
+        if not created:
+            return []
+        shared = set.intersection(*({SchemaRegistry.parse_schema_id(schema_id) for schema_id in schema_ids}
+                                    for schema_ids in created.values()))
+        return [schema_id for schema_id in created[min(created)] if SchemaRegistry.parse_schema_id(schema_id) in shared]
+
+    def create_credential_definition(self, schema_id: str, schema_tag: str, support_revocation: bool = False,
+                                     **kwargs) -> str:
+        """
+        Create a credential definition on every agent concurrently (see ApiHandler.create_credential_definition)
+        Every agent issues with its own credential definition, the ids of the other agents are looked up when a
+        credential is issued (see issue_credential_from_template), create the credential definition again after a
+        restart to restore the lookup (ACA-Py returns the existing credential definition)
+        :param schema_id: The schema id as a str, the schema of a single agent can be used by every agent
+        :param schema_tag: The schema tag as a str
+        :param support_revocation: Support credential revocation?
+        :param kwargs: max_attempts, progress and cancel_event (see ApiHandler.create_credential_definition)
+        :return: The credential definition id of the first agent (by name)
+        """
+        cred_def_ids = self.__complete(*self.__fan_out(
+            lambda api: api.create_credential_definition(schema_id, schema_tag, support_revocation, **kwargs)))
+        if not cred_def_ids:
+            raise UnknownConnectionError("The pool does not contain any agent")
+        cred_def_id = cred_def_ids[min(cred_def_ids)]
+        with self.__lock:
+            self.__cred_defs[cred_def_id] = cred_def_ids
+        return cred_def_id
+
+    def issue_credential(self, conn_id: str, cred_def_id: str, attributes: list, schema: dict,
+                         comment: str = "") -> dict:
+        """
+        Issue a credential to a connection from the agent of the connection (see ApiHandler.issue_credential)
+        :return: The issue credential json response
+        """
+        return self.issue_credential_from_template(
+            self.build_credential_template(cred_def_id, schema, comment), conn_id, attributes)
+
+    def issue_credential_from_template(self, template: dict, conn_id: str, attributes: list) -> dict:
+        """
+        Issue a credential from a template to a connection from the agent of the connection, the credential
+        definition of the template is replaced by the credential definition of that agent
+        :param template: The payload template (see build_credential_template)
+        :param conn_id: The connection id to issue the credential to
+        :param attributes: The list of attributes, format: [{"name": "score", "value": "12"},...]
+        :return: The issue credential json response
+        """
+        name = self.__connection_agent_name(conn_id)
+        with self.__lock:
+            cred_def_id = self.__cred_defs.get(template.get("cred_def_id"), {}).get(name)
+        if cred_def_id is not None and cred_def_id != template["cred_def_id"]:
+            template = {**template, "cred_def_id": cred_def_id, "issuer_did": cred_def_id.split(":")[0]}
+        return self.agents[name].issue_credential_from_template(template, conn_id, attributes)
+
+    def get_credentials(self) -> dict:
+        """
+        Get the credentials of every agent
+        :return: The credentials inside a dict, format: {"results": [...]}, raises a PartialResultError when an agent
+        is unavailable
+        """
+        credentials, failed = self.__fan_out(lambda api: api.get_credentials())
+        return self.__complete({"results": [credential for agent_credentials in credentials.values()
+                                            for credential in agent_credentials.get("results", [])]}, failed)
+
+    def __placed(self, conn_id: str, pres_ex_id: str) -> str:
+        """
+        Place the presentation exchange record created for a connection
+        :param conn_id: The connection id
+        :param pres_ex_id: The presentation exchange id
+        :return: The presentation exchange id
+        """
+        with self.__lock:
+            name = self.__connections.get(conn_id)
+        if name is not None:
+            self.__place_records(name, [pres_ex_id])
+        return pres_ex_id
+
+    def send_proof_request(self, conn_id: str, requested_attributes: dict, requested_predicates: dict, name: str,
+                           comment: str) -> str:
+        """
+        Send a proof request from the agent of the connection (see ApiHandler.send_proof_request)
+        :return: The presentation exchange id as a str
+        """
+        api = self.__connection_agent(conn_id)
+        return self.__placed(
+            conn_id, api.send_proof_request(conn_id, requested_attributes, requested_predicates, name, comment))
+
+    def send_proof_request_from_template(self, template: list, conn_id: str, name: str, comment: str) -> str:
+        """
+        Send a proof request from a template from the agent of the connection
+        :return: The presentation exchange id as a str
+        """
+        api = self.__connection_agent(conn_id)
+        return self.__placed(conn_id, api.send_proof_request_from_template(template, conn_id, name, comment))
+
+    def get_pending_proof_requests_send(self) -> list:
+        """
+        Get a list of pending proof requests that have been send by every agent
+        :return: A list containing the pending proof requests, raises a PartialResultError when an agent is
+        unavailable
+        """
+        requests_send = []
+        listings, failed = self.__fan_out(lambda api: api.get_pending_proof_requests_send())
+        for name, records in listings.items():
+            self.__place_records(name, [record["presentation_exchange_id"] for record in records])
+            requests_send += records
+        return self.__complete(requests_send, failed)
+
+    def iter_pending_proof_requests_send(self) -> Iterator[dict]:
+        """
+        Iterate over the pending proof requests that have been send by every agent
+        The requests are yielded while the responses are being parsed
+        :return: An iterator of the pending proof requests
+        """
+        for name, record in self.__iter_agents(lambda api: api.iter_pending_proof_requests_send()):
+            self.__place_records(name, [record["presentation_exchange_id"]])
+            yield record
+
+    def get_verified_proof_records(self, conn_id: str, max_age: float = 0) -> dict:
+        """
+        Get the verified proof records of a connection from the agent of the connection
+        :param conn_id: The connection id where the proof records originated from
+        :param max_age: See ApiHandler.get_verified_proof_records
+        :return: A dict with all the proof records from a given connection id
+        """
+        return self.__connection_agent(conn_id).get_verified_proof_records(conn_id, max_age=max_age)
+
+    def sync_proof_records(self, state: str, role: str = "verifier", conn_id: str = None, max_age: float = 0) -> dict:
+        """
+        Synchronize the proof records of every agent (or the agent of the connection) and merge the changes
+        :param state: The state of the proof record
+        :param role: The role of our client default = verifier
+        :param conn_id: Optional, synchronize only records corresponding with a certain connection id
+        :param max_age: Skip retrieving the records when they are synchronized less than max_age seconds ago (optional)
+        :return: A dict with the added and updated proof records and the removed pres_ex_ids of every agent, raises a
+        PartialResultError containing the changes of the available agents when an agent is unavailable
+        """
+        names = None
+        if conn_id is not None:
+            names = [self.__connection_agent_name(conn_id)]
+        merged = {"added": [], "updated": [], "removed": []}
+        deltas, failed = self.__fan_out(
+            lambda api: api.sync_proof_records(state, role=role, conn_id=conn_id, max_age=max_age), names)
+        for name, delta in deltas.items():
+            self.__place_records(name, [record["pres_ex_id"] for record in delta["added"]])
+            with self.__lock:
+                for pres_ex_id in delta["removed"]:
+                    self.__records.pop(pres_ex_id, None)
+            for change, values in delta.items():
+                merged[change] += values
+        return self.__complete(merged, failed)
+
+    def get_proof_records(self, state: str, role: str = "verifier", conn_id: str = None) -> list:
+        """
+        Get all proof records with a certain state of every agent (or the agent of the connection)
+        :param state: The state of the proof record
+        :param role: The role of our client default = verifier
+        :param conn_id: Optional, retreive only records corresponding with a certain connection id
+        :return: The list of proof records with that state, raises a PartialResultError when an agent is unavailable
+        """
+        if conn_id is not None:
+            return self.__connection_agent(conn_id).get_proof_records(state, role=role, conn_id=conn_id)
+        records = []
+        listings, failed = self.__fan_out(lambda api: api.get_proof_records(state, role=role, conn_id=conn_id))
+        for name, agent_records in listings.items():
+            self.__place_records(name, [record["pres_ex_id"] for record in agent_records])
+            records += agent_records
+        return self.__complete(records, failed)
+
+    def iter_proof_records(self, state: str, role: str = "verifier", conn_id: str = None) -> Iterator[dict]:
+        """
+        Iterate over all proof records with a certain state of every agent (or the agent of the connection)
+        The records are yielded while the responses are being parsed
+        :param state: The state of the proof record
+        :param role: The role of our client default = verifier
+        :param conn_id: Optional, retreive only records corresponding with a certain connection id
+        :return: An iterator of the proof records with that state
+        """
+        names = [self.__connection_agent_name(conn_id)] if conn_id is not None else None
+        for name, record in self.__iter_agents(
+                lambda api: api.iter_proof_records(state, role=role, conn_id=conn_id), names):
+            self.__place_records(name, [record["pres_ex_id"]])
+            yield record
+
+    def get_proof_record(self, pres_ex_id: str) -> Union[dict, None]:
+        """
+        Get a single presentation exchange record from the agent that owns it
+        :param pres_ex_id: The presentation exchange id
+        :return: The presentation exchange record as a dict, None if it does not exist on any agent
+        """
+        try:
+            return self.__record_agent(pres_ex_id).get_proof_record(pres_ex_id)
+        except UnknownConnectionError:
+            return None
+
+    def get_pending_work(self) -> list:
+        """
+        Get the received presentations and send proof requests of every agent (see ApiHandler.get_pending_work)
+        :return: A list of proof records extended with the alias, name and BSN of the patient, received presentations
+        first, raises a PartialResultError containing the work of the available agents when an agent is unavailable
+        """
+        pending = []
+        listings, failed = self.__fan_out(lambda api: api.get_pending_work())
+        for name, records in listings.items():
+            self.__place_records(name, [record["pres_ex_id"] for record in records])
+            pending += records
+        # Stable sort, the order of every agent is kept
+        return self.__complete(sorted(pending, key=lambda record: record["state"] != "presentation_received"), failed)
+
+    def get_pres_exchange_id(self) -> str:
+        """
+        Get the first presentation exchange id of the first agent (by name) that has presentation exchange records
+        :return: The presentation exchange id as a string
+        """
+        for name, api in sorted(self.agents.items()):
+            try:
+                pres_ex_id = api.get_pres_exchange_id()
+            except IndexError:
+                continue
+            self.__place_records(name, [pres_ex_id])
+            return pres_ex_id
+        raise IndexError("There are no presentation exchange records on any agent")
+
+    def send_presentation(self, pres_ex_id: str, requested_attributes: dict, requested_predicates: dict,
+                          self_attested_attributes: dict) -> dict:
+        """
+        Send a presentation from the agent of the proof request (see ApiHandler.send_presentation)
+        :return: The send presentation json response
+        """
+        return self.__record_agent(pres_ex_id).send_presentation(
+            pres_ex_id, requested_attributes, requested_predicates, self_attested_attributes)
+
+    def verify_presentation(self, pres_ex_id: str) -> dict:
+        """
+        Verify a received presentation on the agent that owns it
+        :param pres_ex_id: The presentation exchange id to verify
+        :return: The verify presentation json response
+        """
+        return self.__record_agent(pres_ex_id).verify_presentation(pres_ex_id)
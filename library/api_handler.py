@@ -1,7 +1,28 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
+import json
 import ast
-from typing import Tuple, Union
+import re
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from typing import Callable, Iterator, Tuple, Union
+
+from library.proof_sync import ProofRecordSync
+from library.status_monitor import StatusMonitor
+from library.api_metrics import ApiMetrics
+from library.local_store import LocalStore
+from library.json_projection import compile_fields, parse_results, project_items
+
+try:
+    # Optional, used to parse the listings incrementally instead of loading the whole response body
+    import ijson
+except ImportError:
+    ijson = None
 
 endpoints = {
     "create_invitation": "/connections/create-invitation",
@@ -24,16 +45,200 @@ states = {
     "invitation": 2
 }
 
+# Default (connect, read) timeout in seconds for every endpoint that is not listed in the timeouts dict
+default_timeout = (3.05, 10)
+
+# Per endpoint (connect, read) timeouts in seconds, the keys are the ApiHandler method names
+timeouts = {
+    "status": (1, 3),
+    "create_schema": (3.05, 30),
+    "create_credential_definition": (3.05, 60),
+    "issue_credential": (3.05, 30),
+}
+
+# HTTP status codes on which idempotent (GET) requests are retried
+retry_status_codes = (502, 503, 504)
+
+# Placeholder of the values inside a serialized proof request template
+proof_request_placeholder = "__proof_request_placeholder__"
+
+# Creating a credential definition is retried (ACA-Py sometimes responds with an error 400 while writing to the ledger)
+# Sleeps min({backoff factor} * (2 ** (attempt - 1)), {max backoff}) seconds between the attempts
+cred_def_max_attempts = 6
+cred_def_backoff_factor = 1.0
+cred_def_max_backoff = 30
+
+# The fields of the presentation exchange records that are decoded for the proof record listings (see
+# format_proof_record), the presentations are only decoded when a single record is opened (see get_proof_record)
+proof_record_fields = ("presentation_exchange_id", "connection_id", "state", "role", "created_at", "updated_at",
+                       "presentation_request.name")
+verified_record_fields = proof_record_fields + ("presentation.requested_proof.revealed_attrs",)
+proof_record_projection = compile_fields(proof_record_fields)
+verified_record_projection = compile_fields(verified_record_fields)
+
+# The maximum amount of proof record sync engines (one per listing and filters, so mostly one per patient) that are
+# kept, the least recently used engine is dropped and synchronized from scratch when it is used again
+proof_sync_cache_size = 128
+
+
+class AgentUnavailableError(requests.exceptions.ConnectionError):
+    """
+    Raised without a network call when the circuit breaker is open (the ACA-Py instance is down)
+    """
+
 
-# TODO: Check if this class can be ran inside a thread so the program doesn't hang when ACA-PY instance is offline
 class ApiHandler:
-    def __init__(self, api_url: str, port: int):
+    def __init__(self, api_url: str, port: int, pool_connections: int = 1, pool_maxsize: int = 10,
+                 max_retries: int = 3, backoff_factor: float = 0.3, endpoint_timeouts: dict = None,
+                 status_ttl: float = 5.0, failure_threshold: int = 3, reset_timeout: float = 10.0,
+                 metrics: ApiMetrics = None, index_ttl: float = 30.0, store: LocalStore = None):
         """
         ApiHandler constructor
         :param api_url: The ACA-Py instance url as a str
         :param port: The ACA-Py instance port as a int
+        :param pool_connections: The amount of connection pools (one per host) to keep alive
+        :param pool_maxsize: The maximum amount of keep-alive connections inside a pool
+        :param max_retries: The maximum amount of retries for idempotent (GET) requests
+        :param backoff_factor: The backoff factor between retries, sleeps {backoff factor} * (2 ** (retry - 1)) seconds
+        :param endpoint_timeouts: Optional (connect, read) timeouts per endpoint, overrides the timeouts dict
+        :param status_ttl: The amount of seconds the agent status is cached
+        :param failure_threshold: The amount of consecutive failed requests after which requests fail fast
+        :param reset_timeout: The amount of seconds between the background status probes while requests fail fast
+        :param metrics: The collector of the per endpoint metrics (optional, a new collector is created)
+        :param index_ttl: The amount of seconds the indexed connections are trusted while no webhooks are received,
+        older connections are retrieved again when they are looked up
+        :param store: The LocalStore that caches the data of this ACA-Py instance (optional), its namespace is kept equal
+        to the url of the instance
         """
         self.__api_url = f"http://{api_url}:{port}"
+        self.__pool_connections = pool_connections
+        self.__pool_maxsize = pool_maxsize
+        self.__max_retries = max_retries
+        self.__backoff_factor = backoff_factor
+        self.__timeouts = {**timeouts, **(endpoint_timeouts or {})}
+        self.__session = self.__create_session()
+        # Shared agent status cache and circuit breaker
+        self.__status = StatusMonitor(self.__probe_status, ttl=status_ttl, failure_threshold=failure_threshold,
+                                      reset_timeout=reset_timeout)
+        # In-memory connection index, connection_id -> connection, alias -> connection_id and BSN -> connection_id
+        self.__index_lock = threading.RLock()
+        self.__connections = {}
+        self.__aliases = {}
+        self.__bsns = {}
+        self.__index_complete = False
+        # When the connections are indexed (monotonic), the index is kept up-to-date by the webhooks when they are active
+        self.__index_ttl = index_ttl
+        self.__indexed_at = {}
+        self.__index_refreshed_at = 0.0
+        self.__webhooks_active = False
+        # Proof record sync engines keyed by their name and filters, ordered from least to most recently used
+        self.__proof_sync_lock = threading.Lock()
+        self.__proof_syncs = OrderedDict()
+        # Call counts, latencies, payload sizes and errors per endpoint, add a hook to receive every request
+        self.metrics = metrics or ApiMetrics()
+        self.store = store
+        if store is not None:
+            store.set_namespace(self.__api_url)
+
+    def __create_session(self) -> requests.Session:
+        """
+        Create a pooled keep-alive session, idempotent (GET) requests are retried with a backoff
+        :return: The session
+        """
+        # Refused connections are only retried once so an offline instance is detected quickly
+        retry = Retry(
+            total=self.__max_retries,
+            connect=min(self.__max_retries, 1),
+            backoff_factor=self.__backoff_factor,
+            status_forcelist=retry_status_codes,
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.__pool_connections,
+            pool_maxsize=self.__pool_maxsize,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def __iter_results(self, endpoint: str, path: str, params: dict, projection: dict = None) -> Iterator[dict]:
+        """
+        Iterate over the results of a listing endpoint, the response body is parsed incrementally when ijson is
+        installed so the results are yielded before the whole body is received
+        :param endpoint: The endpoint name used to look up the timeout (see timeouts dict)
+        :param path: The path of the request, appended to the ACA-Py instance url
+        :param params: The query parameters
+        :param projection: The fields of the results to decode (see json_projection.compile_fields), optional
+        :return: An iterator of the results (as returned by ACA-Py, only the projected fields)
+        """
+        with self.__request("GET", endpoint, path, params=params, stream=True) as response:
+            if ijson is None:
+                yield from parse_results(response.content, projection)
+                return
+            # Let urllib3 decompress the body, ijson reads the raw stream
+            response.raw.decode_content = True
+            yield from project_items(ijson.items(response.raw, "results.item", use_float=True), projection)
+
+    def __request(self, method: str, endpoint: str, path: str, **kwargs) -> requests.Response:
+        """
+        Send a request to the ACA-Py instance using the pooled session
+        :param method: The HTTP method as a str
+        :param endpoint: The endpoint name used to look up the timeout (see timeouts dict)
+        :param path: The path of the request, appended to the ACA-Py instance url
+        :param kwargs: Additional arguments passed to requests, eq. params or json
+        :return: The response
+        """
+        if not self.__status.allow_request():
+            self.metrics.record(endpoint, method, path, 0.0, error=AgentUnavailableError.__name__)
+            raise AgentUnavailableError(f"The ACA-Py instance at {self.__api_url} is unavailable")
+        kwargs.setdefault("timeout", self.__timeouts.get(endpoint, default_timeout))
+        started = time.perf_counter()
+        try:
+            response = self.__session.request(method, f"{self.__api_url}{path}", **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.metrics.record(endpoint, method, path, time.perf_counter() - started, error=type(e).__name__)
+            if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                self.__status.record_failure()
+            raise
+        self.__status.record_success()
+        self.__record_response(endpoint, response, time.perf_counter() - started, stream=kwargs.get("stream", False))
+        return response
+
+    def __record_response(self, endpoint: str, response: requests.Response, duration: float,
+                          stream: bool = False) -> None:
+        """
+        Record the metrics of a response
+        NOTE: The duration of a streamed response is the time until the headers are received
+        :param endpoint: The endpoint name
+        :param response: The response
+        :param duration: The duration of the request in seconds
+        :param stream: Is the body streamed? The size is read from the Content-Length header instead of the body
+        :return: None
+        """
+        body = response.request.body
+        self.metrics.record(
+            endpoint, response.request.method, response.request.path_url, duration, status=response.status_code,
+            request_bytes=len(body) if isinstance(body, (bytes, str)) else 0,
+            response_bytes=int(response.headers.get("Content-Length", 0)) if stream else len(response.content))
+
+    def __probe_status(self) -> dict:
+        """
+        Retrieve the agent status, used by the status monitor (bypasses the circuit breaker)
+        :return: The status as a dict
+        """
+        started = time.perf_counter()
+        try:
+            response = self.__session.get(f"{self.__api_url}/status",
+                                          timeout=self.__timeouts.get("status", default_timeout))
+        except requests.exceptions.RequestException as e:
+            self.metrics.record("status", "GET", "/status", time.perf_counter() - started, error=type(e).__name__)
+            raise
+        self.__record_response("status", response, time.perf_counter() - started)
+        response.raise_for_status()
+        return response.json()
 
     @staticmethod
     def format_bool(x: bool) -> str:
@@ -44,28 +249,162 @@ class ApiHandler:
         """
         return str(x).lower() if isinstance(x, bool) else x
 
-    def set_url(self, api_url: str, port: int) -> None:
+    @staticmethod
+    def bsn_from_alias(alias: str) -> Union[str, None]:
+        """
+        Get the BSN from an alias, the alias format is: {first name} {middle name (optional)} {last name} {BSN}
+        :param alias: The alias as a str
+        :return: The BSN as a str, None if the alias does not end with a BSN
+        """
+        bsn = alias.rsplit(" ", 1)[-1] if alias else ""
+        return bsn if re.match(r"^[0-9]{9}$", bsn) else None
+
+    def __prune_connection_index(self, retrieved: set, state: str = None) -> None:
+        """
+        Remove the connections that no longer exist (or no longer have the given state) from the connection index
+        :param retrieved: The connection ids of every connection (with the given state) of the ACA-Py instance
+        :param state: The state filter the connections were retrieved with (optional)
+        :return: None
+        """
+        with self.__index_lock:
+            for conn_id, connection in list(self.__connections.items()):
+                if conn_id not in retrieved and (state is None or connection.get("state") == state):
+                    self.__unindex_connection(conn_id)
+            if state is None:
+                self.__index_complete = True
+                self.__index_refreshed_at = time.monotonic()
+
+    def __is_fresh(self, indexed_at: float) -> bool:
+        """
+        Check if an indexed connection (or the complete index) can be trusted without retrieving it again
+        :param indexed_at: When the connection (or the complete index) was retrieved (monotonic)
+        :return: True if the webhooks are active or it was retrieved less than index_ttl seconds ago, False if not
+        """
+        return self.__webhooks_active or time.monotonic() - indexed_at < self.__index_ttl
+
+    def __index_connections(self, connections: list) -> None:
+        """
+        Add or update connections inside the connection index
+        :param connections: The connections (as returned by ACA-Py) to index
+        :return: None
+        """
+        with self.__index_lock:
+            for connection in connections:
+                previous = self.__connections.get(connection["connection_id"])
+                # Skip the connection if the indexed connection is more recent
+                if previous and previous.get("updated_at", "") > connection.get("updated_at", ""):
+                    continue
+                if previous:
+                    self.__unindex_connection(connection["connection_id"])
+                self.__connections[connection["connection_id"]] = connection
+                self.__indexed_at[connection["connection_id"]] = time.monotonic()
+                if "alias" in connection:
+                    self.__aliases[connection["alias"]] = connection["connection_id"]
+                    bsn = self.bsn_from_alias(connection["alias"])
+                    if bsn:
+                        self.__bsns[bsn] = connection["connection_id"]
+
+    def __unindex_connection(self, conn_id: str) -> None:
+        """
+        Remove a connection from the connection index
+        :param conn_id: The connection id to remove
+        :return: None
+        """
+        with self.__index_lock:
+            connection = self.__connections.pop(conn_id, None)
+            self.__indexed_at.pop(conn_id, None)
+            if connection is None or "alias" not in connection:
+                return
+            if self.__aliases.get(connection["alias"]) == conn_id:
+                del self.__aliases[connection["alias"]]
+            bsn = self.bsn_from_alias(connection["alias"])
+            if bsn and self.__bsns.get(bsn) == conn_id:
+                del self.__bsns[bsn]
+
+    def invalidate_connection_index(self) -> None:
+        """
+        Clear the connection index, the connections are retrieved again on the next lookup
+        :return: None
+        """
+        with self.__index_lock:
+            self.__connections.clear()
+            self.__aliases.clear()
+            self.__bsns.clear()
+            self.__indexed_at.clear()
+            self.__index_complete = False
+
+    def set_webhooks_active(self, active: bool) -> None:
         """
-        Configure the ACA-Py instance url and port
+        Tell the ApiHandler if the webhooks are received, only pass True once an event has arrived (see
+        WebhookListener.isReceiving), a bound listener does not mean ACA-Py sends its webhooks to it
+        While they are active the connection index is trusted, otherwise index_ttl applies to the indexed connections
+        The index is cleared when the webhooks become active, the events before that moment were missed
+        :param active: True if the webhooks are received, False if not
+        :return: None
+        """
+        if active and not self.__webhooks_active:
+            self.invalidate_connection_index()
+        self.__webhooks_active = active
+
+    def apply_webhook_event(self, topic: str, payload: dict) -> None:
+        """
+        Update the caches with an event received from the ACA-Py webhooks
+        :param topic: The webhook topic eq. connections or present_proof
+        :param payload: The webhook payload (the updated record)
+        :return: None
+        """
+        if topic == "connections" and "connection_id" in payload:
+            if payload.get("state") == "deleted":
+                self.__unindex_connection(payload["connection_id"])
+            else:
+                self.__index_connections([payload])
+        elif topic == "present_proof" and "presentation_exchange_id" in payload:
+            for proof_sync in self.__cached_proof_syncs():
+                proof_sync.apply_event(payload)
+
+    def refresh_connection_index(self) -> None:
+        """
+        Retrieve every connection of the ACA-Py instance and rebuild the connection index
+        :return: None
+        """
+        self.get_connections()
+
+    def set_url(self, api_url: str, port: int, pool_connections: int = None, pool_maxsize: int = None) -> None:
+        """
+        Configure the ACA-Py instance url and port, the connection pool is recreated
+        When the url changes the local store switches to the namespace of the new instance, which is cleared because
+        its rows might belong to a previous (reset) instance at that url
         :param api_url: The url as a str
         :param port: The port as a int
+        :param pool_connections: The amount of connection pools to keep alive (optional, keeps the current value)
+        :param pool_maxsize: The maximum amount of keep-alive connections inside a pool (optional, keeps the current value)
         :return: None
         """
+        previous_url = self.__api_url
         self.__api_url = f"http://{api_url}:{port}"
+        if self.store is not None and self.__api_url != previous_url:
+            self.store.set_namespace(self.__api_url)
+            self.store.clear()
+        if pool_connections is not None:
+            self.__pool_connections = pool_connections
+        if pool_maxsize is not None:
+            self.__pool_maxsize = pool_maxsize
+        # Close the keep-alive connections to the previous instance
+        self.__session.close()
+        self.__session = self.__create_session()
+        self.__status.reset()
+        # The indexed connections and synchronized proof records belong to the previous instance
+        self.invalidate_connection_index()
+        with self.__proof_sync_lock:
+            self.__proof_syncs.clear()
 
     def test_connection(self) -> bool:
         """
         Test the connection with the ACA-Py instance
         :return: True if the connection is successful, False if not
         """
-        try:
-            response = requests.get(f"{self.__api_url}/status")
-            if response.status_code == 200:
-                return True
-            return False
-        except requests.exceptions.ConnectionError as e:
-            print("connection refused")
-            return False
+        # The status is cached, no request is sent when the circuit breaker is open
+        return self.__status.is_available()
 
     def create_invitation(self, alias: str, multi_use: bool, auto_accept: bool) -> Tuple[str, str]:
         """
@@ -80,7 +419,9 @@ class ApiHandler:
             "auto_accept": f"{self.format_bool(auto_accept)}",
             "multi_use": f"{self.format_bool(multi_use)}"
         }
-        response = requests.post(f"{self.__api_url}{endpoints['create_invitation']}", params=params).json()
+        response = self.__request(
+            "POST", "create_invitation", endpoints['create_invitation'], params=params).json()
+        self.__index_connections([{"connection_id": response["connection_id"], "alias": alias, "state": "invitation"}])
         # Return the connection id and decoded invitation url
         return response['connection_id'], response['invitation_url'].split("c_i=")[1]
 
@@ -94,8 +435,8 @@ class ApiHandler:
         """
         params = {"alias": alias, "auto_accept": f"{self.format_bool(auto_accept)}"}
         decoded_url = ast.literal_eval(base64.b64decode(invitation_url).decode('utf-8'))
-        response = requests.post(
-            f"{self.__api_url}{endpoints['receive_invitation']}", params=params, json=decoded_url)
+        response = self.__request(
+            "POST", "receive_invitation", endpoints['receive_invitation'], params=params, json=decoded_url)
         return response.json()['connection_id']
 
     def accept_invitation(self, conn_id: str) -> None:
@@ -105,7 +446,8 @@ class ApiHandler:
         :param conn_id: The connection id of the connection to accept
         :return: None
         """
-        requests.post(f"{self.__api_url}{endpoints['base_connections']}{conn_id}{endpoints['accept_invitation']}")
+        self.__request(
+            "POST", "accept_invitation", f"{endpoints['base_connections']}{conn_id}{endpoints['accept_invitation']}")
 
     def accept_request(self, conn_id: str) -> None:
         """
@@ -114,7 +456,8 @@ class ApiHandler:
         :param conn_id: The connection id of the connection to accept
         :return: None
         """
-        requests.post(f"{self.__api_url}{endpoints['base_connections']}{conn_id}{endpoints['accept_request']}")
+        self.__request(
+            "POST", "accept_request", f"{endpoints['base_connections']}{conn_id}{endpoints['accept_request']}")
 
     def get_connection_state(self, connection_id: str) -> int:
         """
@@ -122,7 +465,8 @@ class ApiHandler:
         :param connection_id: The connection id
         :return: The state (see states dict)
         """
-        response = requests.get(f"{self.__api_url}/connections/{connection_id}").json()
+        response = self.__request("GET", "get_connection_state", f"/connections/{connection_id}").json()
+        self.__index_connections([response])
         return states[response['state']]
 
     def get_agent_name(self) -> str:
@@ -130,7 +474,17 @@ class ApiHandler:
         Get the ACA-Py agent name
         :return: The agent name as a str
         """
-        return requests.get(f"{self.__api_url}/status").json()["label"]
+        status = self.__status.get_status()
+        if status is None:
+            raise AgentUnavailableError(f"The ACA-Py instance at {self.__api_url} is unavailable")
+        return status["label"]
+
+    def get_agent_state(self) -> str:
+        """
+        Get the state of the circuit breaker of the ACA-Py instance
+        :return: closed (available), open (unavailable, requests fail fast) or half_open (probing)
+        """
+        return self.__status.state
 
     def get_connections(self, alias: str = None, state: str = None) -> dict:
         """
@@ -139,21 +493,97 @@ class ApiHandler:
         :param state: The state the connection needs to be in (optional), see states dict for possible options
         :return: A dict with the requested connections
         """
+        return {"results": list(self.iter_connections(alias=alias, state=state))}
+
+    def iter_connections(self, alias: str = None, state: str = None) -> Iterator[dict]:
+        """
+        Iterate over connection(s) by: alias, state or if both are left empty every connection
+        The connections are yielded while the response is being parsed
+        :param alias: The alias to retrieve (optional)
+        :param state: The state the connection needs to be in (optional), see states dict for possible options
+        :return: An iterator of the requested connections
+        """
         params = {}
         if alias:
             params["alias"] = alias
         if state:
             params["state"] = state
-        return requests.get(f"{self.__api_url}/connections", params=params).json()
+        retrieved = set()
+        for connection in self.__iter_results("get_connections", "/connections", params):
+            # Keep the connection index up-to-date with every retrieved connection
+            self.__index_connections([connection])
+            retrieved.add(connection["connection_id"])
+            yield connection
+        if not alias:
+            self.__prune_connection_index(retrieved, state=state)
+
+    def get_connection(self, conn_id: str) -> Union[dict, None]:
+        """
+        Get a connection by its connection id, the connection index is used when the indexed connection is fresh
+        :param conn_id: The connection id as a str
+        :return: The connection as a dict, None if the connection does not exist
+        """
+        with self.__index_lock:
+            if conn_id in self.__connections and self.__is_fresh(self.__indexed_at[conn_id]):
+                return self.__connections[conn_id]
+        response = self.__request("GET", "get_connection", f"{endpoints['base_connections']}{conn_id}")
+        if response.status_code == 404:
+            self.__unindex_connection(conn_id)
+        if response.status_code != 200:
+            return None
+        connection = response.json()
+        self.__index_connections([connection])
+        return connection
+
+    def get_connection_by_alias(self, alias: str) -> Union[dict, None]:
+        """
+        Get a connection by its alias from the connection index
+        The index is filled with every connection of the ACA-Py instance on the first call
+        While no webhooks are received a missing or stale alias is retrieved again, so connections created or deleted
+        by another client are noticed
+        :param alias: The alias as a str
+        :return: The connection as a dict, None if there is no connection with this alias
+        """
+        if not self.__index_complete:
+            self.refresh_connection_index()
+        with self.__index_lock:
+            conn_id = self.__aliases.get(alias)
+            if self.__webhooks_active or (conn_id and self.__is_fresh(self.__indexed_at[conn_id])):
+                return self.__connections[conn_id] if conn_id else None
+        # Retrieve the connections with this alias, the index is updated and the connections that no longer exist
+        # are removed from it
+        connections = self.get_connections(alias=alias)["results"]
+        if conn_id and conn_id not in {connection["connection_id"] for connection in connections}:
+            self.__unindex_connection(conn_id)
+        with self.__index_lock:
+            conn_id = self.__aliases.get(alias)
+            return self.__connections[conn_id] if conn_id else None
 
     def get_connection_id(self, alias: str) -> str:
         """
-        Get the connection id of a given alias
+        Get the connection id of a given alias, the connection index is used when the indexed connection is fresh
         :param alias: The requested connection id alias as a str
         :return: The connection id as a str
         """
+        with self.__index_lock:
+            conn_id = self.__aliases.get(alias)
+            if conn_id and self.__is_fresh(self.__indexed_at[conn_id]):
+                return conn_id
         return self.get_connections(alias=alias)["results"][0]["connection_id"]
 
+    def get_connection_id_by_bsn(self, bsn: str) -> Union[str, None]:
+        """
+        Get the connection id of a given BSN from the connection index
+        The index is filled with every connection of the ACA-Py instance on the first call, and again when it is older
+        than index_ttl while no webhooks are received
+        :param bsn: The BSN as a str
+        :return: The connection id as a str, None if there is no connection with this BSN
+        """
+        if not self.__index_complete or not self.__is_fresh(self.__index_refreshed_at):
+            self.refresh_connection_index()
+        with self.__index_lock:
+            return self.__bsns.get(bsn)
+
     def get_active_connection_aliases(self) -> list:
         """
         Retrieve the aliases of all active connections
@@ -178,41 +608,52 @@ class ApiHandler:
         :param conn_id: The connnection id where the alias needs to be retreived from
         :return: The alias as a str if found, None if not
         """
-        connections = self.get_connections(state="active")["results"]
-        for i in connections:
-            if conn_id == i["connection_id"]:
-                return i["alias"]
-        return None
+        connection = self.get_connection(conn_id)
+        # The indexed connection might still have an old state, retrieve the current state of the connection
+        if connection is not None and connection.get("state") != "active":
+            self.__unindex_connection(conn_id)
+            connection = self.get_connection(conn_id)
+        if connection is None or connection.get("state") != "active":
+            return None
+        return connection.get("alias")
 
     def get_pending_connections(self) -> list:
         """
         Retrieve all pending connections
         :return: All pending connections (state=invitation) inside a list
         """
-        pending = []
-        connections = self.get_connections(state="invitation")["results"]
-        for connection in connections:
+        return list(self.iter_pending_connections())
+
+    def iter_pending_connections(self) -> Iterator[dict]:
+        """
+        Iterate over all pending connections, the connections are yielded while the response is being parsed
+        :return: An iterator of the pending connections (state=invitation)
+        """
+        for connection in self.iter_connections(state="invitation"):
             # If there is no alias then we skip it
             if "alias" not in connection:
                 continue
-            pending.append({
+            yield {
                 "alias": connection["alias"],
                 "created_at": connection["created_at"].split(".")[0],
                 "connection_id": connection["connection_id"]
-            })
-        return pending
+            }
 
-    def delete_connection(self, conn_id: str) -> bool:
+    def delete_connection(self, conn_id: str, delete_records: bool = True, missing_ok: bool = False) -> bool:
         """
         Delete the connection with a given connection id
         :param conn_id: The connection id to delete
+        :param delete_records: Also delete the proof records of the connection? (default True)
+        :param missing_ok: Count a connection that does not exist (anymore) as deleted? (default False)
         :return: True if deletion is successful, False if not
         """
         # TODO: Check if there are any left over records corresponding to this connection id
         # Delete proof records corresponding to the connection id
-        self.delete_proof_records(conn_id)
-        response = requests.delete(f"{self.__api_url}{endpoints['base_connections']}{conn_id}")
-        if response.status_code == 200:
+        if delete_records:
+            self.delete_proof_records(conn_id)
+        response = self.__request("DELETE", "delete_connection", f"{endpoints['base_connections']}{conn_id}")
+        if response.status_code == 200 or (missing_ok and response.status_code == 404):
+            self.__unindex_connection(conn_id)
             return True
         return False
 
@@ -220,15 +661,26 @@ class ApiHandler:
         """
         Delete all proof records corresponding to a certain connection id
         :param conn_id: The connection id to delete the records of
-        :return: None
+        :return: True if every record is deleted (or there are no records), False if not
         """
         records = self.get_proof_records(state="", role="", conn_id=conn_id)
-        response = None
+        deleted = True
         for record in records:
-            response = requests.delete(f"{self.__api_url}{endpoints['base_proof']}/{record['pres_ex_id']}")
-        if response.status_code == 200:
-            return True
-        return False
+            deleted = self.delete_proof_record(record['pres_ex_id']) and deleted
+        return deleted
+
+    def delete_proof_record(self, pres_ex_id: str) -> bool:
+        """
+        Delete a single proof record
+        :param pres_ex_id: The presentation exchange id of the record
+        :return: True if the record is deleted or did not exist, False if not
+        """
+        response = self.__request("DELETE", "delete_proof_record", f"{endpoints['base_proof']}/{pres_ex_id}")
+        if response.status_code not in (200, 404):
+            return False
+        for proof_sync in self.__cached_proof_syncs():
+            proof_sync.remove(pres_ex_id)
+        return True
 
     def create_schema(self, schema: dict) -> dict:
         """
@@ -236,7 +688,7 @@ class ApiHandler:
         :param schema: The schema to create
         :return: The created schema as a dict
         """
-        response = requests.post(f"{self.__api_url}/schemas", json=schema)
+        response = self.__request("POST", "create_schema", "/schemas", json=schema)
         return response.json()['schema']
 
     def get_schemas(self) -> list:
@@ -244,16 +696,23 @@ class ApiHandler:
         Get all schema's that are available on the ACA-Py instance
         :return: The schema's a a list
         """
-        response = requests.get(f"{self.__api_url}/schemas/created").json()['schema_ids']
+        response = self.__request("GET", "get_schemas", "/schemas/created").json()['schema_ids']
         return response
 
-    def create_credential_definition(self, schema_id: str, schema_tag: str, support_revocation: bool = False) -> str:
+    def create_credential_definition(self, schema_id: str, schema_tag: str, support_revocation: bool = False,
+                                     max_attempts: int = cred_def_max_attempts,
+                                     progress: Callable[[int, int, int], None] = None,
+                                     cancel_event: threading.Event = None) -> str:
         """
         Create a credential definition with the given schema id and schema tag, with optional revocation support
-        NOTE: This function takes some time to execute might look like program is hanging
+        Failed attempts are retried with an exponential backoff (see cred_def_backoff_factor)
+        NOTE: This function takes some time to execute, use a CredentialDefinitionJob to execute it in the background
         :param schema_id: The schema id as a str
         :param schema_tag: The schema tag as a str
         :param support_revocation: Support credential revocation?
+        :param max_attempts: The maximum amount of attempts
+        :param progress: Called after every failed attempt with the attempt, max attempts and status code (optional)
+        :param cancel_event: Stops retrying when set, raises a CancelledError (optional)
         :return: The created credential definition id
         """
         cred_def = {
@@ -263,34 +722,41 @@ class ApiHandler:
         if support_revocation:
             cred_def["revocation_registry_size"] = 1000
             cred_def["support_revocation"] = "true"
-        response = requests.post(f"{self.__api_url}/credential-definitions", json=cred_def, timeout=60)
-        # retry creating credential definition if response code is not 200
-        # because of weird ACA-PY error 400 bug
-        while response.status_code != 200:
-            response = requests.post(f"{self.__api_url}/credential-definitions", json=cred_def, timeout=60)
-        return response.json()["credential_definition_id"]
+        cancel_event = cancel_event or threading.Event()
+        for attempt in range(1, max_attempts + 1):
+            if cancel_event.is_set():
+                raise CancelledError()
+            response = self.__request("POST", "create_credential_definition", "/credential-definitions", json=cred_def)
+            if response.status_code == 200:
+                return response.json()["credential_definition_id"]
+            # retry creating credential definition if response code is not 200
+            # because of weird ACA-PY error 400 bug
+            logging.warning(f"Creating the credential definition failed ({response.status_code}), "
+                            f"attempt {attempt} of {max_attempts}")
+            if progress is not None:
+                progress(attempt, max_attempts, response.status_code)
+            if attempt < max_attempts:
+                # Sleep until the next attempt or until the creation is cancelled
+                cancel_event.wait(min(cred_def_backoff_factor * (2 ** (attempt - 1)), cred_def_max_backoff))
+        raise requests.exceptions.HTTPError(
+            f"Unable to create the credential definition after {max_attempts} attempts ({response.status_code})",
+            response=response)
 
-    def issue_credential(self, conn_id: str, cred_def_id: str, attributes: list, schema: dict, comment: str = "") -> dict:
+    @staticmethod
+    def build_credential_template(cred_def_id: str, schema: dict, comment: str = "") -> dict:
         """
-        Issue a credential
-        :param conn_id: The connection id to issue the credential to
+        Build the parts of the issue credential payload that are shared by every credential of a credential definition
         :param cred_def_id: The credential definition id
-        :param attributes: The list of attributes, format: [{"name": "score", "value": "12"},...]
         :param schema: The corresponding schema of the credential you wish to issue
         :param comment: Optional comment to send with the credential
-        :return: The issue credential json response
+        :return: The payload without the connection id and attributes
         """
         # Might cause issues if you want to use someone else's cred definition
         did = cred_def_id.split(":")[0]
-        credential = {
+        return {
             "auto_remove": "false",
             "comment": comment,
-            "connection_id": conn_id,
             "cred_def_id": cred_def_id,
-            "credential_proposal": {
-                "@type": "issue-credential/1.0/credential-preview",
-                "attributes": attributes
-            },
             "issuer_did": did,
             "schema_id": schema["id"],
             "schema_issuer_did": did,
@@ -298,38 +764,93 @@ class ApiHandler:
             "schema_version": schema["version"],
             "trace": "false"
         }
-        return requests.post(f"{self.__api_url}{endpoints['issue_credential']}", json=credential).json()
+
+    def issue_credential(self, conn_id: str, cred_def_id: str, attributes: list, schema: dict, comment: str = "") -> dict:
+        """
+        Issue a credential
+        :param conn_id: The connection id to issue the credential to
+        :param cred_def_id: The credential definition id
+        :param attributes: The list of attributes, format: [{"name": "score", "value": "12"},...]
+        :param schema: The corresponding schema of the credential you wish to issue
+        :param comment: Optional comment to send with the credential
+        :return: The issue credential json response
+        """
+        return self.issue_credential_from_template(
+            self.build_credential_template(cred_def_id, schema, comment), conn_id, attributes)
+
+    def issue_credential_from_template(self, template: dict, conn_id: str, attributes: list) -> dict:
+        """
+        Issue a credential using a prebuilt payload template, use this when issuing many credentials
+        :param template: The payload template (see build_credential_template)
+        :param conn_id: The connection id to issue the credential to
+        :param attributes: The list of attributes, format: [{"name": "score", "value": "12"},...]
+        :return: The issue credential json response
+        """
+        credential = {
+            **template,
+            "connection_id": conn_id,
+            "credential_proposal": {
+                "@type": "issue-credential/1.0/credential-preview",
+                "attributes": attributes
+            }
+        }
+        return self.__request("POST", "issue_credential", endpoints['issue_credential'], json=credential).json()
 
     def get_credentials(self) -> dict:
         """
         Get the credentials of the ACA-Py instance
         :return: The credentials inside a dict
         """
-        response = requests.get(f"{self.__api_url}{endpoints['get_credentials']}")
+        response = self.__request("GET", "get_credentials", endpoints['get_credentials'])
         return response.json()
 
-    def send_proof_request(self, conn_id: str, requested_attributes: dict, requested_predicates: dict, name: str, comment: str) -> str:
+    @staticmethod
+    def build_proof_request_template(requested_attributes: dict, requested_predicates: dict = None) -> list:
         """
-        Send a request for proof
-        :param conn_id: The connection id of the connection where you wish to send the request to
+        Serialize the parts of the send proof request payload that are shared by every request of a record type
         :param requested_attributes: The requested attributes where you want proof for
-        :param requested_predicates: The requests predicates where you want proof for (optional, supply empty dict)
-        :param name: The name of the proof request
-        :param comment: Additional information
-        :return: The send proof request json response
+        :param requested_predicates: The requests predicates where you want proof for (optional)
+        :return: The serialized payload split around the connection id and name (see send_proof_request_from_template)
         """
         proposal = {
             "comment": "",
-            "connection_id": conn_id,
+            "connection_id": proof_request_placeholder,
             "proof_request": {
-                "name": f"{name}:{comment}",
+                "name": proof_request_placeholder,
                 "requested_attributes": requested_attributes,
-                "requested_predicates": requested_predicates,
+                "requested_predicates": requested_predicates or {},
                 "version": "1.0"
             },
             "trace": "false"
         }
-        response = requests.post(f"{self.__api_url}{endpoints['send_proposal']}", json=proposal)
+        return json.dumps(proposal).split(json.dumps(proof_request_placeholder))
+
+    def send_proof_request(self, conn_id: str, requested_attributes: dict, requested_predicates: dict, name: str, comment: str) -> str:
+        """
+        Send a request for proof
+        :param conn_id: The connection id of the connection where you wish to send the request to
+        :param requested_attributes: The requested attributes where you want proof for
+        :param requested_predicates: The requests predicates where you want proof for (optional, supply empty dict)
+        :param name: The name of the proof request
+        :param comment: Additional information
+        :return: The send proof request json response
+        """
+        return self.send_proof_request_from_template(
+            self.build_proof_request_template(requested_attributes, requested_predicates), conn_id, name, comment)
+
+    def send_proof_request_from_template(self, template: list, conn_id: str, name: str, comment: str) -> str:
+        """
+        Send a request for proof using a prebuilt payload template, the payload is not serialized again
+        :param template: The payload template (see build_proof_request_template)
+        :param conn_id: The connection id of the connection where you wish to send the request to
+        :param name: The name of the proof request
+        :param comment: Additional information
+        :return: The presentation exchange id
+        """
+        before, between, after = template
+        proposal = f"{before}{json.dumps(conn_id)}{between}{json.dumps(f'{name}:{comment}')}{after}"
+        response = self.__request("POST", "send_proof_request", endpoints['send_proposal'],
+                                  data=proposal.encode("utf-8"), headers={"Content-Type": "application/json"})
         return response.json()['presentation_exchange_id']
 
     def get_pending_proof_requests_send(self) -> list:
@@ -337,22 +858,94 @@ class ApiHandler:
         Get a list of pending proof requests that have been send
         :return: A list containing the pending proof requests
         """
-        pending_req = []
+        return list(self.iter_pending_proof_requests_send())
+
+    def iter_pending_proof_requests_send(self) -> Iterator[dict]:
+        """
+        Iterate over the pending proof requests that have been send
+        The requests are yielded while the response is being parsed
+        :return: An iterator of the pending proof requests
+        """
         params = {"role": "verifier", "state": "request_sent"}
-        response = requests.get(f"{self.__api_url}{endpoints['base_proof']}", params=params).json()["results"]
-        for i in response:
-            pending_req.append({
+        for i in self.__iter_results("get_pending_proof_requests_send", endpoints['base_proof'], params,
+                                     proof_record_projection):
+            yield {
                 "name": i["presentation_request"]["name"],
                 "connection_id": i["connection_id"],
                 "presentation_exchange_id": i["presentation_exchange_id"],
                 "date_created": i["created_at"]
-            })
-        return pending_req
+            }
 
-    def get_verified_proof_records(self, conn_id: str) -> dict:
+    @staticmethod
+    def format_proof_record(record: dict) -> dict:
+        """
+        Format a presentation exchange record as a proof record
+        :param record: The presentation exchange record (as returned by ACA-Py)
+        :return: The proof record as a dict
+        """
+        return {
+            "connection_id": record["connection_id"],
+            "type": record["presentation_request"]["name"].split(":")[0],
+            "created_at": record["created_at"].split(".")[0],
+            "state": record["state"],
+            "pres_ex_id": record["presentation_exchange_id"]
+        }
+
+    @staticmethod
+    def format_verified_record(record: dict) -> Tuple[str, dict]:
+        """
+        Format a verified presentation exchange record as its record type and revealed attributes
+        :param record: The presentation exchange record (as returned by ACA-Py)
+        :return: A tuple containing the record type eq. NAW and the revealed attributes as a dict
+        """
+        name = record["presentation_request"]["name"].split(":")[0]
+        revealed_attrs = record["presentation"]["requested_proof"]["revealed_attrs"]
+        attributes = {}
+        for key, value in revealed_attrs.items():
+            attributes[key] = value["raw"]
+        return name, attributes
+
+    def __get_proof_sync(self, name: str, params: dict, parse, projection: dict) -> ProofRecordSync:
+        """
+        Get the proof record sync engine for the given name and filters, it is created if it does not exist yet
+        At most proof_sync_cache_size engines are kept, the least recently used engine is dropped
+        :param name: The name of the engine, also used as endpoint name
+        :param params: The filters of the exchange records
+        :param parse: Function that converts an exchange record to the stored value
+        :param projection: The fields of the exchange records used by parse (see json_projection.compile_fields)
+        :return: The sync engine
+        """
+        key = (name,) + tuple(sorted(params.items()))
+        with self.__proof_sync_lock:
+            if key in self.__proof_syncs:
+                self.__proof_syncs.move_to_end(key)
+                return self.__proof_syncs[key]
+            proof_sync = self.__proof_syncs[key] = ProofRecordSync(
+                # The whole listing is compared, parsed lazily so only the projected fields are decoded
+                fetch=lambda: parse_results(
+                    self.__request("GET", name, endpoints['base_proof'], params=params).content, projection),
+                parse=parse,
+                matches=lambda record: all(record.get(k) == v for k, v in params.items())
+            )
+            while len(self.__proof_syncs) > proof_sync_cache_size:
+                self.__proof_syncs.popitem(last=False)
+            return proof_sync
+
+    def __cached_proof_syncs(self) -> list:
+        """
+        Get the proof record sync engines that are currently kept
+        :return: The sync engines inside a list
+        """
+        with self.__proof_sync_lock:
+            return list(self.__proof_syncs.values())
+
+    def get_verified_proof_records(self, conn_id: str, max_age: float = 0) -> dict:
         """
         Get a dict of verified proof records
+        Only the records that changed since the previous call are parsed
         :param conn_id: The connection id where the proof records originated from
+        :param max_age: Use the local records when they are synchronized less than max_age seconds ago, use this when
+        the records are kept up-to-date with webhook events (optional)
         :return: A dict with all the proof records from a given connection id
         """
         records = {}
@@ -361,16 +954,35 @@ class ApiHandler:
             "state": "verified",
             "role": "verifier"
         }
-        response = requests.get(f"{self.__api_url}{endpoints['base_proof']}", params=params).json()["results"]
-        for result in response:
-            name = result["presentation_request"]["name"].split(":")[0]
-            revealed_attrs = result["presentation"]["requested_proof"]["revealed_attrs"]
-            attributes = {}
-            for key, value in revealed_attrs.items():
-                attributes[key] = value["raw"]
+        proof_sync = self.__get_proof_sync("get_verified_proof_records", params, self.format_verified_record,
+                                           verified_record_projection)
+        proof_sync.sync(max_age=max_age)
+        for name, attributes in proof_sync.values():
             records[name] = attributes
         return records
 
+    def sync_proof_records(self, state: str, role: str = "verifier", conn_id: str = None, max_age: float = 0) -> dict:
+        """
+        Synchronize the proof records with a certain state and get the changes since the previous call
+        The first call (and the first call after the engine is dropped, see proof_sync_cache_size) returns every record
+        as added
+        :param state: The state of the proof record
+        :param role: The role of our client default = verifier
+        :param conn_id: Optional, synchronize only records corresponding with a certain connection id
+        :param max_age: Skip retrieving the records when they are synchronized less than max_age seconds ago (optional)
+        :return: A dict with the added and updated proof records (see get_proof_records) and the removed pres_ex_ids
+        """
+        params = {}
+        if conn_id is not None:
+            params["connection_id"] = conn_id
+        if state:
+            params["state"] = state
+        if role:
+            params["role"] = role
+        proof_sync = self.__get_proof_sync("sync_proof_records", params, self.format_proof_record,
+                                           proof_record_projection)
+        return proof_sync.sync(max_age=max_age)
+
     def get_proof_records(self, state: str, role: str = "verifier", conn_id: str = None) -> list:
         """
         Get all proof records with a certain state
@@ -379,7 +991,17 @@ class ApiHandler:
         :param conn_id: Optional, retreive only records corresponding with a certain connection id
         :return: The list of proof records with that state
         """
-        records = []
+        return list(self.iter_proof_records(state, role=role, conn_id=conn_id))
+
+    def iter_proof_records(self, state: str, role: str = "verifier", conn_id: str = None) -> Iterator[dict]:
+        """
+        Iterate over all proof records with a certain state
+        The records are yielded while the response is being parsed
+        :param state: The state of the proof record
+        :param role: The role of our client default = verifier
+        :param conn_id: Optional, retreive only records corresponding with a certain connection id
+        :return: An iterator of the proof records with that state
+        """
         params = {}
         if conn_id is not None:
             params["connection_id"] = conn_id
@@ -387,16 +1009,50 @@ class ApiHandler:
             params["state"] = state
         if role:
             params["role"] = role
-        response = requests.get(f"{self.__api_url}{endpoints['base_proof']}", params=params).json()["results"]
-        for i in response:
-            records.append({
-                "connection_id": i["connection_id"],
-                "type": i["presentation_request"]["name"].split(":")[0],
-                "created_at": i["created_at"].split(".")[0],
-                "state": i["state"],
-                "pres_ex_id": i["presentation_exchange_id"]
+        for i in self.__iter_results("get_proof_records", endpoints['base_proof'], params, proof_record_projection):
+            yield self.format_proof_record(i)
+
+    def get_proof_record(self, pres_ex_id: str) -> Union[dict, None]:
+        """
+        Get a single presentation exchange record, the listings only decode a few fields (see proof_record_fields),
+        use this to open a record with its complete presentation request and presentation
+        :param pres_ex_id: The presentation exchange id
+        :return: The presentation exchange record as a dict (as returned by ACA-Py), None if it does not exist
+        """
+        response = self.__request("GET", "get_proof_record", f"{endpoints['base_proof']}/{pres_ex_id}")
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def get_pending_work(self) -> list:
+        """
+        Get the received presentations and send proof requests joined with the alias of their (active) connection
+        The proof records and active connections are retrieved concurrently and joined locally
+        :return: A list of proof records (see get_proof_records) extended with the alias, name and BSN of the patient,
+        received presentations first
+        """
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            received = executor.submit(self.get_proof_records, state="presentation_received")
+            sent = executor.submit(self.get_proof_records, state="request_sent")
+            connections = executor.submit(self.get_connections, state="active")
+            aliases = {
+                connection["connection_id"]: connection["alias"]
+                for connection in connections.result()["results"] if "alias" in connection
+            }
+            records = received.result() + sent.result()
+        pending = []
+        for record in records:
+            alias = aliases.get(record["connection_id"])
+            # Skip the records of connections that are no longer active
+            if alias is None:
+                continue
+            pending.append({
+                **record,
+                "alias": alias,
+                "name": " ".join(alias.split(" ")[:-1]),
+                "bsn": self.bsn_from_alias(alias)
             })
-        return records
+        return pending
 
     def get_pres_exchange_id(self) -> str:
         """
@@ -404,7 +1060,7 @@ class ApiHandler:
         TODO: Refactor this function since it is hardcoded to always return the first response
         :return: The presentation exchange id as a string
         """
-        response = requests.get(f"{self.__api_url}{endpoints['base_proof']}")
+        response = self.__request("GET", "get_pres_exchange_id", endpoints['base_proof'])
         return response.json()['results'][0]['presentation_exchange_id']
 
     def send_presentation(self, pres_ex_id: str, requested_attributes: dict, requested_predicates: dict,
@@ -423,8 +1079,8 @@ class ApiHandler:
             "self_attested_attributes": self_attested_attributes,
             "trace": "false",
         }
-        response = requests.post(
-            f"{self.__api_url}{endpoints['base_proof']}/{pres_ex_id}{endpoints['send_presentation']}",
+        response = self.__request(
+            "POST", "send_presentation", f"{endpoints['base_proof']}/{pres_ex_id}{endpoints['send_presentation']}",
             json=presentation)
         return response.json()
 
@@ -434,5 +1090,6 @@ class ApiHandler:
         :param pres_ex_id: The corresponding presentation exchange id you wish to verify
         :return: The verify presentation json response
         """
-        return requests.post(
-            f"{self.__api_url}{endpoints['base_proof']}/{pres_ex_id}{endpoints['verify_presentation']}").json()
+        return self.__request(
+            "POST", "verify_presentation", f"{endpoints['base_proof']}/{pres_ex_id}{endpoints['verify_presentation']}"
+        ).json()
@@ -0,0 +1,204 @@
+import threading
+import logging
+import json
+from typing import Callable
+
+# The upper bounds (in seconds) of the latency histogram buckets, the last bucket is unbounded (+Inf)
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The prefix of the Prometheus metric names
+prometheus_prefix = "mnnu_acapy"
+
+
+class EndpointMetrics:
+    def __init__(self):
+        """
+        EndpointMetrics constructor, the counters of a single endpoint
+        """
+        self.calls = 0
+        self.errors = 0
+        self.status_codes = {}
+        self.error_types = {}
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        # One count per bucket of latency_buckets plus the +Inf bucket (not cumulative)
+        self.buckets = [0] * (len(latency_buckets) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a latency quantile from the histogram (the upper bound of the bucket that contains the quantile)
+        :param q: The quantile between 0 and 1
+        :return: The latency in seconds, the maximum latency for the +Inf bucket
+        """
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        count = 0
+        for i, bucket in enumerate(self.buckets):
+            count += bucket
+            if count >= rank:
+                return min(latency_buckets[i], self.latency_max) if i < len(latency_buckets) else self.latency_max
+        return self.latency_max
+
+    def as_dict(self) -> dict:
+        """
+        Get the metrics as a dict
+        :return: The metrics, the latencies are in milliseconds
+        """
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "status_codes": {str(code): count for code, count in sorted(self.status_codes.items())},
+            "error_types": dict(self.error_types),
+            "latency_avg_ms": round(self.latency_sum / self.calls * 1000, 3) if self.calls else 0.0,
+            "latency_p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "latency_p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "latency_max_ms": round(self.latency_max * 1000, 3),
+            "latency_sum_ms": round(self.latency_sum * 1000, 3),
+            "latency_buckets": {str(bound): count for bound, count in zip(latency_buckets + ("+Inf",), self.buckets)},
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+        }
+
+
+class ApiMetrics:
+    def __init__(self):
+        """
+        ApiMetrics constructor, collects the call count, latency histogram, payload sizes and errors per endpoint
+        The endpoints are the ApiHandler method names (see timeouts dict), hooks receive every request as an event
+        """
+        self.__lock = threading.Lock()
+        self.__endpoints = {}
+        self.__hooks = []
+
+    def add_hook(self, hook: Callable[[dict], None]) -> None:
+        """
+        Add a hook that is called after every request (inside the requesting thread)
+        The event is a dict with: endpoint, method, path, status (None on a failure), duration (seconds),
+        request_bytes, response_bytes and error (the exception type name or None)
+        :param hook: The hook, exceptions raised by the hook are logged and ignored
+        :return: None
+        """
+        with self.__lock:
+            self.__hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[dict], None]) -> None:
+        """
+        Remove a hook
+        :param hook: The hook added with add_hook
+        :return: None
+        """
+        with self.__lock:
+            if hook in self.__hooks:
+                self.__hooks.remove(hook)
+
+    def record(self, endpoint: str, method: str, path: str, duration: float, status: int = None,
+               request_bytes: int = 0, response_bytes: int = 0, error: str = None) -> None:
+        """
+        Record a request, responses with an error status code (>= 400) are counted as errors
+        :param endpoint: The endpoint name (the ApiHandler method name)
+        :param method: The HTTP method
+        :param path: The path of the request
+        :param duration: The duration of the request in seconds
+        :param status: The status code of the response, None when the request failed
+        :param request_bytes: The size of the request body
+        :param response_bytes: The size of the response body
+        :param error: The exception type name when the request failed (optional)
+        :return: None
+        """
+        with self.__lock:
+            metrics = self.__endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self.__endpoints[endpoint] = EndpointMetrics()
+            metrics.calls += 1
+            metrics.latency_sum += duration
+            metrics.latency_max = max(metrics.latency_max, duration)
+            metrics.buckets[next((i for i, bound in enumerate(latency_buckets) if duration <= bound),
+                                 len(latency_buckets))] += 1
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+            if status is not None:
+                metrics.status_codes[status] = metrics.status_codes.get(status, 0) + 1
+            if error is not None:
+                metrics.error_types[error] = metrics.error_types.get(error, 0) + 1
+            if error is not None or (status is not None and status >= 400):
+                metrics.errors += 1
+            hooks = list(self.__hooks)
+        if not hooks:
+            return
+        event = {"endpoint": endpoint, "method": method, "path": path, "status": status, "duration": duration,
+                 "request_bytes": request_bytes, "response_bytes": response_bytes, "error": error}
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                logging.warning(f"Metrics hook {hook} failed: {e}")
+
+    def reset(self) -> None:
+        """
+        Clear the collected metrics, the hooks are kept
+        :return: None
+        """
+        with self.__lock:
+            self.__endpoints.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Get the metrics of every endpoint
+        :return: A dict with the endpoint name as key and the metrics (see EndpointMetrics.as_dict) as value
+        """
+        with self.__lock:
+            return {endpoint: metrics.as_dict() for endpoint, metrics in sorted(self.__endpoints.items())}
+
+    def to_json(self, indent: int = 2) -> str:
+        """
+        Dump the metrics as JSON
+        :param indent: The indentation of the JSON
+        :return: The metrics (see snapshot) as a JSON str
+        """
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self) -> str:
+        """
+        Dump the metrics in the Prometheus text exposition format
+        :return: The metrics as a str
+        """
+        with self.__lock:
+            endpoints = sorted(self.__endpoints.items())
+            lines = [
+                f"# HELP {prometheus_prefix}_requests_total The amount of requests sent to ACA-Py",
+                f"# TYPE {prometheus_prefix}_requests_total counter",
+            ]
+            lines += [f'{prometheus_prefix}_requests_total{{endpoint="{endpoint}"}} {metrics.calls}'
+                      for endpoint, metrics in endpoints]
+            lines += [
+                f"# HELP {prometheus_prefix}_request_errors_total The amount of failed requests (or error responses)",
+                f"# TYPE {prometheus_prefix}_request_errors_total counter",
+            ]
+            lines += [f'{prometheus_prefix}_request_errors_total{{endpoint="{endpoint}"}} {metrics.errors}'
+                      for endpoint, metrics in endpoints]
+            for name, help_text in (("request_bytes", "The size of the request bodies"),
+                                    ("response_bytes", "The size of the response bodies")):
+                lines += [
+                    f"# HELP {prometheus_prefix}_{name}_total {help_text} in bytes",
+                    f"# TYPE {prometheus_prefix}_{name}_total counter",
+                ]
+                lines += [f'{prometheus_prefix}_{name}_total{{endpoint="{endpoint}"}} {getattr(metrics, name)}'
+                          for endpoint, metrics in endpoints]
+            lines += [
+                f"# HELP {prometheus_prefix}_request_duration_seconds The latency of the requests",
+                f"# TYPE {prometheus_prefix}_request_duration_seconds histogram",
+            ]
+            for endpoint, metrics in endpoints:
+                cumulative = 0
+                for bound, count in zip(latency_buckets + ("+Inf",), metrics.buckets):
+                    cumulative += count
+                    lines.append(f'{prometheus_prefix}_request_duration_seconds_bucket{{endpoint="{endpoint}",'
+                                 f'le="{bound}"}} {cumulative}')
+                lines.append(f'{prometheus_prefix}_request_duration_seconds_sum{{endpoint="{endpoint}"}} '
+                             f'{metrics.latency_sum:.6f}')
+                lines.append(f'{prometheus_prefix}_request_duration_seconds_count{{endpoint="{endpoint}"}} '
+                             f'{metrics.calls}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,175 @@
+from PyQt5 import QtCore
+from typing import Callable, Union
+import logging
+
+from library.api_handler import ApiHandler
+
+
+class ApiTaskSignals(QtCore.QObject):
+    """
+    Signals of an ApiTask, a QRunnable can not emit signals itself
+    """
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(Exception)
+    chunk = QtCore.pyqtSignal(list)
+
+
+class ApiTask(QtCore.QRunnable):
+    def __init__(self, func: Callable, *args, chunk_size: int = None, **kwargs):
+        """
+        ApiTask constructor, a task that executes a (ApiHandler) function inside the thread pool
+        :param func: The function to execute
+        :param args: The positional arguments of the function
+        :param chunk_size: Iterate over the result of the function and emit the items in chunks of this size (optional)
+        :param kwargs: The keyword arguments of the function
+        """
+        super(ApiTask, self).__init__()
+        self.func = func
+        self.args = args
+        self.chunk_size = chunk_size
+        self.kwargs = kwargs
+        self.signals = ApiTaskSignals()
+
+    def run(self) -> None:
+        """
+        Execute the function, the result is delivered by the finished signal and exceptions by the failed signal
+        :return: None
+        """
+        try:
+            result = self.func(*self.args, **self.kwargs)
+            if self.chunk_size:
+                result = self.__emitChunks(result)
+        except Exception as e:
+            logging.warning(f"Background call {getattr(self.func, '__name__', self.func)} failed: {e}")
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+    def __emitChunks(self, iterator) -> int:
+        """
+        Iterate over the result of the function and emit the items in chunks
+        :param iterator: The iterator
+        :return: The total amount of items
+        """
+        total = 0
+        chunk = []
+        for item in iterator:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                total += len(chunk)
+                self.signals.chunk.emit(chunk)
+                chunk = []
+        if chunk:
+            total += len(chunk)
+            self.signals.chunk.emit(chunk)
+        return total
+
+
+class ApiWorker(QtCore.QObject):
+    # Emitted with True when the first task starts and with False when the last running task is done
+    busyChanged = QtCore.pyqtSignal(bool)
+    # Thread pool shared by every ApiWorker, the global thread pool can not be used since Qt uses it while painting
+    # (eq. icon conversions) and waits for it while holding the GIL, which deadlocks with a task waiting for the GIL
+    pool = None
+
+    def __init__(self, api_instance: ApiHandler, parent: QtCore.QObject = None):
+        """
+        ApiWorker constructor, executes ApiHandler calls inside a thread pool so the UI never blocks
+        The results are delivered to the callbacks inside the UI thread using Qt signals
+        :param api_instance: The ApiHandler instance
+        :param parent: The parent QObject (optional)
+        """
+        super(ApiWorker, self).__init__(parent)
+        self.api = api_instance
+        if ApiWorker.pool is None:
+            ApiWorker.pool = QtCore.QThreadPool()
+        self.__pool = ApiWorker.pool
+        # Keep a reference to the running tasks so their signals are not garbage collected
+        self.__tasks = {}
+
+    def isBusy(self) -> bool:
+        """
+        Check if there are running tasks
+        :return: True if there is at least one task running, False if not
+        """
+        return bool(self.__tasks)
+
+    def isRunning(self, key: str) -> bool:
+        """
+        Check if a task with the given key is running
+        :param key: The task key
+        :return: True if running, False if not
+        """
+        return key in self.__tasks
+
+    def run(self, func: Union[str, Callable], *args, callback: Callable = None, error_callback: Callable = None,
+            key: str = None, **kwargs) -> bool:
+        """
+        Execute an ApiHandler method or function in the background
+        :param func: The ApiHandler method name as a str or a function (eq. a lambda that calls multiple methods)
+        :param args: The positional arguments of the function
+        :param callback: Called inside the UI thread with the result of the function (optional)
+        :param error_callback: Called inside the UI thread with the raised exception (optional)
+        :param key: Unique task key, the task is not started when a task with the same key is still running (optional)
+        :param kwargs: The keyword arguments of the function
+        :return: True if the task is started, False if a task with the same key is still running
+        """
+        key = key or object()
+        if key in self.__tasks:
+            return False
+        task = ApiTask(getattr(self.api, func) if isinstance(func, str) else func, *args, **kwargs)
+        return self.__start(key, task, callback, error_callback)
+
+    def stream(self, func: Union[str, Callable], *args, chunk_callback: Callable, callback: Callable = None,
+               error_callback: Callable = None, key: str = None, chunk_size: int = 100, **kwargs) -> bool:
+        """
+        Iterate over the result of an ApiHandler method or function (eq. iter_connections) in the background
+        The items are delivered in chunks while iterating so the UI can show them before the iteration is done
+        :param func: The ApiHandler method name as a str or a function that returns an iterator
+        :param args: The positional arguments of the function
+        :param chunk_callback: Called inside the UI thread with every chunk (list) of items
+        :param callback: Called inside the UI thread with the total amount of items when done (optional)
+        :param error_callback: Called inside the UI thread with the raised exception (optional)
+        :param key: Unique task key, the task is not started when a task with the same key is still running (optional)
+        :param chunk_size: The maximum amount of items inside a chunk
+        :param kwargs: The keyword arguments of the function
+        :return: True if the task is started, False if a task with the same key is still running
+        """
+        key = key or object()
+        if key in self.__tasks:
+            return False
+        task = ApiTask(getattr(self.api, func) if isinstance(func, str) else func, *args,
+                       chunk_size=chunk_size, **kwargs)
+        task.signals.chunk.connect(chunk_callback)
+        return self.__start(key, task, callback, error_callback)
+
+    def __start(self, key, task: ApiTask, callback: Callable, error_callback: Callable) -> bool:
+        """
+        Start a task inside the thread pool
+        :param key: The task key
+        :param task: The task
+        :param callback: Called with the result (can be None)
+        :param error_callback: Called with the raised exception (can be None)
+        :return: True
+        """
+        task.signals.finished.connect(lambda result: self.__onTaskDone(key, callback, result))
+        task.signals.failed.connect(lambda error: self.__onTaskDone(key, error_callback, error))
+        self.__tasks[key] = task.signals
+        if len(self.__tasks) == 1:
+            self.busyChanged.emit(True)
+        self.__pool.start(task)
+        return True
+
+    def __onTaskDone(self, key, callback: Callable, value) -> None:
+        """
+        Remove the finished task and deliver its result or exception to the callback
+        :param key: The task key
+        :param callback: The callback (can be None)
+        :param value: The result or exception
+        :return: None
+        """
+        self.__tasks.pop(key, None)
+        if not self.__tasks:
+            self.busyChanged.emit(False)
+        if callback is not None:
+            callback(value)
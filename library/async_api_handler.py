@@ -0,0 +1,534 @@
+import aiohttp
+import asyncio
+import base64
+import json
+import ast
+import logging
+import time
+from typing import Any, Callable, Tuple, Union
+
+from library.api_handler import endpoints, states, default_timeout, timeouts, retry_status_codes, \
+    cred_def_max_attempts, cred_def_backoff_factor, cred_def_max_backoff
+from library.api_metrics import ApiMetrics
+
+
+class AsyncApiHandler:
+    def __init__(self, api_url: str, port: int, pool_maxsize: int = 100, concurrency: int = 50,
+                 max_retries: int = 3, backoff_factor: float = 0.3, endpoint_timeouts: dict = None,
+                 metrics: ApiMetrics = None):
+        """
+        AsyncApiHandler constructor, the asyncio counterpart of the ApiHandler class
+        The methods return the same values as the ApiHandler methods but have to be awaited
+        NOTE: Use the handler as an async context manager or call close() when done to release the connection pool
+        :param api_url: The ACA-Py instance url as a str
+        :param port: The ACA-Py instance port as a int
+        :param pool_maxsize: The maximum amount of keep-alive connections inside the pool
+        :param concurrency: The maximum amount of requests that are in flight at the same time
+        :param max_retries: The maximum amount of retries for idempotent (GET) requests
+        :param backoff_factor: The backoff factor between retries, sleeps {backoff factor} * (2 ** (retry - 1)) seconds
+        :param endpoint_timeouts: Optional (connect, read) timeouts per endpoint, overrides the timeouts dict
+        :param metrics: The collector of the per endpoint metrics (optional, a new collector is created), can be
+        shared with an ApiHandler
+        """
+        self.__api_url = f"http://{api_url}:{port}"
+        self.__pool_maxsize = pool_maxsize
+        self.__concurrency = concurrency
+        self.__max_retries = max_retries
+        self.__backoff_factor = backoff_factor
+        self.__timeouts = {**timeouts, **(endpoint_timeouts or {})}
+        # The session and semaphore are bound to the running event loop so they are created on first use, the
+        # semaphore is kept when the session is recreated so the requests in flight keep counting against the limit
+        self.__session = None
+        self.__semaphore = None
+        self.__semaphore_loop = None
+        # Call counts, latencies, payload sizes and errors per endpoint, every attempt is recorded
+        self.metrics = metrics or ApiMetrics()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the session and its connection pool
+        :return: None
+        """
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared session, create it if it does not exist yet
+        :return: The session
+        """
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(limit=self.__pool_maxsize)
+            self.__session = aiohttp.ClientSession(connector=connector)
+        return self.__session
+
+    def __get_semaphore(self) -> asyncio.Semaphore:
+        """
+        Get the concurrency limiter of the running event loop, it is created once per event loop
+        :return: The semaphore
+        """
+        loop = asyncio.get_running_loop()
+        if self.__semaphore is None or self.__semaphore_loop is not loop:
+            self.__semaphore = asyncio.Semaphore(self.__concurrency)
+            self.__semaphore_loop = loop
+        return self.__semaphore
+
+    async def __request(self, method: str, endpoint: str, path: str, **kwargs) -> Tuple[int, Any]:
+        """
+        Send a request to the ACA-Py instance using the shared session, idempotent (GET) requests are retried
+        :param method: The HTTP method as a str
+        :param endpoint: The endpoint name used to look up the timeout (see timeouts dict)
+        :param path: The path of the request, appended to the ACA-Py instance url
+        :param kwargs: Additional arguments passed to aiohttp, eq. params or json
+        :return: A tuple containing the status code and the decoded json body (None if the body is empty)
+        """
+        semaphore = self.__get_semaphore()
+        connect, read = self.__timeouts.get(endpoint, default_timeout)
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(sock_connect=connect, sock_read=read))
+        # Serialize the json body once so its size is known for the metrics
+        if "json" in kwargs:
+            kwargs["data"] = json.dumps(kwargs.pop("json")).encode("utf-8")
+            kwargs["headers"] = {"Content-Type": "application/json", **kwargs.get("headers", {})}
+        request_bytes = len(kwargs["data"]) if isinstance(kwargs.get("data"), (bytes, str)) else 0
+        retries = self.__max_retries if method == "GET" else 0
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    # Taken after waiting, the session might have been recreated in the meantime (see set_url)
+                    session = self.__get_session()
+                    started = time.perf_counter()
+                    try:
+                        async with session.request(method, f"{self.__api_url}{path}", **kwargs) as response:
+                            final = response.status not in retry_status_codes or attempt >= retries
+                            body = await response.read() if final else b""
+                            self.metrics.record(endpoint, method, path, time.perf_counter() - started,
+                                                status=response.status, request_bytes=request_bytes,
+                                                response_bytes=len(body))
+                            if final:
+                                return response.status, await response.json(content_type=None) if body else None
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        self.metrics.record(endpoint, method, path, time.perf_counter() - started,
+                                            request_bytes=request_bytes, error=type(e).__name__)
+                        raise
+            except aiohttp.ClientConnectorError:
+                # Refused connections are only retried once so an offline instance is detected quickly
+                if attempt >= min(retries, 1):
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+            attempt += 1
+            await asyncio.sleep(self.__backoff_factor * (2 ** (attempt - 1)))
+
+    @staticmethod
+    def format_bool(x: bool) -> str:
+        """
+        Format bool as a str
+        :param x: The bool
+        :return: The bool as a str
+        """
+        return str(x).lower() if isinstance(x, bool) else x
+
+    async def set_url(self, api_url: str, port: int, pool_maxsize: int = None) -> None:
+        """
+        Configure the ACA-Py instance url and port, the connection pool is recreated
+        :param api_url: The url as a str
+        :param port: The port as a int
+        :param pool_maxsize: The maximum amount of keep-alive connections inside the pool (optional)
+        :return: None
+        """
+        self.__api_url = f"http://{api_url}:{port}"
+        if pool_maxsize is not None:
+            self.__pool_maxsize = pool_maxsize
+        await self.close()
+
+    async def test_connection(self) -> bool:
+        """
+        Test the connection with the ACA-Py instance
+        :return: True if the connection is successful, False if not
+        """
+        try:
+            status, _ = await self.__request("GET", "status", "/status")
+            return status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def create_invitation(self, alias: str, multi_use: bool, auto_accept: bool) -> Tuple[str, str]:
+        """
+        Create a connection invitation
+        :param alias: The alias to give to the connection as a str
+        :param multi_use: Can this invite be used multiple times?
+        :param auto_accept: Auto accept connection handshake?
+        :return: A tuple containing the connection id and base64 encoded invite url
+        """
+        params = {
+            "alias": alias,
+            "auto_accept": f"{self.format_bool(auto_accept)}",
+            "multi_use": f"{self.format_bool(multi_use)}"
+        }
+        _, response = await self.__request("POST", "create_invitation", endpoints['create_invitation'], params=params)
+        # Return the connection id and decoded invitation url
+        return response['connection_id'], response['invitation_url'].split("c_i=")[1]
+
+    async def receive_invitation(self, invitation_url: str, alias: str, auto_accept: bool) -> str:
+        """
+        Receive invitation url
+        :param invitation_url: The base64 encoded invite url str
+        :param alias: The alias to give to the connection as a str
+        :param auto_accept: Auto accept connection handshake?
+        :return: The connection id as a str
+        """
+        params = {"alias": alias, "auto_accept": f"{self.format_bool(auto_accept)}"}
+        decoded_url = ast.literal_eval(base64.b64decode(invitation_url).decode('utf-8'))
+        _, response = await self.__request(
+            "POST", "receive_invitation", endpoints['receive_invitation'], params=params, json=decoded_url)
+        return response['connection_id']
+
+    async def accept_invitation(self, conn_id: str) -> None:
+        """
+        Accept the invitation of the given conn id
+        This needs to be done when auto-accept is disabled and only needs to be done by the receiver of the invitation
+        :param conn_id: The connection id of the connection to accept
+        :return: None
+        """
+        await self.__request(
+            "POST", "accept_invitation", f"{endpoints['base_connections']}{conn_id}{endpoints['accept_invitation']}")
+
+    async def accept_request(self, conn_id: str) -> None:
+        """
+        Accept the connection request of the given conn id
+        This needs to be done when auto-accept is disabled and only needs to be done by the invitation creator
+        :param conn_id: The connection id of the connection to accept
+        :return: None
+        """
+        await self.__request(
+            "POST", "accept_request", f"{endpoints['base_connections']}{conn_id}{endpoints['accept_request']}")
+
+    async def get_connection_state(self, connection_id: str) -> int:
+        """
+        Get the connection state of a given connection id
+        :param connection_id: The connection id
+        :return: The state (see states dict)
+        """
+        _, response = await self.__request("GET", "get_connection_state", f"/connections/{connection_id}")
+        return states[response['state']]
+
+    async def get_agent_name(self) -> str:
+        """
+        Get the ACA-Py agent name
+        :return: The agent name as a str
+        """
+        _, response = await self.__request("GET", "status", "/status")
+        return response["label"]
+
+    async def get_connections(self, alias: str = None, state: str = None) -> dict:
+        """
+        Get connection(s) by: alias, state or if both are left empty every connection
+        :param alias: The alias to retrieve (optional)
+        :param state: The state the connection needs to be in (optional), see states dict for possible options
+        :return: A dict with the requested connections
+        """
+        params = {}
+        if alias:
+            params["alias"] = alias
+        if state:
+            params["state"] = state
+        _, response = await self.__request("GET", "get_connections", "/connections", params=params)
+        return response
+
+    async def get_connection_id(self, alias: str) -> str:
+        """
+        Get the connection id of a given alias
+        :param alias: The requested connection id alias as a str
+        :return: The connection id as a str
+        """
+        return (await self.get_connections(alias=alias))["results"][0]["connection_id"]
+
+    async def get_active_connection_aliases(self) -> list:
+        """
+        Retrieve the aliases of all active connections
+        :return: The aliases inside a list
+        """
+        # If there is no active connection, return an empty list
+        if not await self.test_connection():
+            return []
+        connections = (await self.get_connections(state="active"))["results"]
+        return [connection["alias"] for connection in connections if "alias" in connection]
+
+    async def get_alias_by_conn_id(self, conn_id: str) -> Union[str, None]:
+        """
+        Get the alias of the given connection id
+        :param conn_id: The connnection id where the alias needs to be retreived from
+        :return: The alias as a str if found, None if not
+        """
+        connections = (await self.get_connections(state="active"))["results"]
+        for i in connections:
+            if conn_id == i["connection_id"]:
+                return i["alias"]
+        return None
+
+    async def get_pending_connections(self) -> list:
+        """
+        Retrieve all pending connections
+        :return: All pending connections (state=invitation) inside a list
+        """
+        pending = []
+        connections = (await self.get_connections(state="invitation"))["results"]
+        for connection in connections:
+            # If there is no alias then we skip it
+            if "alias" not in connection:
+                continue
+            pending.append({
+                "alias": connection["alias"],
+                "created_at": connection["created_at"].split(".")[0],
+                "connection_id": connection["connection_id"]
+            })
+        return pending
+
+    async def delete_connection(self, conn_id: str) -> bool:
+        """
+        Delete the connection with a given connection id
+        :param conn_id: The connection id to delete
+        :return: True if deletion is successful, False if not
+        """
+        # Delete proof records corresponding to the connection id
+        await self.delete_proof_records(conn_id)
+        status, _ = await self.__request(
+            "DELETE", "delete_connection", f"{endpoints['base_connections']}{conn_id}")
+        return status == 200
+
+    async def delete_proof_records(self, conn_id: str) -> bool:
+        """
+        Delete all proof records corresponding to a certain connection id, the records are deleted concurrently
+        :param conn_id: The connection id to delete the records of
+        :return: True if every record is deleted, False if not
+        """
+        records = await self.get_proof_records(state="", role="", conn_id=conn_id)
+        responses = await asyncio.gather(*[
+            self.__request("DELETE", "delete_proof_record", f"{endpoints['base_proof']}/{record['pres_ex_id']}")
+            for record in records
+        ])
+        return all(status == 200 for status, _ in responses)
+
+    async def create_schema(self, schema: dict) -> dict:
+        """
+        Create a schema on the ACA-Py instance
+        :param schema: The schema to create
+        :return: The created schema as a dict
+        """
+        _, response = await self.__request("POST", "create_schema", "/schemas", json=schema)
+        return response['schema']
+
+    async def get_schemas(self) -> list:
+        """
+        Get all schema's that are available on the ACA-Py instance
+        :return: The schema's a a list
+        """
+        _, response = await self.__request("GET", "get_schemas", "/schemas/created")
+        return response['schema_ids']
+
+    async def create_credential_definition(self, schema_id: str, schema_tag: str,
+                                           support_revocation: bool = False,
+                                           max_attempts: int = cred_def_max_attempts,
+                                           progress: Callable[[int, int, int], None] = None) -> str:
+        """
+        Create a credential definition with the given schema id and schema tag, with optional revocation support
+        Failed attempts are retried with an exponential backoff, cancel the task to stop retrying
+        :param schema_id: The schema id as a str
+        :param schema_tag: The schema tag as a str
+        :param support_revocation: Support credential revocation?
+        :param max_attempts: The maximum amount of attempts
+        :param progress: Called after every failed attempt with the attempt, max attempts and status code (optional)
+        :return: The created credential definition id
+        """
+        cred_def = {
+            "schema_id": schema_id,
+            "tag": schema_tag,
+        }
+        if support_revocation:
+            cred_def["revocation_registry_size"] = 1000
+            cred_def["support_revocation"] = "true"
+        for attempt in range(1, max_attempts + 1):
+            status, response = await self.__request(
+                "POST", "create_credential_definition", "/credential-definitions", json=cred_def)
+            if status == 200:
+                return response["credential_definition_id"]
+            # retry creating credential definition if response code is not 200
+            # because of weird ACA-PY error 400 bug
+            logging.warning(f"Creating the credential definition failed ({status}), attempt {attempt} of {max_attempts}")
+            if progress is not None:
+                progress(attempt, max_attempts, status)
+            if attempt < max_attempts:
+                await asyncio.sleep(min(cred_def_backoff_factor * (2 ** (attempt - 1)), cred_def_max_backoff))
+        raise aiohttp.ClientError(
+            f"Unable to create the credential definition after {max_attempts} attempts ({status})")
+
+    async def issue_credential(self, conn_id: str, cred_def_id: str, attributes: list, schema: dict,
+                               comment: str = "") -> dict:
+        """
+        Issue a credential
+        :param conn_id: The connection id to issue the credential to
+        :param cred_def_id: The credential definition id
+        :param attributes: The list of attributes, format: [{"name": "score", "value": "12"},...]
+        :param schema: The corresponding schema of the credential you wish to issue
+        :param comment: Optional comment to send with the credential
+        :return: The issue credential json response
+        """
+        # Might cause issues if you want to use someone else's cred definition
+        did = cred_def_id.split(":")[0]
+        credential = {
+            "auto_remove": "false",
+            "comment": comment,
+            "connection_id": conn_id,
+            "cred_def_id": cred_def_id,
+            "credential_proposal": {
+                "@type": "issue-credential/1.0/credential-preview",
+                "attributes": attributes
+            },
+            "issuer_did": did,
+            "schema_id": schema["id"],
+            "schema_issuer_did": did,
+            "schema_name": schema["name"],
+            "schema_version": schema["version"],
+            "trace": "false"
+        }
+        _, response = await self.__request("POST", "issue_credential", endpoints['issue_credential'], json=credential)
+        return response
+
+    async def get_credentials(self) -> dict:
+        """
+        Get the credentials of the ACA-Py instance
+        :return: The credentials inside a dict
+        """
+        _, response = await self.__request("GET", "get_credentials", endpoints['get_credentials'])
+        return response
+
+    async def send_proof_request(self, conn_id: str, requested_attributes: dict, requested_predicates: dict,
+                                 name: str, comment: str) -> str:
+        """
+        Send a request for proof
+        :param conn_id: The connection id of the connection where you wish to send the request to
+        :param requested_attributes: The requested attributes where you want proof for
+        :param requested_predicates: The requests predicates where you want proof for (optional, supply empty dict)
+        :param name: The name of the proof request
+        :param comment: Additional information
+        :return: The presentation exchange id of the send proof request
+        """
+        proposal = {
+            "comment": "",
+            "connection_id": conn_id,
+            "proof_request": {
+                "name": f"{name}:{comment}",
+                "requested_attributes": requested_attributes,
+                "requested_predicates": requested_predicates,
+                "version": "1.0"
+            },
+            "trace": "false"
+        }
+        _, response = await self.__request("POST", "send_proof_request", endpoints['send_proposal'], json=proposal)
+        return response['presentation_exchange_id']
+
+    async def get_pending_proof_requests_send(self) -> list:
+        """
+        Get a list of pending proof requests that have been send
+        :return: A list containing the pending proof requests
+        """
+        params = {"role": "verifier", "state": "request_sent"}
+        _, response = await self.__request(
+            "GET", "get_pending_proof_requests_send", endpoints['base_proof'], params=params)
+        return [{
+            "name": i["presentation_request"]["name"],
+            "connection_id": i["connection_id"],
+            "presentation_exchange_id": i["presentation_exchange_id"],
+            "date_created": i["created_at"]
+        } for i in response["results"]]
+
+    async def get_verified_proof_records(self, conn_id: str) -> dict:
+        """
+        Get a dict of verified proof records
+        :param conn_id: The connection id where the proof records originated from
+        :return: A dict with all the proof records from a given connection id
+        """
+        records = {}
+        params = {
+            "connection_id": conn_id,
+            "state": "verified",
+            "role": "verifier"
+        }
+        _, response = await self.__request("GET", "get_verified_proof_records", endpoints['base_proof'], params=params)
+        for result in response["results"]:
+            name = result["presentation_request"]["name"].split(":")[0]
+            revealed_attrs = result["presentation"]["requested_proof"]["revealed_attrs"]
+            records[name] = {key: value["raw"] for key, value in revealed_attrs.items()}
+        return records
+
+    async def get_proof_records(self, state: str, role: str = "verifier", conn_id: str = None) -> list:
+        """
+        Get all proof records with a certain state
+        :param state: The state of the proof record
+        :param role: The role of our client default = verifier
+        :param conn_id: Optional, retreive only records corresponding with a certain connection id
+        :return: The list of proof records with that state
+        """
+        params = {}
+        if conn_id is not None:
+            params["connection_id"] = conn_id
+        if state:
+            params["state"] = state
+        if role:
+            params["role"] = role
+        _, response = await self.__request("GET", "get_proof_records", endpoints['base_proof'], params=params)
+        return [{
+            "connection_id": i["connection_id"],
+            "type": i["presentation_request"]["name"].split(":")[0],
+            "created_at": i["created_at"].split(".")[0],
+            "state": i["state"],
+            "pres_ex_id": i["presentation_exchange_id"]
+        } for i in response["results"]]
+
+    async def get_pres_exchange_id(self) -> str:
+        """
+        Get the first presentation exchange id from the response
+        :return: The presentation exchange id as a string
+        """
+        _, response = await self.__request("GET", "get_pres_exchange_id", endpoints['base_proof'])
+        return response['results'][0]['presentation_exchange_id']
+
+    async def send_presentation(self, pres_ex_id: str, requested_attributes: dict, requested_predicates: dict,
+                                self_attested_attributes: dict) -> dict:
+        """
+        Send a presentation as a response from a proof request
+        :param pres_ex_id: The presentation exchange id of the originating proof request
+        :param requested_attributes: The requested attributes of the proof request
+        :param requested_predicates: The requested predicates of the proof request
+        :param self_attested_attributes: Optional NOTE: not sure what it does, supply empty dict {}
+        :return: The send presentation json response
+        """
+        presentation = {
+            "requested_attributes": requested_attributes,
+            "requested_predicates": requested_predicates,
+            "self_attested_attributes": self_attested_attributes,
+            "trace": "false",
+        }
+        _, response = await self.__request(
+            "POST", "send_presentation", f"{endpoints['base_proof']}/{pres_ex_id}{endpoints['send_presentation']}",
+            json=presentation)
+        return response
+
+    async def verify_presentation(self, pres_ex_id: str) -> dict:
+        """
+        Verify a received presentation
+        :param pres_ex_id: The corresponding presentation exchange id you wish to verify
+        :return: The verify presentation json response
+        """
+        _, response = await self.__request(
+            "POST", "verify_presentation", f"{endpoints['base_proof']}/{pres_ex_id}{endpoints['verify_presentation']}")
+        return response
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from library.api_handler import ApiHandler
+from library.rate_limiter import RateLimiter
+
+
+class BatchIssuance:
+    def __init__(self, api_instance: ApiHandler, cred_def_id: str, schema: dict, comment: str = "",
+                 max_workers: int = 8, rate_limit: float = None):
+        """
+        BatchIssuance constructor, issues the credentials of a credential definition to many patients at once
+        :param api_instance: The ApiHandler instance
+        :param cred_def_id: The credential definition id
+        :param schema: The corresponding schema of the credentials (as returned by ApiHandler.create_schema)
+        :param comment: Optional comment to send with every credential
+        :param max_workers: The maximum amount of credentials that are issued at the same time
+        :param rate_limit: The maximum amount of credentials issued per second (optional, unlimited when left empty)
+        """
+        self.api = api_instance
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate_limit, burst=max_workers) if rate_limit else None
+        # The payload parts that are shared by every credential are built once
+        self.template = self.api.build_credential_template(cred_def_id, schema, comment)
+
+    def __issue(self, conn_id: str, attributes: list) -> dict:
+        """
+        Issue a single credential
+        :param conn_id: The connection id to issue the credential to
+        :param attributes: The list of attributes, format: [{"name": "score", "value": "12"},...]
+        :return: The outcome, see run
+        """
+        if self.limiter is not None:
+            self.limiter.acquire()
+        started = time.perf_counter()
+        outcome = {"conn_id": conn_id, "issued": False, "credential_exchange_id": None, "error": None}
+        try:
+            response = self.api.issue_credential_from_template(self.template, conn_id, attributes)
+            outcome["credential_exchange_id"] = response.get("credential_exchange_id")
+            outcome["issued"] = outcome["credential_exchange_id"] is not None
+            if not outcome["issued"]:
+                outcome["error"] = "The credential exchange was not created"
+        except Exception as e:
+            outcome["error"] = str(e)
+        outcome["duration"] = time.perf_counter() - started
+        return outcome
+
+    def run(self, items: list) -> dict:
+        """
+        Issue the credentials
+        :param items: The credentials to issue, format: [(conn_id, [{"name": "score", "value": "12"},...]),...]
+        :return: A report dict with:
+        results: The outcome of every item (in the same order) as a dict with: conn_id, issued (bool),
+        credential_exchange_id, error (str or None) and duration (seconds)
+        metrics: A dict with: total, issued, failed, elapsed (seconds), throughput (issued credentials per second),
+        latency_avg and latency_p95 (seconds)
+        """
+        logging.info(f"Issuing {len(items)} credential(s) of {self.template['cred_def_id']}")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda item: self.__issue(*item), items))
+        elapsed = time.perf_counter() - started
+        issued = sum(1 for result in results if result["issued"])
+        durations = sorted(result["duration"] for result in results)
+        metrics = {
+            "total": len(results),
+            "issued": issued,
+            "failed": len(results) - issued,
+            "elapsed": elapsed,
+            "throughput": issued / elapsed if elapsed > 0 else 0.0,
+            "latency_avg": sum(durations) / len(durations) if durations else 0.0,
+            "latency_p95": durations[int(0.95 * (len(durations) - 1))] if durations else 0.0,
+        }
+        logging.info(f"Issued {issued} of {len(results)} credential(s) in {elapsed:.1f} seconds "
+                     f"({metrics['throughput']:.1f}/s)")
+        return {"results": results, "metrics": metrics}
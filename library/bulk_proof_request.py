@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import logging
+import time
+from typing import Iterator
+
+from library.api_handler import ApiHandler
+from library.rate_limiter import RateLimiter
+
+
+class BulkProofRequest:
+    def __init__(self, api_instance: ApiHandler, name: str, requested_attributes: dict, comment: str,
+                 requested_predicates: dict = None, max_workers: int = 8, rate_limit: float = None):
+        """
+        BulkProofRequest constructor, sends the same proof request to many patients (a cohort) at once
+        The proof request payload is serialized once and shared by every request
+        :param api_instance: The ApiHandler instance
+        :param name: The name of the proof request (eq. NAW)
+        :param requested_attributes: The requested attributes (see SchemaCatalog.requested_attributes)
+        :param comment: The reason of the proof request
+        :param requested_predicates: The requested predicates (optional)
+        :param max_workers: The maximum amount of proof requests that are sent at the same time
+        :param rate_limit: The maximum amount of proof requests sent per second (optional, unlimited when left empty)
+        """
+        self.api = api_instance
+        self.name = name
+        self.template = self.api.build_proof_request_template(requested_attributes, requested_predicates)
+        self.comment = comment
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate_limit, burst=max_workers) if rate_limit else None
+        self.__cancel_event = threading.Event()
+        self.__lock = threading.Lock()
+        # connection id -> presentation exchange id of every sent proof request
+        self.pres_ex_ids = {}
+        self.total = 0
+        self.done = 0
+
+    def cancel(self) -> None:
+        """
+        Cancel the job, the proof requests that are not sent yet are skipped
+        :return: None
+        """
+        self.__cancel_event.set()
+
+    def cancelled(self) -> bool:
+        """
+        Check if the job is cancelled
+        :return: True if cancelled, False if not
+        """
+        return self.__cancel_event.is_set()
+
+    def __send(self, conn_id: str) -> dict:
+        """
+        Send a single proof request
+        :param conn_id: The connection id
+        :return: The outcome, see iter_run
+        """
+        outcome = {"conn_id": conn_id, "sent": False, "pres_ex_id": None, "error": None}
+        if self.__cancel_event.is_set():
+            outcome["error"] = "Cancelled"
+            return outcome
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            outcome["pres_ex_id"] = self.api.send_proof_request_from_template(
+                self.template, conn_id=conn_id, name=self.name, comment=self.comment)
+            outcome["sent"] = True
+        except Exception as e:
+            outcome["error"] = str(e)
+        return outcome
+
+    def iter_run(self, conn_ids: list) -> Iterator[dict]:
+        """
+        Send the proof requests, the outcomes are yielded as soon as the requests are sent (progress)
+        :param conn_ids: The connection ids of the cohort
+        :return: An iterator of the outcomes as a dict with: conn_id, sent (bool), pres_ex_id and error (str or None)
+        """
+        self.total = len(conn_ids)
+        self.done = 0
+        logging.info(f"Sending the {self.name} proof request to {self.total} patient(s)")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.__send, conn_id) for conn_id in conn_ids]
+            for future in as_completed(futures):
+                outcome = future.result()
+                with self.__lock:
+                    self.done += 1
+                    if outcome["sent"]:
+                        self.pres_ex_ids[outcome["conn_id"]] = outcome["pres_ex_id"]
+                yield outcome
+        logging.info(f"Sent {len(self.pres_ex_ids)} of {self.total} proof request(s) in "
+                     f"{time.perf_counter() - started:.1f} seconds")
+
+    def run(self, conn_ids: list) -> dict:
+        """
+        Send the proof requests (blocking)
+        :param conn_ids: The connection ids of the cohort
+        :return: A report dict with the connection id as key and the outcome (see iter_run) as value
+        """
+        return {outcome["conn_id"]: outcome for outcome in self.iter_run(conn_ids)}
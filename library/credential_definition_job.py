@@ -0,0 +1,118 @@
+from concurrent.futures import Future
+import threading
+import logging
+from typing import Callable
+
+from library.api_handler import ApiHandler, cred_def_max_attempts
+from library.local_store import LocalStore
+
+
+class CredentialDefinitionJob:
+    def __init__(self, api_instance: ApiHandler, schema_id: str, schema_tag: str, support_revocation: bool = False,
+                 store: LocalStore = None, max_attempts: int = cred_def_max_attempts,
+                 progress: Callable[[int, int, int], None] = None):
+        """
+        CredentialDefinitionJob constructor, creates a credential definition in the background
+        The created credential definition id is cached inside the local store, so a credential definition with the
+        same schema id and tag is never created again
+        NOTE: The progress hook and done callbacks are executed inside the job thread, use the ApiWorker (run) to
+        execute the job from the UI
+        :param api_instance: The ApiHandler instance
+        :param schema_id: The schema id as a str
+        :param schema_tag: The schema tag as a str
+        :param support_revocation: Support credential revocation?
+        :param store: The LocalStore instance used as cache (optional, the credential definition is always created)
+        :param max_attempts: The maximum amount of attempts
+        :param progress: Called after every failed attempt with the attempt, max attempts and status code (optional)
+        """
+        self.api = api_instance
+        self.schema_id = schema_id
+        self.schema_tag = schema_tag
+        self.support_revocation = support_revocation
+        self.store = store
+        self.max_attempts = max_attempts
+        self.progress = progress
+        self.future = Future()
+        self.__cancel_event = threading.Event()
+        self.__thread = None
+
+    def start(self) -> "CredentialDefinitionJob":
+        """
+        Start the job inside a background thread
+        :return: The job
+        """
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run_in_thread, daemon=True)
+            self.__thread.start()
+        return self
+
+    def __run_in_thread(self) -> None:
+        """
+        Run the job inside the background thread, the result or exception is delivered by the future
+        :return: None
+        """
+        try:
+            self.run()
+        except BaseException as e:
+            logging.warning(f"Creating the credential definition of {self.schema_id} failed: {e!r}")
+
+    def run(self) -> str:
+        """
+        Get the credential definition id from the cache or create the credential definition (blocking)
+        :return: The credential definition id
+        """
+        if not self.future.set_running_or_notify_cancel():
+            return self.future.result()
+        try:
+            cred_def_id = self.store.get_credential_definition_id(self.schema_id, self.schema_tag) \
+                if self.store is not None else None
+            if cred_def_id is None:
+                logging.info(f"Creating the credential definition of {self.schema_id} (tag: {self.schema_tag})")
+                cred_def_id = self.api.create_credential_definition(
+                    self.schema_id, self.schema_tag, support_revocation=self.support_revocation,
+                    max_attempts=self.max_attempts, progress=self.progress, cancel_event=self.__cancel_event)
+                if self.store is not None:
+                    self.store.save_credential_definition_id(self.schema_id, self.schema_tag, cred_def_id)
+        except BaseException as e:
+            self.future.set_exception(e)
+            raise
+        self.future.set_result(cred_def_id)
+        return cred_def_id
+
+    def cancel(self) -> None:
+        """
+        Cancel the job, a running job stops before its next attempt
+        :return: None
+        """
+        self.__cancel_event.set()
+        self.future.cancel()
+
+    def cancelled(self) -> bool:
+        """
+        Check if the job is cancelled
+        :return: True if cancelled, False if not
+        """
+        return self.__cancel_event.is_set()
+
+    def done(self) -> bool:
+        """
+        Check if the job is done (created, failed or cancelled)
+        :return: True if done, False if not
+        """
+        return self.future.done()
+
+    def add_done_callback(self, callback: Callable[["CredentialDefinitionJob"], None]) -> None:
+        """
+        Add a callback that is called with the job when it is done
+        :param callback: The callback
+        :return: None
+        """
+        self.future.add_done_callback(lambda future: callback(self))
+
+    def result(self, timeout: float = None) -> str:
+        """
+        Wait for the credential definition id
+        :param timeout: The maximum amount of seconds to wait (optional)
+        :return: The credential definition id, raises the exception of the job when it failed or was cancelled
+        """
+        return self.future.result(timeout)
@@ -0,0 +1,118 @@
+import threading
+import json
+from typing import Any, Iterable, Iterator
+
+try:
+    # Optional, parses lazily: only the projected fields are converted to Python objects
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    # Optional, faster drop-in for json.loads
+    import orjson
+except ImportError:
+    orjson = None
+
+# The fastest available backend, used to decode the listings
+backend = "simdjson" if simdjson is not None else "orjson" if orjson is not None else "json"
+
+# simdjson parsers are not thread-safe and a parsed document is invalidated by the next parse, one parser per thread
+_parsers = threading.local()
+
+
+def loads(body: bytes) -> Any:
+    """
+    Decode a JSON document completely using orjson when available
+    :param body: The JSON document
+    :return: The decoded document
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def compile_fields(fields: Iterable[str]) -> dict:
+    """
+    Compile dotted field paths to a projection tree
+    eq. ("state", "presentation_request.name") -> {"state": None, "presentation_request": {"name": None}}
+    :param fields: The dotted field paths, a path includes everything below it
+    :return: The projection tree, None marks a field that is kept completely
+    """
+    tree = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split(".")
+        for parent in parents:
+            if node.get(parent, {}) is None:
+                # The parent is already kept completely
+                break
+            node = node.setdefault(parent, {})
+        else:
+            node[leaf] = None
+    return tree
+
+
+def project(value: Any, tree: dict) -> Any:
+    """
+    Project a decoded (dict) or lazily parsed (simdjson.Object) object
+    :param value: The object
+    :param tree: The projection tree (see compile_fields)
+    :return: A dict with only the projected fields, missing fields are left out
+    """
+    projected = {}
+    for key, subtree in tree.items():
+        if key not in value:
+            continue
+        field = value[key]
+        if subtree is None:
+            projected[key] = materialize(field)
+        elif isinstance(field, dict) or (simdjson is not None and isinstance(field, simdjson.Object)):
+            projected[key] = project(field, subtree)
+    return projected
+
+
+def materialize(value: Any) -> Any:
+    """
+    Convert a lazily parsed simdjson value to Python objects
+    :param value: The value
+    :return: The value as (a tree of) Python objects
+    """
+    if simdjson is not None:
+        if isinstance(value, simdjson.Object):
+            return value.as_dict()
+        if isinstance(value, simdjson.Array):
+            return value.as_list()
+    return value
+
+
+def parse_results(body: bytes, tree: dict = None) -> list:
+    """
+    Decode the results of an ACA-Py listing ({"results": [...]}), only the projected fields are decoded when
+    simdjson is available, otherwise the listing is decoded completely and projected afterwards
+    :param body: The response body
+    :param tree: The projection tree (see compile_fields), every field is kept when left empty
+    :return: The (projected) results
+    """
+    if simdjson is None:
+        results = loads(body)["results"]
+        return results if tree is None else [project(result, tree) for result in results]
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+        parser = _parsers.parser = simdjson.Parser()
+    # The projected results are converted before the parser is used again
+    results = parser.parse(body)["results"]
+    if tree is None:
+        return results.as_list()
+    return [project(result, tree) for result in results]
+
+
+def project_items(items: Iterable[dict], tree: dict = None) -> Iterator[dict]:
+    """
+    Project decoded items eq. the results of an incremental (ijson) parser
+    :param items: The decoded items
+    :param tree: The projection tree (see compile_fields), every field is kept when left empty
+    :return: An iterator of the projected items
+    """
+    for item in items:
+        yield item if tree is None else project(item, tree)
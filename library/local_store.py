@@ -0,0 +1,296 @@
+from cryptography.fernet import Fernet, InvalidToken
+import threading
+import sqlite3
+import logging
+import json
+import os
+from typing import Union
+
+try:
+    # Optional, keeps the encryption key inside the keychain of the OS instead of a key file
+    import keyring
+except ImportError:
+    keyring = None
+
+# Default location of the local store
+default_directory = os.path.join(os.path.expanduser("~"), ".mnnu-desktop")
+# Default location of the key file when keyring is not installed, kept apart from the database
+default_key_directory = os.path.join(os.path.expanduser("~"), ".config", "mnnu-desktop")
+# Environment variable that can contain the encryption key instead of the keychain or key file
+key_environment_variable = "MNNU_STORE_KEY"
+# The keychain service of the encryption key, the username is the path of the database
+keyring_service = "mnnu-desktop-store"
+
+# Every row belongs to a namespace, the url of the ACA-Py instance it was retrieved from (see set_namespace)
+tables = {
+    "connections": "CREATE TABLE IF NOT EXISTS connections ("
+                   "namespace TEXT NOT NULL, connection_id TEXT NOT NULL, state TEXT, data BLOB NOT NULL, "
+                   "PRIMARY KEY (namespace, connection_id))",
+    "records": "CREATE TABLE IF NOT EXISTS records ("
+               "namespace TEXT NOT NULL, connection_id TEXT NOT NULL, record_type TEXT NOT NULL, data BLOB NOT NULL, "
+               "PRIMARY KEY (namespace, connection_id, record_type))",
+    "schemas": "CREATE TABLE IF NOT EXISTS schemas ("
+               "namespace TEXT NOT NULL, schema_name TEXT NOT NULL, schema_version TEXT NOT NULL, data BLOB NOT NULL, "
+               "PRIMARY KEY (namespace, schema_name, schema_version))",
+    "credential_definitions": "CREATE TABLE IF NOT EXISTS credential_definitions ("
+                              "namespace TEXT NOT NULL, schema_id TEXT NOT NULL, tag TEXT NOT NULL, "
+                              "data BLOB NOT NULL, PRIMARY KEY (namespace, schema_id, tag))",
+}
+# Stored as the user_version of the database, the tables of an older version are recreated
+schema_version = 1
+
+
+class LocalStore:
+    def __init__(self, path: str = None, key: bytes = None, namespace: str = "", key_path: str = None):
+        """
+        LocalStore constructor, an encrypted SQLite store of the connections, verified records, schema ids and
+        credential definition ids
+        The store is used to show the last known data immediately at launch and when the ACA-Py instance is offline
+        Every stored value is encrypted with Fernet (AES-128-CBC + HMAC-SHA256)
+        The rows are kept per ACA-Py instance, only the rows of the current namespace are read and written
+        :param path: The path of the SQLite database (optional, defaults to ~/.mnnu-desktop/store.db)
+        :param key: The Fernet encryption key (optional, read from the MNNU_STORE_KEY environment variable, the keychain
+        of the OS when keyring is installed or the key file, the key is generated on first use)
+        :param namespace: The url of the ACA-Py instance (optional, see set_namespace)
+        :param key_path: The path of the key file when keyring is not installed (optional, defaults to
+        ~/.config/mnnu-desktop/store.key)
+        """
+        self.path = path or os.path.join(default_directory, "store.db")
+        self.key_path = key_path or os.path.join(default_key_directory, "store.key")
+        self.namespace = namespace
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.__fernet = Fernet(key or self.__load_key())
+        self.__lock = threading.Lock()
+        # The store is used by the UI and worker threads, access is serialized by the lock
+        self.__db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.__lock, self.__db:
+            if self.__db.execute("PRAGMA user_version").fetchone()[0] < schema_version:
+                # The rows of an older version can not be assigned to an ACA-Py instance, they are retrieved again
+                for table in tables:
+                    self.__db.execute(f"DROP TABLE IF EXISTS {table}")
+                self.__db.execute(f"PRAGMA user_version = {schema_version}")
+            for table in tables.values():
+                self.__db.execute(table)
+
+    def __load_key(self) -> bytes:
+        """
+        Load the encryption key from the environment, the keychain or the key file, the key is generated (and saved
+        inside the keychain or the key file) if it does not exist
+        A key file next to the database (created by a previous version) is moved to the keychain or the key file
+        :return: The key as bytes
+        """
+        if os.environ.get(key_environment_variable):
+            return os.environ[key_environment_variable].encode()
+        username = os.path.abspath(self.path)
+        key = keyring.get_password(keyring_service, username) if keyring is not None else None
+        if key:
+            return key.encode()
+        key = self.__read_key_file(self.key_path)
+        if key is not None and keyring is None:
+            return key
+        legacy_path = os.path.join(os.path.dirname(username), "store.key")
+        legacy_key = self.__read_key_file(legacy_path) if legacy_path != os.path.abspath(self.key_path) else None
+        key = key or legacy_key or Fernet.generate_key()
+        if keyring is not None:
+            keyring.set_password(keyring_service, username, key.decode())
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.key_path)), exist_ok=True)
+            # Only the current user is allowed to read the key file
+            fd = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(key)
+        if legacy_key is not None:
+            os.remove(legacy_path)
+            logging.info(f"Moved the encryption key of the local store away from {legacy_path}")
+        return key
+
+    @staticmethod
+    def __read_key_file(key_path: str) -> Union[bytes, None]:
+        """
+        Read a key file
+        :param key_path: The path of the key file
+        :return: The key as bytes, None if the key file does not exist
+        """
+        if not os.path.exists(key_path):
+            return None
+        with open(key_path, "rb") as f:
+            return f.read().strip()
+
+    def __encrypt(self, value) -> bytes:
+        """
+        Serialize and encrypt a value
+        :param value: The json serializable value
+        :return: The encrypted value
+        """
+        return self.__fernet.encrypt(json.dumps(value).encode("utf-8"))
+
+    def __decrypt(self, data: bytes):
+        """
+        Decrypt and deserialize a value
+        :param data: The encrypted value
+        :return: The value, None if the value can not be decrypted (eq. the key has changed)
+        """
+        try:
+            return json.loads(self.__fernet.decrypt(data))
+        except InvalidToken:
+            logging.warning("Unable to decrypt a value of the local store, was the key changed?")
+            return None
+
+    def set_namespace(self, namespace: str) -> None:
+        """
+        Select the ACA-Py instance whose rows are read and written
+        :param namespace: The url of the ACA-Py instance
+        :return: None
+        """
+        with self.__lock:
+            self.namespace = namespace
+
+    def clear(self) -> None:
+        """
+        Delete every row of the current namespace, eq. when the ACA-Py instance is reset
+        :return: None
+        """
+        with self.__lock, self.__db:
+            for table in tables:
+                self.__db.execute(f"DELETE FROM {table} WHERE namespace = ?", (self.namespace,))
+
+    def close(self) -> None:
+        """
+        Close the database
+        :return: None
+        """
+        with self.__lock:
+            self.__db.close()
+
+    def save_connections(self, connections: list, state: str = None) -> None:
+        """
+        Save connections, when a state is given the stored connections with that state are replaced
+        :param connections: The connections (as returned by ACA-Py)
+        :param state: The state the connections were retrieved with, replaces every connection with that state (optional)
+        :return: None
+        """
+        with self.__lock, self.__db:
+            rows = [(self.namespace, c["connection_id"], c.get("state"), self.__encrypt(c)) for c in connections]
+            if state is not None:
+                self.__db.execute("DELETE FROM connections WHERE namespace = ? AND state = ?", (self.namespace, state))
+            self.__db.executemany("INSERT OR REPLACE INTO connections VALUES (?, ?, ?, ?)", rows)
+
+    def get_connections(self, state: str = None) -> list:
+        """
+        Get the stored connections
+        :param state: Only get connections with this state (optional)
+        :return: The connections inside a list
+        """
+        with self.__lock:
+            if state is None:
+                rows = self.__db.execute("SELECT data FROM connections WHERE namespace = ?",
+                                         (self.namespace,)).fetchall()
+            else:
+                rows = self.__db.execute("SELECT data FROM connections WHERE namespace = ? AND state = ?",
+                                         (self.namespace, state)).fetchall()
+        return [c for c in (self.__decrypt(row[0]) for row in rows) if c is not None]
+
+    def get_active_connection_aliases(self) -> list:
+        """
+        Get the aliases of the stored active connections
+        :return: The aliases inside a list
+        """
+        return [c["alias"] for c in self.get_connections(state="active") if "alias" in c]
+
+    def delete_connection(self, conn_id: str) -> None:
+        """
+        Delete a connection and its records
+        :param conn_id: The connection id
+        :return: None
+        """
+        with self.__lock, self.__db:
+            self.__db.execute("DELETE FROM connections WHERE namespace = ? AND connection_id = ?",
+                              (self.namespace, conn_id))
+            self.__db.execute("DELETE FROM records WHERE namespace = ? AND connection_id = ?", (self.namespace, conn_id))
+
+    def save_records(self, conn_id: str, records: dict) -> None:
+        """
+        Save the verified records of a connection
+        :param conn_id: The connection id
+        :param records: The records, format: {"NAW": {"naam": "Pietje",...},...} (see get_verified_proof_records)
+        :return: None
+        """
+        with self.__lock, self.__db:
+            rows = [(self.namespace, conn_id, record_type, self.__encrypt(attributes))
+                    for record_type, attributes in records.items()]
+            self.__db.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", rows)
+
+    def get_records(self, conn_id: str) -> dict:
+        """
+        Get the stored verified records of a connection
+        :param conn_id: The connection id
+        :return: The records, format: {"NAW": {"naam": "Pietje",...},...}
+        """
+        with self.__lock:
+            rows = self.__db.execute(
+                "SELECT record_type, data FROM records WHERE namespace = ? AND connection_id = ?",
+                (self.namespace, conn_id)).fetchall()
+        records = {}
+        for record_type, data in rows:
+            attributes = self.__decrypt(data)
+            if attributes is not None:
+                records[record_type] = attributes
+        return records
+
+    def get_connection_id(self, alias: str) -> Union[str, None]:
+        """
+        Get the connection id of a stored connection by its alias
+        :param alias: The alias as a str
+        :return: The connection id as a str, None if there is no stored connection with this alias
+        """
+        for connection in self.get_connections():
+            if connection.get("alias") == alias:
+                return connection["connection_id"]
+        return None
+
+    def save_schema_id(self, schema_name: str, schema_version: str, schema_id: str) -> None:
+        """
+        Save the schema id of a schema
+        :param schema_name: The schema name
+        :param schema_version: The schema version
+        :param schema_id: The schema id on the ledger
+        :return: None
+        """
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO schemas VALUES (?, ?, ?, ?)",
+                              (self.namespace, schema_name, schema_version, self.__encrypt(schema_id)))
+
+    def get_schema_ids(self) -> dict:
+        """
+        Get the stored schema ids
+        :return: A dict with (schema name, schema version) as key and the schema id as value
+        """
+        with self.__lock:
+            rows = self.__db.execute("SELECT schema_name, schema_version, data FROM schemas WHERE namespace = ?",
+                                     (self.namespace,)).fetchall()
+        return {(name, version): self.__decrypt(data) for name, version, data in rows}
+
+    def save_credential_definition_id(self, schema_id: str, tag: str, cred_def_id: str) -> None:
+        """
+        Save the id of a created credential definition
+        :param schema_id: The schema id of the credential definition
+        :param tag: The tag of the credential definition
+        :param cred_def_id: The credential definition id
+        :return: None
+        """
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO credential_definitions VALUES (?, ?, ?, ?)",
+                              (self.namespace, schema_id, tag, self.__encrypt(cred_def_id)))
+
+    def get_credential_definition_id(self, schema_id: str, tag: str) -> Union[str, None]:
+        """
+        Get the id of a created credential definition
+        :param schema_id: The schema id of the credential definition
+        :param tag: The tag of the credential definition
+        :return: The credential definition id as a str, None if it was never created
+        """
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT data FROM credential_definitions WHERE namespace = ? AND schema_id = ? AND tag = ?",
+                (self.namespace, schema_id, tag)).fetchone()
+        return self.__decrypt(row[0]) if row is not None else None
@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+import json
+import os
+
+from library.api_handler import ApiHandler
+
+
+class Offboarding:
+    def __init__(self, api_instance: ApiHandler, journal_path: str = None, max_workers: int = 8):
+        """
+        Offboarding constructor, deletes the proof records and connections of many patients at once
+        Every deleted connection is written to the journal so an interrupted run can be resumed
+        :param api_instance: The ApiHandler instance
+        :param journal_path: The path of the journal file (optional, no journal is kept when left empty)
+        :param max_workers: The maximum amount of deletions that are executed at the same time
+        """
+        self.api = api_instance
+        self.journal_path = journal_path
+        self.max_workers = max_workers
+        self.__lock = threading.Lock()
+
+    def __read_journal(self) -> set:
+        """
+        Read the connection ids that are already offboarded from the journal
+        The incomplete last line of an interrupted run is removed so new entries start on a line of their own
+        :return: The offboarded connection ids inside a set
+        """
+        done = set()
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return done
+        with open(self.journal_path, "rb+") as f:
+            lines = f.read().split(b"\n")
+            # The last element is empty unless the last line is incomplete
+            if lines[-1]:
+                f.truncate(f.tell() - len(lines[-1]))
+            for line in lines[:-1]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("step") == "connection":
+                    done.add(entry["connection_id"])
+        return done
+
+    def __write_journal(self, entry: dict) -> None:
+        """
+        Append an entry to the journal
+        :param entry: The journal entry
+        :return: None
+        """
+        if not self.journal_path:
+            return
+        with self.__lock:
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __delete_connection(self, conn_id: str) -> bool:
+        """
+        Delete a connection (without its records) and journal it
+        A connection that does not exist anymore was deleted by an interrupted run before it was journaled
+        :param conn_id: The connection id
+        :return: True if deleted, False if not
+        """
+        if not self.api.delete_connection(conn_id, delete_records=False, missing_ok=True):
+            return False
+        self.__write_journal({"step": "connection", "connection_id": conn_id})
+        return True
+
+    def run(self, conn_ids: list) -> dict:
+        """
+        Offboard the patients with the given connection ids
+        First the proof records of every patient are listed, then the records are deleted, then the connections
+        Each phase is executed with at most max_workers concurrent requests
+        :param conn_ids: The connection ids of the patients
+        :return: A report dict with the connection id as key and as value a dict with: deleted (bool),
+        records_deleted (int), resumed (bool, already offboarded by a previous run) and errors (list of str)
+        """
+        done = self.__read_journal()
+        report = {conn_id: {"deleted": conn_id in done, "records_deleted": 0, "resumed": conn_id in done, "errors": []}
+                  for conn_id in conn_ids}
+        pending = [conn_id for conn_id in report if conn_id not in done]
+        logging.info(f"Offboarding {len(pending)} patient(s), {len(report) - len(pending)} already offboarded")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # List the proof records of every patient
+            listings = {conn_id: executor.submit(self.api.get_proof_records, state="", role="", conn_id=conn_id)
+                        for conn_id in pending}
+            deletions = {}
+            for conn_id, listing in listings.items():
+                try:
+                    deletions[conn_id] = [executor.submit(self.api.delete_proof_record, record["pres_ex_id"])
+                                          for record in listing.result()]
+                except Exception as e:
+                    report[conn_id]["errors"].append(f"Unable to list the proof records: {e}")
+            # Delete the connections whose records are all deleted
+            connections = {}
+            for conn_id, futures in deletions.items():
+                for future in futures:
+                    try:
+                        if future.result():
+                            report[conn_id]["records_deleted"] += 1
+                        else:
+                            report[conn_id]["errors"].append("Unable to delete a proof record")
+                    except Exception as e:
+                        report[conn_id]["errors"].append(f"Unable to delete a proof record: {e}")
+                if not report[conn_id]["errors"]:
+                    connections[conn_id] = executor.submit(self.__delete_connection, conn_id)
+            for conn_id, future in connections.items():
+                try:
+                    report[conn_id]["deleted"] = future.result()
+                    if not report[conn_id]["deleted"]:
+                        report[conn_id]["errors"].append("Unable to delete the connection")
+                except Exception as e:
+                    report[conn_id]["errors"].append(f"Unable to delete the connection: {e}")
+        logging.info(f"Offboarded {sum(1 for result in report.values() if result['deleted'])} patient(s)")
+        return report
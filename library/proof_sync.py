@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import Any, Callable
+
+
+class ProofRecordSync:
+    def __init__(self, fetch: Callable[[], list], parse: Callable[[dict], Any] = None,
+                 matches: Callable[[dict], bool] = None):
+        """
+        ProofRecordSync constructor, keeps a local map of presentation exchange records
+        Records are only (re)parsed when their updated_at changes, callers receive the changes as deltas
+        :param fetch: Function that retrieves the current exchange records (as returned by ACA-Py)
+        :param parse: Function that converts an exchange record to the stored value (optional, stores the record)
+        :param matches: Function that checks if a webhook record belongs to this sync (optional, accepts every record)
+        """
+        self.__fetch = fetch
+        self.__parse = parse or (lambda record: record)
+        self.__matches = matches or (lambda record: True)
+        self.__lock = threading.RLock()
+        # presentation_exchange_id -> (updated_at, parsed value)
+        self.__records = {}
+        self.__last_sync = None
+
+    @staticmethod
+    def __empty_delta() -> dict:
+        """
+        Create an empty delta
+        :return: The delta, added and updated contain the parsed values, removed the presentation exchange ids
+        """
+        return {"added": [], "updated": [], "removed": []}
+
+    def __apply(self, record: dict, delta: dict) -> None:
+        """
+        Add or update a single exchange record, the record is only parsed when it has changed
+        :param record: The exchange record
+        :param delta: The delta to add the change to
+        :return: None
+        """
+        pres_ex_id = record["presentation_exchange_id"]
+        updated_at = record.get("updated_at", "")
+        known = self.__records.get(pres_ex_id)
+        if known is not None and known[0] >= updated_at:
+            return
+        value = self.__parse(record)
+        self.__records[pres_ex_id] = (updated_at, value)
+        delta["updated" if known is not None else "added"].append(value)
+
+    def sync(self, max_age: float = 0) -> dict:
+        """
+        Synchronize the local map with ACA-Py
+        :param max_age: Skip retrieving the records when the last sync is younger than max_age seconds, use this when
+        the records are kept up-to-date with webhook events
+        :return: The delta (see __empty_delta) since the last sync
+        """
+        delta = self.__empty_delta()
+        if self.__last_sync is not None and time.monotonic() - self.__last_sync < max_age:
+            return delta
+        records = self.__fetch()
+        with self.__lock:
+            retrieved = set()
+            for record in records:
+                retrieved.add(record["presentation_exchange_id"])
+                self.__apply(record, delta)
+            for pres_ex_id in set(self.__records) - retrieved:
+                del self.__records[pres_ex_id]
+                delta["removed"].append(pres_ex_id)
+            self.__last_sync = time.monotonic()
+        return delta
+
+    def apply_event(self, record: dict) -> dict:
+        """
+        Apply an exchange record received from the present_proof webhook
+        :param record: The exchange record
+        :return: The delta caused by the record
+        """
+        delta = self.__empty_delta()
+        with self.__lock:
+            if self.__matches(record):
+                self.__apply(record, delta)
+            elif record.get("presentation_exchange_id") in self.__records:
+                # The record no longer matches eq. its state changed
+                self.remove(record["presentation_exchange_id"])
+                delta["removed"].append(record["presentation_exchange_id"])
+        return delta
+
+    def remove(self, pres_ex_id: str) -> bool:
+        """
+        Remove an exchange record from the local map eq. after it has been deleted
+        :param pres_ex_id: The presentation exchange id
+        :return: True if the record was known, False if not
+        """
+        with self.__lock:
+            return self.__records.pop(pres_ex_id, None) is not None
+
+    def values(self) -> list:
+        """
+        Get the parsed values of every known exchange record, ordered by updated_at
+        :return: The parsed values inside a list
+        """
+        with self.__lock:
+            return [value for _, value in sorted(self.__records.values(), key=lambda item: item[0])]
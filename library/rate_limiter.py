@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        RateLimiter constructor, a thread-safe token bucket that limits the amount of requests per second
+        :param rate: The maximum amount of requests per second
+        :param burst: The maximum amount of requests that are allowed at once after an idle period
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.__lock = threading.Lock()
+        self.__tokens = float(self.burst)
+        self.__updated = time.monotonic()
+
+    def acquire(self) -> float:
+        """
+        Wait until a request is allowed
+        :return: The amount of seconds waited
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            # Reserve a token, a negative amount of tokens is the queue of waiting requests
+            self.__tokens -= 1
+            wait = -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,85 @@
+import importlib
+import pkgutil
+import logging
+import os
+
+from library.api_handler import ApiHandler
+from helpers.requested_attribute_generator import generate_requested_attributes
+
+# The directory of the schema.py files, every module level schema dict inside it is a record type
+schemas_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schemas")
+
+
+class SchemaCatalog(dict):
+    def __init__(self, schemas: dict = None):
+        """
+        SchemaCatalog constructor, a dict of the record types (eq. {"NAW": naw,...}) that caches the requested
+        attributes and the serialized proof request template of every record type
+        :param schemas: The schemas with the record type as key (optional, use load to read the schemas directory)
+        """
+        super(SchemaCatalog, self).__init__()
+        self.__requested_attributes = {}
+        self.__templates = {}
+        for key, schema in (schemas or {}).items():
+            self.add(key, schema)
+
+    @staticmethod
+    def is_schema(value) -> bool:
+        """
+        Check if a value is a schema dict
+        :param value: The value
+        :return: True if the value is a schema, False if not
+        """
+        return isinstance(value, dict) and {"schema_name", "schema_version", "attributes"} <= value.keys()
+
+    @classmethod
+    def load(cls, directory: str = schemas_directory, package: str = "schemas") -> "SchemaCatalog":
+        """
+        Load every schema of the schema.py files, the record type is the upper case variable name (eq. naw -> NAW)
+        :param directory: The directory of the schema.py files
+        :param package: The package name of the directory
+        :return: The catalog
+        """
+        catalog = cls()
+        for module_info in sorted(pkgutil.iter_modules([directory]), key=lambda info: info.name):
+            try:
+                module = importlib.import_module(f"{package}.{module_info.name}")
+            except Exception as e:
+                logging.warning(f"Unable to load the schemas of {module_info.name}: {e}")
+                continue
+            for name, value in vars(module).items():
+                if not name.startswith("_") and cls.is_schema(value):
+                    catalog.add(name.upper(), value)
+        logging.info(f"Loaded {len(catalog)} record type(s): {', '.join(catalog)}")
+        return catalog
+
+    def add(self, key: str, schema: dict) -> None:
+        """
+        Add a record type and precompile its requested attributes and proof request template
+        :param key: The record type (eq. NAW)
+        :param schema: The schema
+        :return: None
+        """
+        self[key] = schema
+
+    def __setitem__(self, key: str, schema: dict) -> None:
+        super(SchemaCatalog, self).__setitem__(key, schema)
+        self.__requested_attributes[key] = generate_requested_attributes(schema)
+        self.__templates[key] = ApiHandler.build_proof_request_template(self.__requested_attributes[key])
+
+    def requested_attributes(self, key: str) -> dict:
+        """
+        Get the requested attributes of a record type
+        NOTE: The dict is shared, do not modify it
+        :param key: The record type (eq. NAW)
+        :return: The requested attributes (see generate_requested_attributes)
+        """
+        return self.__requested_attributes[key]
+
+    def proof_request_template(self, key: str) -> list:
+        """
+        Get the serialized proof request template of a record type
+        :param key: The record type (eq. NAW)
+        :return: The template (see ApiHandler.send_proof_request_from_template)
+        """
+        return self.__templates[key]
@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+from typing import Tuple, Union
+
+from library.api_handler import ApiHandler
+from library.local_store import LocalStore
+
+
+class SchemaRegistry:
+    def __init__(self, api_instance: ApiHandler, store: LocalStore = None, max_workers: int = 4):
+        """
+        SchemaRegistry constructor, keeps the ids of the created schemas indexed by (schema name, schema version)
+        The known schema ids are loaded from the local store so they are available immediately at launch
+        :param api_instance: The ApiHandler instance
+        :param store: The LocalStore instance used to persist the schema ids (optional)
+        :param max_workers: The maximum amount of schemas that are created at the same time
+        """
+        self.api = api_instance
+        self.store = store
+        self.max_workers = max_workers
+        self.__lock = threading.Lock()
+        # (schema name, schema version) -> schema id, of the namespace (ACA-Py instance) of the store
+        self.__loaded = False
+        self.__namespace = None
+        self.__ids = {}
+        # The (schema name, schema version) of every schema created on the ACA-Py instance, None until refreshed
+        self.__created = None
+        self.__load()
+
+    def __load(self) -> None:
+        """
+        Load the schema ids of the current namespace of the store, when the namespace has changed (see
+        ApiHandler.set_url) the ids and created schemas of the previous ACA-Py instance are forgotten
+        :return: None
+        """
+        namespace = self.store.namespace if self.store is not None else None
+        with self.__lock:
+            if self.__loaded and self.__namespace == namespace:
+                return
+            self.__loaded = True
+            self.__namespace = namespace
+            self.__ids = dict(self.store.get_schema_ids()) if self.store is not None else {}
+            self.__created = None
+
+    @staticmethod
+    def parse_schema_id(schema_id: str) -> Union[Tuple[str, str], None]:
+        """
+        Get the schema name and version from a schema id, the format is: {did}:2:{schema name}:{schema version}
+        :param schema_id: The schema id as a str
+        :return: A tuple with the schema name and version, None if the schema id is invalid
+        """
+        parts = schema_id.split(":")
+        if len(parts) != 4:
+            return None
+        return parts[2], parts[3]
+
+    def __save(self, name: str, version: str, schema_id: str) -> None:
+        """
+        Index a schema id and persist it inside the local store
+        :param name: The schema name
+        :param version: The schema version
+        :param schema_id: The schema id
+        :return: None
+        """
+        with self.__lock:
+            if self.__ids.get((name, version)) == schema_id:
+                return
+            self.__ids[(name, version)] = schema_id
+        if self.store is not None:
+            self.store.save_schema_id(name, version, schema_id)
+
+    def refresh(self) -> None:
+        """
+        Retrieve the ids of the created schemas from the ACA-Py instance (a single request)
+        :return: None
+        """
+        self.__load()
+        created = set()
+        for schema_id in self.api.get_schemas():
+            key = self.parse_schema_id(schema_id)
+            if key is None:
+                continue
+            created.add(key)
+            self.__save(*key, schema_id)
+        with self.__lock:
+            self.__created = created
+
+    def get_schema_id(self, name: str, version: str) -> Union[str, None]:
+        """
+        Get the id of a schema
+        :param name: The schema name
+        :param version: The schema version
+        :return: The schema id as a str, None if the schema is unknown
+        """
+        self.__load()
+        with self.__lock:
+            return self.__ids.get((name, version))
+
+    def exists(self, name: str, version: str) -> bool:
+        """
+        Check if a schema is created on the ACA-Py instance, refreshes the registry when it was never refreshed
+        :param name: The schema name
+        :param version: The schema version
+        :return: True if created, False if not
+        """
+        self.__load()
+        if self.__created is None:
+            self.refresh()
+        return (name, version) in self.__created
+
+    def ensure(self, schemas: dict) -> dict:
+        """
+        Create the schemas that do not exist (or are not up-to-date) on the ACA-Py instance
+        The created schema ids are retrieved once (the stored ids are not trusted, the instance might have been reset)
+        and the missing schemas are created concurrently
+        :param schemas: The schemas, format: {"NAW": naw,...} (see schemas/)
+        :return: A dict with the schema key (eq. NAW) as key and the schema id as value
+        """
+        self.refresh()
+        missing = {}
+        for key, schema in schemas.items():
+            if self.exists(schema["schema_name"], schema["schema_version"]):
+                logging.info(f"The {key} schema exists and is up-to-date (version: {schema['schema_version']})")
+            else:
+                logging.info(f"The {key} schema does not exist or is not up-to-date, creating...")
+                missing[key] = schema
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                futures = {key: executor.submit(self.api.create_schema, schema=schema)
+                           for key, schema in missing.items()}
+                for key, future in futures.items():
+                    schema = missing[key]
+                    self.__save(schema["schema_name"], schema["schema_version"], future.result()["id"])
+                    with self.__lock:
+                        self.__created.add((schema["schema_name"], schema["schema_version"]))
+        return {key: self.get_schema_id(schema["schema_name"], schema["schema_version"])
+                for key, schema in schemas.items()}
@@ -0,0 +1,135 @@
+import threading
+import logging
+import time
+from typing import Callable, Union
+
+
+class StatusMonitor:
+    def __init__(self, probe: Callable[[], dict], ttl: float = 5.0, failure_threshold: int = 3,
+                 reset_timeout: float = 10.0):
+        """
+        StatusMonitor constructor, caches the agent status and acts as a circuit breaker for the agent
+        After failure_threshold consecutive failures the circuit opens and requests fail fast without network calls,
+        a background probe (half-open) closes the circuit again once the agent responds
+        :param probe: Function that retrieves the agent status (/status), raises an exception when the agent is down
+        :param ttl: The amount of seconds the agent status is cached
+        :param failure_threshold: The amount of consecutive failures that opens the circuit
+        :param reset_timeout: The amount of seconds between the background probes while the circuit is open
+        """
+        self.__probe = probe
+        self.ttl = ttl
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__lock = threading.RLock()
+        self.__state = "closed"
+        self.__failures = 0
+        self.__status = None
+        self.__status_time = 0
+        self.__timer = None
+
+    @property
+    def state(self) -> str:
+        """
+        The circuit state: closed, open or half_open
+        :return: The state as a str
+        """
+        return self.__state
+
+    def reset(self) -> None:
+        """
+        Close the circuit and clear the cached status eq. when the agent url changes
+        :return: None
+        """
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            self.__state = "closed"
+            self.__failures = 0
+            self.__status = None
+
+    def allow_request(self) -> bool:
+        """
+        Check if a request to the agent is allowed
+        :return: False if the circuit is open (the agent is down), True if not
+        """
+        return self.__state == "closed"
+
+    def record_success(self) -> None:
+        """
+        Record a successful request, closes the circuit
+        :return: None
+        """
+        with self.__lock:
+            self.__failures = 0
+            if self.__state != "closed":
+                logging.info("Connection with the agent restored, closing the circuit")
+                self.__state = "closed"
+
+    def record_failure(self) -> None:
+        """
+        Record a failed request, opens the circuit after failure_threshold consecutive failures
+        :return: None
+        """
+        with self.__lock:
+            self.__failures += 1
+            self.__status = None
+            if self.__state == "closed" and self.__failures >= self.failure_threshold:
+                logging.warning(f"The agent failed {self.__failures} times, opening the circuit")
+                self.__open()
+            elif self.__state == "half_open":
+                self.__open()
+
+    def __open(self) -> None:
+        """
+        Open the circuit and schedule the background probe
+        :return: None
+        """
+        self.__state = "open"
+        if self.__timer is not None:
+            self.__timer.cancel()
+        self.__timer = threading.Timer(self.reset_timeout, self.__probe_half_open)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    def __probe_half_open(self) -> None:
+        """
+        Probe the agent while the circuit is half-open, executed inside the timer thread
+        :return: None
+        """
+        with self.__lock:
+            if self.__state != "open":
+                return
+            self.__state = "half_open"
+            self.__timer = None
+        self.get_status(force=True)
+
+    def get_status(self, force: bool = False) -> Union[dict, None]:
+        """
+        Get the agent status, the status is cached for ttl seconds
+        :param force: Probe the agent even if the circuit is open or the cached status is still valid
+        :return: The status as a dict, None if the agent is down
+        """
+        with self.__lock:
+            if not force:
+                if self.__state != "closed":
+                    return None
+                if self.__status is not None and time.monotonic() - self.__status_time < self.ttl:
+                    return self.__status
+        try:
+            status = self.__probe()
+        except Exception:
+            self.record_failure()
+            return None
+        with self.__lock:
+            self.__status = status
+            self.__status_time = time.monotonic()
+        self.record_success()
+        return status
+
+    def is_available(self) -> bool:
+        """
+        Check if the agent is available using the cached status
+        :return: True if available, False if not
+        """
+        return self.get_status() is not None
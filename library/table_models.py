@@ -0,0 +1,210 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+from collections import namedtuple
+from typing import Any, Callable
+
+# Custom item data roles
+RowRole = QtCore.Qt.UserRole  # The complete row
+SortRole = QtCore.Qt.UserRole + 1  # The value the rows are sorted by
+ButtonRole = QtCore.Qt.UserRole + 2  # True if the cell is painted as a button
+
+# A table column
+# header: The header text
+# display: Function that converts a row to the displayed text
+# sort: Function that converts a row to the value the column is sorted by (optional, sorts by the displayed text)
+# button: Function that checks if the cell of a row is painted as a button (optional, the cell is never a button)
+Column = namedtuple("Column", ["header", "display", "sort", "button"], defaults=[None, None])
+
+
+class TableModel(QtCore.QAbstractTableModel):
+    def __init__(self, columns: list, key: Callable[[Any], Any] = None, parent: QtCore.QObject = None):
+        """
+        TableModel constructor, a read-only table model of rows (eq. the dicts returned by the ApiHandler)
+        Only the visible cells are converted to text by the view, so large tables are shown instantly
+        :param columns: The columns of the table as a list of Column
+        :param key: Function that returns the unique key of a row, used by removeRowByKey and setRowEnabled (optional)
+        :param parent: The parent QObject (optional)
+        """
+        super(TableModel, self).__init__(parent)
+        self.columns = columns
+        self.__key = key or (lambda row: row)
+        self.__rows = []
+        # The keys of the rows whose buttons are disabled eq. while the button action is executed
+        self.__disabled = set()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.__rows)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: int = QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.columns[section].header
+        return None
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.__rows[index.row()]
+        column = self.columns[index.column()]
+        if role == QtCore.Qt.DisplayRole:
+            return column.display(row)
+        if role == SortRole:
+            return column.sort(row) if column.sort else column.display(row)
+        if role == ButtonRole:
+            return bool(column.button and column.button(row))
+        if role == RowRole:
+            return row
+        return None
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlags:
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        if self.__key(self.__rows[index.row()]) in self.__disabled:
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled
+
+    def setRows(self, rows: list) -> None:
+        """
+        Replace every row
+        :param rows: The rows
+        :return: None
+        """
+        self.beginResetModel()
+        self.__rows = list(rows)
+        self.__disabled.clear()
+        self.endResetModel()
+
+    def appendRows(self, rows: list) -> None:
+        """
+        Append rows without resetting the table eq. while the rows are being received
+        :param rows: The rows
+        :return: None
+        """
+        if not rows:
+            return
+        start = len(self.__rows)
+        self.beginInsertRows(QtCore.QModelIndex(), start, start + len(rows) - 1)
+        self.__rows.extend(rows)
+        self.endInsertRows()
+
+    def removeRowByKey(self, key) -> bool:
+        """
+        Remove the row with the given key
+        :param key: The key of the row
+        :return: True if removed, False if there is no row with this key
+        """
+        for i, row in enumerate(self.__rows):
+            if self.__key(row) == key:
+                self.beginRemoveRows(QtCore.QModelIndex(), i, i)
+                del self.__rows[i]
+                self.endRemoveRows()
+                self.__disabled.discard(key)
+                return True
+        return False
+
+    def setRowEnabled(self, key, enabled: bool) -> None:
+        """
+        Enable or disable the buttons of the row with the given key
+        :param key: The key of the row
+        :param enabled: True to enable, False to disable
+        :return: None
+        """
+        if enabled:
+            self.__disabled.discard(key)
+        else:
+            self.__disabled.add(key)
+        for i, row in enumerate(self.__rows):
+            if self.__key(row) == key:
+                self.dataChanged.emit(self.index(i, 0), self.index(i, len(self.columns) - 1))
+                return
+
+
+class TableFilterModel(QtCore.QSortFilterProxyModel):
+    def __init__(self, source: TableModel, parent: QtCore.QObject = None):
+        """
+        TableFilterModel constructor, sorts the rows of a TableModel and filters them on the text of every column
+        :param source: The TableModel
+        :param parent: The parent QObject (optional)
+        """
+        super(TableFilterModel, self).__init__(parent)
+        self.setSourceModel(source)
+        self.setSortRole(SortRole)
+        self.setFilterKeyColumn(-1)
+        self.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.setSortCaseSensitivity(QtCore.Qt.CaseInsensitive)
+
+
+class ButtonDelegate(QtWidgets.QStyledItemDelegate):
+    # Emitted with the clicked row
+    clicked = QtCore.pyqtSignal(object)
+
+    def __init__(self, icon: QtGui.QIcon = None, parent: QtCore.QObject = None):
+        """
+        ButtonDelegate constructor, paints the cells with the ButtonRole as push buttons
+        Unlike QTableWidget.setCellWidget no widget is created per row
+        :param icon: The button icon (optional)
+        :param parent: The parent QObject (optional)
+        """
+        super(ButtonDelegate, self).__init__(parent)
+        self.icon = icon
+        self.__pressed = None
+
+    def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex):
+        if not index.data(ButtonRole):
+            super(ButtonDelegate, self).paint(painter, option, index)
+            return
+        button = QtWidgets.QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(QtCore.Qt.DisplayRole) or ""
+        if self.icon is not None:
+            button.icon = self.icon
+            button.iconSize = QtCore.QSize(16, 16)
+        if index.flags() & QtCore.Qt.ItemIsEnabled:
+            button.state = QtWidgets.QStyle.State_Enabled
+            if self.__pressed is not None and self.__pressed == index:
+                button.state |= QtWidgets.QStyle.State_Sunken
+        else:
+            button.state = QtWidgets.QStyle.State_None
+        style = option.widget.style() if option.widget else QtWidgets.QApplication.style()
+        style.drawControl(QtWidgets.QStyle.CE_PushButton, button, painter, option.widget)
+
+    def sizeHint(self, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> QtCore.QSize:
+        size = super(ButtonDelegate, self).sizeHint(option, index)
+        if index.data(ButtonRole):
+            size.setHeight(max(size.height(), 27))
+            size.setWidth(size.width() + 40)
+        return size
+
+    def editorEvent(self, event: QtCore.QEvent, model: QtCore.QAbstractItemModel,
+                    option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> bool:
+        if not index.data(ButtonRole) or not index.flags() & QtCore.Qt.ItemIsEnabled:
+            return False
+        if event.type() == QtCore.QEvent.MouseButtonPress and event.button() == QtCore.Qt.LeftButton:
+            self.__pressed = QtCore.QPersistentModelIndex(index)
+            return True
+        if event.type() == QtCore.QEvent.MouseButtonRelease and event.button() == QtCore.Qt.LeftButton:
+            pressed, self.__pressed = self.__pressed, None
+            if pressed is not None and pressed == index and option.rect.contains(event.pos()):
+                self.clicked.emit(index.data(RowRole))
+            return True
+        return False
+
+
+def setupTableView(view: QtWidgets.QTableView, model: QtCore.QAbstractItemModel, stretch: tuple = (),
+                   row_height: int = 30) -> None:
+    """
+    Configure a table view for large models, the row heights are fixed so they are not measured per row
+    :param view: The table view
+    :param model: The (proxy) model
+    :param stretch: The columns that are stretched, the other columns are sized to their header
+    :param row_height: The height of every row
+    :return: None
+    """
+    view.setModel(model)
+    view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+    view.verticalHeader().setDefaultSectionSize(row_height)
+    header = view.horizontalHeader()
+    for i in range(model.columnCount()):
+        header.setSectionResizeMode(
+            i, QtWidgets.QHeaderView.Stretch if i in stretch else QtWidgets.QHeaderView.Interactive)
@@ -0,0 +1,139 @@
+from PyQt5 import QtCore
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import logging
+import json
+
+from library.api_handler import ApiHandler
+
+# Default address of the webhook listener, start ACA-Py with: --webhook-url http://localhost:8022
+default_host = "localhost"
+default_port = 8022
+
+
+class WebhookListener(QtCore.QObject):
+    # Emitted with the connection record when ACA-Py sends a connections webhook
+    connectionEvent = QtCore.pyqtSignal(dict)
+    # Emitted with the presentation exchange record when ACA-Py sends a present_proof webhook
+    presentProofEvent = QtCore.pyqtSignal(dict)
+
+    def __init__(self, api_instance: ApiHandler = None, host: str = default_host, port: int = default_port,
+                 parent: QtCore.QObject = None):
+        """
+        WebhookListener constructor, a lightweight HTTP server that receives the ACA-Py webhooks
+        ACA-Py posts the events to {webhook url}/topic/{topic}/
+        :param api_instance: The ApiHandler instance whose caches are updated with the events (optional)
+        :param host: The host to listen on
+        :param port: The port to listen on
+        :param parent: The parent QObject (optional)
+        """
+        super(WebhookListener, self).__init__(parent)
+        self.api = api_instance
+        self.host = host
+        self.port = port
+        self.__server = None
+        self.__thread = None
+        # Set when the first webhook is received, a bound port does not mean ACA-Py sends its webhooks to it
+        self.__receiving = threading.Event()
+
+    def start(self) -> bool:
+        """
+        Start listening for webhooks inside a background thread
+        The ApiHandler caches are only trusted once the first webhook is received (see isReceiving)
+        :return: True if the listener is running, False if the port could not be opened
+        """
+        if self.isRunning():
+            return True
+        try:
+            self.__server = ThreadingHTTPServer((self.host, self.port), self.__createRequestHandler())
+        except OSError as e:
+            logging.warning(f"Unable to start the webhook listener on {self.host}:{self.port}: {e}")
+            self.__server = None
+            return False
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="WebhookListener", daemon=True)
+        self.__thread.start()
+        logging.info(f"Listening for ACA-Py webhooks on {self.host}:{self.port}")
+        return True
+
+    def stop(self) -> None:
+        """
+        Stop listening for webhooks
+        :return: None
+        """
+        if self.__server is None:
+            return
+        if self.__receiving.is_set():
+            self.__receiving.clear()
+            if self.api is not None:
+                self.api.set_webhooks_active(False)
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__server = None
+        self.__thread = None
+
+    def isRunning(self) -> bool:
+        """
+        Check if the listener is running
+        :return: True if running, False if not
+        """
+        return self.__server is not None
+
+    def isReceiving(self) -> bool:
+        """
+        Check if webhooks are received, ACA-Py only sends them when it is started with --webhook-url
+        Keep polling until this returns True
+        :return: True if the listener is running and at least one webhook has been received, False if not
+        """
+        return self.isRunning() and self.__receiving.is_set()
+
+    def handleEvent(self, topic: str, payload: dict) -> None:
+        """
+        Handle a received webhook, the caches are updated before the signal is emitted
+        NOTE: This function is executed inside the listener thread
+        :param topic: The webhook topic eq. connections or present_proof
+        :param payload: The webhook payload
+        :return: None
+        """
+        if not self.__receiving.is_set():
+            self.__receiving.set()
+            logging.info("Receiving ACA-Py webhooks, polling is no longer needed")
+            if self.api is not None:
+                self.api.set_webhooks_active(True)
+        if self.api is not None:
+            self.api.apply_webhook_event(topic, payload)
+        if topic == "connections":
+            self.connectionEvent.emit(payload)
+        elif topic == "present_proof":
+            self.presentProofEvent.emit(payload)
+
+    def __createRequestHandler(self) -> type:
+        """
+        Create the request handler class of the HTTP server
+        :return: The request handler class
+        """
+        listener = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                parts = self.path.strip("/").split("/")
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                # Respond immediately, ACA-Py does not need to wait for the event to be handled
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                if len(parts) != 2 or parts[0] != "topic":
+                    return
+                try:
+                    payload = json.loads(body) if body else {}
+                except ValueError:
+                    logging.warning(f"Received invalid webhook payload for topic {parts[1]}")
+                    return
+                listener.handleEvent(parts[1], payload)
+
+            def log_message(self, format, *args):
+                # Don't log every request to stderr
+                pass
+
+        return RequestHandler
@@ -1,54 +1,79 @@
+from helpers.startup_profiler import profiler
 import sys
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import QMainWindow, QMessageBox, QApplication
-import qrcode
-import tempfile
-import uuid
 import re
 import logging
+from typing import Union
 
+# NOTE: The dialogs (controller) and qrcode are imported when they are used for the first time to speed up startup
 from ui.MainWindow import Ui_MainWindow
-from controller.settings import Settings
-from controller.connections import Connections
-from controller.records import Records
 from library.api_handler import ApiHandler
-from schemas.naw import naw
-from helpers.requested_attribute_generator import generate_requested_attributes
+from library.api_worker import ApiWorker
+from library.webhook_listener import WebhookListener
+from library.local_store import LocalStore
+from library.schema_registry import SchemaRegistry
+from library.table_models import TableModel, Column, setupTableView
+from library.schema_catalog import SchemaCatalog
+from helpers.qr_code import render_qr_image
+from helpers.logger import setup_logging
 
 
 class MainWindow(QMainWindow, Ui_MainWindow):
     def __init__(self, *args, obj=None, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
-        self.setupUi(self)
+        with profiler.phase("setup ui"):
+            self.setupUi(self)
         # TODO: Create config file to save certain properties like the ACA-PY instance port/ip and medical profession
         # Docs: https://doc.qt.io/qt-5/qsettings.html
         # Disable the dialog help button globally
         QApplication.setAttribute(QtCore.Qt.AA_DisableWindowContextHelpButton)
 
-        # Setup logger
-        logging.basicConfig(filename="MNNU-Desktop.log", level=logging.INFO)
-        # Add handler to also log to the terminal
-        logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+        # Setup logger, the records are written (JSON, rotated and compressed) to MNNU-Desktop.log and the terminal by a
+        # background thread so logging never blocks the UI
+        setup_logging()
         logging.info("Logging started...")
 
-        # Create API Handler instance with default ip and port
+        # Open the encrypted local store, used to show the last known data at launch and when ACA-Py is offline
+        with profiler.phase("open local store"):
+            self.store = LocalStore()
+        # Create API Handler instance with default ip and port, the store keeps the data of this ACA-Py instance
         # TODO: Read ip and port from config if exists, otherwise use default values
-        self.api = ApiHandler("localhost", 7001)
+        self.api = ApiHandler("localhost", 7001, store=self.store)
+        # Create API worker so the ApiHandler calls are executed in the background and never block the UI
+        self.worker = ApiWorker(self.api, self)
+        self.worker.busyChanged.connect(self.__onWorkerBusyChanged)
         # Disable the patient tabs on startup
         self.__patientTabsEnabled(False)
+        # Record table models, format of the rows: (attribute name, value)
+        self.nawModel = TableModel([Column("", lambda r: r[0]), Column("", lambda r: r[1])], parent=self)
+        setupTableView(self.nawTable, self.nawModel, stretch=(1,))
+        self.nawTable.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeToContents)
 
-        # Configure available schemas
-        self.schemas = {"NAW": naw, }
+        # Load the available schemas (record types) from the schemas directory
+        self.schemas = SchemaCatalog.load()
+        self.__fillRecordTypeBox()
+        # Keeps the ids of the created schemas, the known ids are read from the local store
+        self.schemaRegistry = SchemaRegistry(self.api, self.store)
 
         #####################
         #  State variables  #
         #####################
-        # Fill the patient selection box
-        self.__fillPatientSelectionBox(self.api.get_active_connection_aliases())
-        # Temp dir for images and misc stuff will be removed when program closes
-        self.tempDir = tempfile.TemporaryDirectory()
+        # Fill the patient selection box with the stored patients, they are reconciled with ACA-Py after startup
+        with profiler.phase("read local store"):
+            self.__fillPatientSelectionBox(self.store.get_active_connection_aliases())
         # Keep track of the current alias
         self.currentAlias = None
+        # Keep track of the alias of the last generated invite
+        self.inviteAlias = None
+
+        ####################
+        #     Webhooks     #
+        ####################
+        # Receive the ACA-Py events so the connections and records are updated without polling
+        self.webhooks = WebhookListener(self.api, parent=self)
+        self.webhooks.connectionEvent.connect(self.__onConnectionEvent)
+        self.webhooks.presentProofEvent.connect(self.__onPresentProofEvent)
 
         ####################
         #      Timers      #
@@ -76,6 +101,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionOpenstaandeConnectieVerzoeken.triggered.connect(self.onPendingConnectionsMenuClicked)
         # Set handler for pending records button
         self.actionOpenstaandeOpvraagGegevens.triggered.connect(self.onPendingRecordsMenuClicked)
+        # Set handler for bulk request button
+        self.actionGegevensOpvragenMeerderePatienten.triggered.connect(self.onBulkRequestMenuClicked)
         # Set handler for refresh patient
         self.refreshPatientBtn.clicked.connect(self.onRefreshPatientClicked)
         # Set handler for select patient
@@ -85,51 +112,52 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # Set handler for request records
         self.sendRequestBtn.clicked.connect(self.onSendRequestClicked)
 
-        #############################
-        #     Credential checks     #
-        #############################
-        # Check if the schemas are created and up-to-date
-        if self.api.test_connection():
-            self.__createSchemas(self.schemas)
+        # Start the network work once the window is shown
+        QtCore.QTimer.singleShot(0, self.__onStarted)
+
+    def __onStarted(self) -> None:
+        """
+        Start the network work, executed by the event loop after the window is shown
+        :return: None
+        """
+        profiler.mark("show window")
+        with profiler.phase("start background work"):
+            self.__refreshPatientSelectionBox()
+            self.webhooks.start()
+            #############################
+            #     Credential checks     #
+            #############################
+            # Check if the schemas are created and up-to-date
+            self.worker.run(lambda: self.api.test_connection() and self.__createSchemas(self.schemas), key="schemas")
+        profiler.report()
 
-    def __del__(self):
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
         """
-        MainWindow class destructor
+        Stop the webhook listener when the main window is closed
+        :param event: The close event
         :return: None
         """
-        self.tempDir.cleanup()
+        self.webhooks.stop()
+        super(MainWindow, self).closeEvent(event)
 
-    def __createInviteQr(self, invite: str) -> str:
+    def __fillRecordTypeBox(self) -> None:
         """
-        Generate a connection invite qr-code
-        :param invite: The Base64 encoded invite string
-        :return: The full path to the generated qr image
+        Fill the record type box with the record types of the schema catalog
+        :return: None
         """
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(invite)
-        qr.make(fit=True)
-        img = qr.make_image(fill='black', back_color='white')
-        # Generate random filename
-        filename = f"{self.tempDir.name}/{uuid.uuid4().hex}.png"
-        img.save(filename)
-        return filename
+        # Keep the placeholder item
+        while self.recordTypeBox.count() > 1:
+            self.recordTypeBox.removeItem(1)
+        self.recordTypeBox.addItems(self.schemas.keys())
 
     def __createSchemas(self, schemas: dict) -> None:
         """
         Create schemas and place them on the chain
+        NOTE: This function is executed inside the worker thread
         :param schemas: The schema to create
         :return: None
         """
-        for key, schema in schemas.items():
-            exists = False
-            for i in self.api.get_schemas():
-                if i.split(':')[2:] == [schema["schema_name"], schema["schema_version"]]:
-                    logging.info(f"The {key} schema exists and is up-to-date (version: {schema['schema_version']})")
-                    exists = True
-                    break
-            if not exists:
-                logging.info(f"The {key} schema does not exist or is not up-to-date, creating...")
-                self.api.create_schema(schema=schema)
+        self.schemaRegistry.ensure(schemas)
         logging.info("All schemas are up-to-date and created!")
 
     def __showTime(self) -> None:
@@ -144,19 +172,43 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.lcdClock.display(time.toString("hh mm"))
         self.clockTimer.setInterval(1000)  # Set the interval to update the time every second
 
+    def __onWorkerBusyChanged(self, busy: bool) -> None:
+        """
+        Show a busy cursor while the worker is executing ApiHandler calls
+        :param busy: True if the worker is busy, False if not
+        :return: None
+        """
+        if busy:
+            self.setCursor(QtCore.Qt.BusyCursor)
+        else:
+            self.unsetCursor()
+
     def __updateGreetings(self) -> None:
         """
-        Show a greetings message on the main page (Function is attached to a QTimer object)
+        Request the agent name for the greetings message (Function is attached to a QTimer object)
         :return: None
         """
+        self.greetingsTimer.setInterval(10000)  # Don't fire again while the agent name is being requested
         # Check if there is an valid connection and then get the agent name
-        if self.api.test_connection():
-            agent = self.api.get_agent_name().replace("_", " ")
-        else:
+        self.worker.run(
+            lambda: self.api.get_agent_name() if self.api.test_connection() else None,
+            callback=self.__showGreetings,
+            error_callback=lambda e: self.__showGreetings(None),
+            key="greetings"
+        )
+
+    def __showGreetings(self, agent: str) -> None:
+        """
+        Show a greetings message on the main page
+        :param agent: The agent name, None if there is no connection with the agent
+        :return: None
+        """
+        if agent is None:
             # TODO: Make sure message is clear to end user and not too technical
             self.welcomeLabel.setText("Geen verbinding met agent")
             self.greetingsTimer.setInterval(10000)  # Update the greeting every 10 seconds if there is no connection
             return
+        agent = agent.replace("_", " ")
         # Get the current time
         time = int(QtCore.QTime.currentTime().toString("hhmm"))
         if time <= 1200:
@@ -169,23 +221,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.greetingsTimer.setInterval(60000)  # Set the interval to only check every minute
 
     @staticmethod
-    def __fillRecordTable(table: QtWidgets.QTableWidget, records: dict) -> None:
+    def __fillRecordTable(model: TableModel, records: dict) -> None:
         """
-        Fill the supplied table with the supplied records
-        :param table: The table to fill
+        Fill the supplied table model with the supplied records
+        :param model: The table model to fill
         :param records: The records to fill the table with
         :return: None
         """
         # TODO: Reformat the records so they are back in their original order
-        header = table.horizontalHeader()
-        header.setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)
-        i = 0
-        table.setRowCount(len(records))
-        for key, value in records.items():
-            table.setItem(i, 0, QtWidgets.QTableWidgetItem(key))
-            table.setItem(i, 1, QtWidgets.QTableWidgetItem(value))
-            i += 1
+        model.setRows(list(records.items()))
 
     def __updatePatientRecords(self) -> None:
         """
@@ -193,11 +237,101 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         :return: None
         """
         logging.info("Refreshing patient records")
-        self.patientRecordsTimer.setInterval(60000)  # Change interval to only check every minute (POC)
-        records = self.api.get_verified_proof_records(self.api.get_connection_id(self.currentAlias))
+        if self.webhooks.isReceiving():
+            # The records are updated when a presentation is verified, no need to poll
+            self.patientRecordsTimer.stop()
+        else:
+            self.patientRecordsTimer.setInterval(60000)  # Change interval to only check every minute (POC)
+        alias = self.currentAlias
+        # The synchronized records are kept up-to-date by the webhooks, only retrieve them again every 10 minutes
+        max_age = 600 if self.webhooks.isReceiving() else 0
+        if self.worker.run(
+                self.__loadPatientRecords, alias, max_age,
+                callback=lambda records: self.__showPatientRecords(alias, records),
+                error_callback=lambda e: self.nawTable.setEnabled(True),
+                key="patientRecords"):
+            # Show the loading state until the records are received
+            self.nawTable.setEnabled(False)
+
+    def __loadPatientRecords(self, alias: str, max_age: float) -> dict:
+        """
+        Get the verified records of a patient and save them inside the local store
+        NOTE: This function is executed inside the worker thread
+        :param alias: The alias of the patient
+        :param max_age: See ApiHandler.get_verified_proof_records
+        :return: The verified proof records
+        """
+        conn_id = self.api.get_connection_id(alias)
+        records = self.api.get_verified_proof_records(conn_id, max_age=max_age)
+        self.store.save_records(conn_id, records)
+        return records
+
+    def __showStoredPatientRecords(self, alias: str) -> None:
+        """
+        Fill the patient record tables with the records inside the local store
+        :param alias: The alias of the patient
+        :return: None
+        """
+        conn_id = self.store.get_connection_id(alias)
+        records = self.store.get_records(conn_id) if conn_id else {}
+        # TODO: Add support for more record types here
+        self.__fillRecordTable(self.nawModel, records.get("NAW", {}))
+
+    def __showPatientRecords(self, alias: str, records: dict) -> None:
+        """
+        Fill the patient record tables with the received records
+        :param alias: The alias the records were requested for
+        :param records: The verified proof records
+        :return: None
+        """
+        self.nawTable.setEnabled(True)
+        # Ignore the records when another patient has been selected in the meantime
+        if alias != self.currentAlias:
+            return
         # TODO: Add support for more record types here
         if "NAW" in records:
-            self.__fillRecordTable(self.nawTable, records["NAW"])
+            self.__fillRecordTable(self.nawModel, records["NAW"])
+
+    def __onConnectionEvent(self, connection: dict) -> None:
+        """
+        Update the patient selection box and invite qr-code when the state of a connection changes (webhook)
+        :param connection: The connection record
+        :return: None
+        """
+        alias = connection.get("alias")
+        if not alias:
+            return
+        logging.info(f"Connection with alias: {alias} changed state to: {connection.get('state')}")
+        if connection.get("state") == "active":
+            self.worker.run(self.store.save_connections, [connection])
+        elif connection.get("state") == "deleted":
+            self.worker.run(self.store.delete_connection, connection["connection_id"])
+        index = self.selectPatientBox.findText(alias)
+        if connection.get("state") == "active" and index == -1 and self.selectPatientBox.isEnabled():
+            # Insert the new patient at its sorted position without changing the current selection
+            position = 1
+            while position < self.selectPatientBox.count() and \
+                    self.selectPatientBox.itemText(position).lower() < alias.lower():
+                position += 1
+            self.selectPatientBox.insertItem(position, alias)
+            # The invite has been accepted so the qr-code is no longer needed
+            if alias == self.inviteAlias:
+                self.qrCodeLabel.clear()
+                self.connLabel.setText(f"Connectie met {alias} is gemaakt")
+                self.inviteAlias = None
+        elif connection.get("state") == "deleted" and index > 0 and alias != self.currentAlias:
+            self.selectPatientBox.removeItem(index)
+
+    def __onPresentProofEvent(self, record: dict) -> None:
+        """
+        Update the patient records when a presentation of the current patient is verified (webhook)
+        :param record: The presentation exchange record
+        :return: None
+        """
+        if record.get("state") != "verified" or self.currentAlias is None:
+            return
+        self.worker.run("get_alias_by_conn_id", record.get("connection_id"),
+                        callback=lambda alias: alias == self.currentAlias and self.__updatePatientRecords())
 
     def __patientTabsEnabled(self, state: bool) -> None:
         """
@@ -208,6 +342,46 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         for i in range(1, self.tabWidget.count()):
             self.tabWidget.setTabEnabled(i, state)
 
+    def __refreshPatientSelectionBox(self) -> None:
+        """
+        Request the active connections in the background and fill the patient selection box with them
+        :return: None
+        """
+        if not self.worker.run(self.__loadPatients,
+                               callback=self.__onPatientsLoaded,
+                               error_callback=lambda e: self.__onPatientsLoaded(None),
+                               key="patients"):
+            return
+        # Show the loading state until the patients are received
+        self.refreshPatientBtn.setEnabled(False)
+        if self.selectPatientBox.count() <= 1:
+            self.selectPatientBox.clear()
+            self.selectPatientBox.addItem("Patiënten worden geladen...")
+            self.selectPatientBox.setEnabled(False)
+
+    def __loadPatients(self) -> Union[list, None]:
+        """
+        Get the active connections and save them inside the local store
+        NOTE: This function is executed inside the worker thread
+        :return: The aliases of the active connections, None if there is no connection with ACA-Py
+        """
+        if not self.api.test_connection():
+            return None
+        connections = self.api.get_connections(state="active")["results"]
+        self.store.save_connections(connections, state="active")
+        return [connection["alias"] for connection in connections if "alias" in connection]
+
+    def __onPatientsLoaded(self, patients: Union[list, None]) -> None:
+        """
+        Fill the patient selection box with the loaded patients
+        :param patients: The aliases of the active connections, None if there is no connection with ACA-Py
+        :return: None
+        """
+        if patients is None:
+            logging.warning("No connection with ACA-Py, showing the stored patients")
+            patients = self.store.get_active_connection_aliases()
+        self.__fillPatientSelectionBox(patients)
+
     def __fillPatientSelectionBox(self, patients: list) -> None:
         """
         Fill the patient selection box with the given patient list
@@ -215,9 +389,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         :return: None
         """
         patients = ["-- Selecteer patiënt --"] + sorted(patients, key=str.lower)
+        # Keep the selected patient selected if it still exists
+        selected = self.selectPatientBox.currentText()
+        self.selectPatientBox.setEnabled(True)
+        self.refreshPatientBtn.setEnabled(True)
         self.selectPatientBox.clear()
         self.selectPatientBox.addItems(patients)
-        self.selectPatientBox.setCurrentIndex(0)
+        self.selectPatientBox.setCurrentIndex(max(self.selectPatientBox.findText(selected), 0))
         # If the patientBox is empty eq 1 disable the patient tabs
         if self.selectPatientBox.count() == 1:
             self.__patientTabsEnabled(False)
@@ -232,6 +410,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         :return: None
         """
         logging.info("Clicked settings menu")
+        from controller.settings import Settings
         settings_dialog = Settings(self.api)
         settings_dialog.exec_()
         logging.info("Settings menu closed")
@@ -248,7 +427,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         :return: None
         """
         logging.info("Clicked Pending Connections menu")
-        connections_dialog = Connections(self.api)
+        from controller.connections import Connections
+        connections_dialog = Connections(self.api, webhooks=self.webhooks)
         connections_dialog.exec()
 
     def onPendingRecordsMenuClicked(self) -> None:
@@ -257,16 +437,27 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         :return: None
         """
         logging.info("Clicked Pending Records menu")
-        records_dialog = Records(self.api)
+        from controller.records import Records
+        records_dialog = Records(self.api, webhooks=self.webhooks)
         records_dialog.exec()
 
+    def onBulkRequestMenuClicked(self) -> None:
+        """
+        Handler for the bulk request (request records of multiple patients) button
+        :return: None
+        """
+        logging.info("Clicked Bulk Request menu")
+        from controller.bulk_request import BulkRequest
+        bulk_request_dialog = BulkRequest(self.api, self.schemas, webhooks=self.webhooks)
+        bulk_request_dialog.exec()
+
     def onRefreshPatientClicked(self) -> None:
         """
         Handler for the refresh patient (list) button
         :return: None
         """
         logging.info("Clicked on refresh patient")
-        self.__fillPatientSelectionBox(self.api.get_active_connection_aliases())
+        self.__refreshPatientSelectionBox()
 
     def onSelectPatientClicked(self) -> None:
         """
@@ -286,7 +477,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # Enable the patient tabs since a patient is selected
         self.__patientTabsEnabled(True)
         self.currentAlias = alias
-        logging.info(f"Selected alias: {alias} with conn_id: {self.api.get_connection_id(self.currentAlias)}")
+        logging.info(f"Selected alias: {alias}")
+        # Show the stored records until the current records are received
+        self.__showStoredPatientRecords(alias)
         self.patientRecordsTimer.start(1)  # Do the update instantly
 
     def onDeletePatientClicked(self) -> None:
@@ -306,16 +499,41 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                                      )
         if action == QMessageBox.Yes:
             logging.info(f"Deleting connection with alias: {alias}")
-            if not self.api.delete_connection(self.api.get_connection_id(alias)):
-                logging.warning("Unable to delete connection with given alias")
-            # Refresh the active connection box list
-            self.__fillPatientSelectionBox(self.api.get_active_connection_aliases())
             # Disable updating of patient record tabs
             self.patientRecordsTimer.stop()
+            self.deletePatientBtn.setEnabled(False)
+            self.worker.run(self.__deletePatient, alias,
+                            callback=self.__onPatientDeleted,
+                            error_callback=lambda e: self.__onPatientDeleted(False))
         else:
             # User pressed No, do nothing
             return
 
+    def __deletePatient(self, alias: str) -> bool:
+        """
+        Delete the connection of a patient from ACA-Py and the local store
+        NOTE: This function is executed inside the worker thread
+        :param alias: The alias of the patient
+        :return: True if the deletion was successful, False if not
+        """
+        conn_id = self.api.get_connection_id(alias)
+        if not self.api.delete_connection(conn_id):
+            return False
+        self.store.delete_connection(conn_id)
+        return True
+
+    def __onPatientDeleted(self, deleted: bool) -> None:
+        """
+        Refresh the patient selection box after a connection has been deleted
+        :param deleted: True if the deletion was successful, False if not
+        :return: None
+        """
+        self.deletePatientBtn.setEnabled(True)
+        if not deleted:
+            logging.warning("Unable to delete connection with given alias")
+        # Refresh the active connection box list
+        self.__refreshPatientSelectionBox()
+
     def onGenerateInviteClicked(self) -> None:
         """
         Handler for the generate invite button
@@ -338,28 +556,60 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.connLabel.setText("BSN is leeg of klopt niet")
             return
         # Generate invitation url
-        if self.api.test_connection():
-            alias = f"{f_name} {m_name + ' ' if m_name else ''}{l_name} {bsn}"
-            logging.info(f"The following input was given: {alias}")
-            # Check if a connection with this alias already exists
-            conn = self.api.get_connections(alias=alias)["results"]
-            if len(conn):
-                logging.warning("Connection already exists with this alias")
-                self.connLabel.setText(f"Er bestaat al een connectie met deze naam\n"
-                                       f"De status van deze connectie is: {conn[0]['state']}")
-                return  # Don't execute the rest of the code since we don't want duplicates
-            # Create a new invitation
-            conn_id, invite = self.api.create_invitation(
-                alias=alias,
-                multi_use=False,
-                auto_accept=True)
-            logging.info(f"Generated invite: {invite}")
-            # TODO: Check QT docs on how to scale the image properly, remove qr when connection is established
-            self.qrCodeLabel.setPixmap(QtGui.QPixmap(self.__createInviteQr(invite=invite)).scaled(224, 224))
+        alias = f"{f_name} {m_name + ' ' if m_name else ''}{l_name} {bsn}"
+        logging.info(f"The following input was given: {alias}")
+        self.generateInvite.setEnabled(False)
+        self.connLabel.setText("Uitnodiging wordt gegenereerd...")
+        self.worker.run(self.__generateInvite, alias, 224,
+                        callback=self.__onInviteGenerated,
+                        error_callback=lambda e: self.__onInviteGenerated({"connected": False}))
+
+    def __generateInvite(self, alias: str, qr_size: int) -> dict:
+        """
+        Create an invitation for the given alias if there is no connection with this alias yet
+        NOTE: This function is executed inside the worker thread
+        :param alias: The alias of the new connection
+        :param qr_size: The width and height of the invite qr-code in pixels
+        :return: A dict with the invite and its qr-code (QImage), or the state of the existing connection, or
+        connected False
+        """
+        if not self.api.test_connection():
+            return {"connected": False}
+        # Check if a connection with this alias already exists
+        conn = self.api.get_connection_by_alias(alias)
+        if conn is not None:
+            return {"connected": True, "state": conn["state"]}
+        # Create a new invitation
+        conn_id, invite = self.api.create_invitation(
+            alias=alias,
+            multi_use=False,
+            auto_accept=True)
+        # The qr-code is rendered in memory at the target size, no image file is written
+        return {"connected": True, "invite": invite, "alias": alias, "qr": render_qr_image(invite, qr_size)}
+
+    def __onInviteGenerated(self, result: dict) -> None:
+        """
+        Show the generated invite qr-code or the reason why no invite has been generated
+        :param result: The result of __generateInvite
+        :return: None
+        """
+        self.generateInvite.setEnabled(True)
+        self.connLabel.setText("")
+        if not result["connected"]:
+            self.connLabel.setText("Geen verbinding mogelijk met ACA-PY.\n"
+                                   "Staat de server aan en is de juiste ip/poort ingesteld?")
+            logging.warning(
+                "Connection to ACA-PY failed, is the instance running and are the correct ip/port specified?")
             return
-        self.connLabel.setText("Geen verbinding mogelijk met ACA-PY.\n"
-                               "Staat de server aan en is de juiste ip/poort ingesteld?")
-        logging.warning("Connection to ACA-PY failed, is the instance running and are the correct ip/port specified?")
+        if "state" in result:
+            logging.warning("Connection already exists with this alias")
+            self.connLabel.setText(f"Er bestaat al een connectie met deze naam\n"
+                                   f"De status van deze connectie is: {result['state']}")
+            return  # Don't execute the rest of the code since we don't want duplicates
+        invite = result["invite"]
+        self.inviteAlias = result["alias"]
+        logging.info(f"Generated invite: {invite}")
+        self.qrCodeLabel.setPixmap(QtGui.QPixmap.fromImage(result["qr"]))
 
     def onSendRequestClicked(self) -> None:
         """
@@ -373,23 +623,42 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.sendRequestLabel.setStyleSheet("color: rgb(255, 0, 0);")
             self.sendRequestLabel.setText("Er is geen type geselecteerd")
             return
-        conn_id = self.api.get_connection_id(self.currentAlias)
-        logging.info(
-            f"Requested record type:{requested_record} to connection alias:{self.currentAlias} with conn id:{conn_id}"
-        )
-        self.api.send_proof_request(
-            conn_id=conn_id,
-            requested_attributes=generate_requested_attributes(self.schemas[requested_record]),
-            requested_predicates={},
+        alias = self.currentAlias
+        logging.info(f"Requested record type:{requested_record} to connection alias:{alias}")
+        template = self.schemas.proof_request_template(requested_record)
+        self.sendRequestBtn.setEnabled(False)
+        self.sendRequestLabel.setStyleSheet("")
+        self.sendRequestLabel.setText("Verzoek wordt verstuurd...")
+        self.worker.run(lambda: self.api.send_proof_request_from_template(
+            template,
+            conn_id=self.api.get_connection_id(alias),
             name=requested_record,
             comment=reason if reason else "Geen reden opgegeven"
-        )
+        ), callback=lambda pres_ex_id: self.__onRequestSent(True),
+            error_callback=lambda e: self.__onRequestSent(False))
+
+    def __onRequestSent(self, sent: bool) -> None:
+        """
+        Show if the proof request has been sent
+        :param sent: True if the request has been sent, False if not
+        :return: None
+        """
+        self.sendRequestBtn.setEnabled(True)
+        if not sent:
+            self.sendRequestLabel.setStyleSheet("color: rgb(255, 0, 0);")
+            self.sendRequestLabel.setText("Verzoek kon niet worden verstuurd")
+            return
         self.sendRequestLabel.setStyleSheet("color: rgb(12, 240, 14);")
         self.sendRequestLabel.setText("Verzoek is verstuurd")
 
 
 if __name__ == "__main__":
+    # Log the time spent per startup phase using: python3 main.py --profile-startup
+    profiler.enabled = "--profile-startup" in sys.argv
+    profiler.mark("imports")
     app = QApplication(sys.argv)
-    window = MainWindow()
+    profiler.mark("create application")
+    with profiler.phase("create window"):
+        window = MainWindow()
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,217 @@
+from collections import namedtuple
+import argparse
+import tracemalloc
+import platform
+import json
+import time
+import sys
+import os
+
+from library.api_handler import ApiHandler
+from helpers.requested_attribute_generator import generate_requested_attributes
+from schemas.naw import naw
+from tests import fake_agent
+
+# The stored baselines, compared against with --compare and written with --save-baseline
+baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# A benchmark is a call of an ApiHandler method, setup is executed (untimed) before every call and its return value is
+# passed to the call
+Benchmark = namedtuple("Benchmark", ["name", "call", "setup"], defaults=[None])
+
+# The metrics that are compared against the baseline, a regression is reported when the metric is tolerance percent
+# (and min_difference) worse than the baseline. The tail latencies are too noisy to compare.
+compared_metrics = {
+    "p50_ms": 1.0,
+    "peak_kib": 64,
+}
+
+
+def create_benchmarks(ctx: dict) -> list:
+    """
+    Create the benchmarks, the read-only benchmarks are executed first
+    :param ctx: A sample of the dataset: conn_id, alias, bsn and pres_ex_id
+    :return: A list of Benchmark tuples
+    """
+    requested_attributes = generate_requested_attributes(naw)
+    template = ApiHandler.build_proof_request_template(requested_attributes)
+    schema = {"id": "Fake:2:naw:1.0", "name": "naw", "version": "1.0"}
+    attributes = [{"name": attribute, "value": "Benchmark"} for attribute in naw["attributes"]]
+    return [
+        Benchmark("test_connection", lambda api: api.test_connection()),
+        Benchmark("get_agent_name", lambda api: api.get_agent_name()),
+        Benchmark("get_connections", lambda api: api.get_connections()),
+        Benchmark("get_connections(active)", lambda api: api.get_connections(state="active")),
+        Benchmark("get_connections(alias)", lambda api: api.get_connections(alias=ctx["alias"])),
+        Benchmark("get_active_connection_aliases", lambda api: api.get_active_connection_aliases()),
+        Benchmark("get_pending_connections", lambda api: api.get_pending_connections()),
+        Benchmark("get_connection(indexed)", lambda api: api.get_connection(ctx["conn_id"])),
+        Benchmark("get_connection(uncached)", lambda api: api.get_connection(ctx["conn_id"]),
+                  setup=lambda api: api.invalidate_connection_index()),
+        Benchmark("get_connection_id_by_bsn", lambda api: api.get_connection_id_by_bsn(ctx["bsn"])),
+        Benchmark("get_alias_by_conn_id", lambda api: api.get_alias_by_conn_id(ctx["conn_id"])),
+        Benchmark("get_proof_records(received)", lambda api: api.get_proof_records(state="presentation_received")),
+        Benchmark("get_proof_records(all)", lambda api: api.get_proof_records(state="", role="")),
+        Benchmark("get_pending_proof_requests_send", lambda api: api.get_pending_proof_requests_send()),
+        Benchmark("sync_proof_records(unchanged)", lambda api: api.sync_proof_records(state="presentation_received")),
+        Benchmark("get_verified_proof_records", lambda api: api.get_verified_proof_records(ctx["conn_id"])),
+        Benchmark("get_pending_work", lambda api: api.get_pending_work()),
+        Benchmark("get_schemas", lambda api: api.get_schemas()),
+        # The benchmarks below change the dataset
+        Benchmark("create_invitation", lambda api: api.create_invitation("Benchmark Invite 123456789", False, True)),
+        Benchmark("send_proof_request", lambda api: api.send_proof_request_from_template(
+            template, ctx["conn_id"], name="NAW", comment="Benchmark")),
+        Benchmark("issue_credential", lambda api: api.issue_credential(
+            ctx["conn_id"], "Fake:3:CL:1:benchmark", attributes, schema)),
+        Benchmark("verify_presentation", lambda api: api.verify_presentation(ctx["pres_ex_id"])),
+        Benchmark("delete_connection", lambda api, conn_id: api.delete_connection(conn_id),
+                  setup=lambda api: api.create_invitation("Benchmark Delete 123456789", False, True)[0]),
+    ]
+
+
+def percentile(durations: list, p: float) -> float:
+    """
+    Get a percentile of sorted durations (nearest rank)
+    :param durations: The sorted durations
+    :param p: The percentile between 0 and 100
+    :return: The duration at the percentile
+    """
+    return durations[min(len(durations) - 1, int(round(p / 100 * (len(durations) - 1))))]
+
+
+def run_benchmark(api: ApiHandler, benchmark: Benchmark, iterations: int, max_time: float) -> dict:
+    """
+    Run a single benchmark
+    :param api: The ApiHandler instance
+    :param benchmark: The benchmark
+    :param iterations: The amount of timed calls
+    :param max_time: Stop after this amount of seconds (at least 3 calls are made)
+    :return: The metrics: calls, p50_ms, p95_ms, p99_ms, throughput (calls per second) and peak_kib
+    """
+    def call():
+        if benchmark.setup is None:
+            started = time.perf_counter()
+            benchmark.call(api)
+        else:
+            argument = benchmark.setup(api)
+            started = time.perf_counter()
+            benchmark.call(api, argument) if argument is not None else benchmark.call(api)
+        return time.perf_counter() - started
+
+    # Warm up the connection pool and caches
+    call()
+    durations = []
+    started = time.monotonic()
+    while len(durations) < iterations and (len(durations) < 3 or time.monotonic() - started < max_time):
+        durations.append(call())
+    durations.sort()
+    # The memory is measured separately since tracing slows down the calls
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "calls": len(durations),
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "p99_ms": round(percentile(durations, 99) * 1000, 3),
+        "throughput": round(len(durations) / sum(durations), 1) if sum(durations) > 0 else 0.0,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare the metrics of a benchmark with its baseline
+    :param result: The metrics of the benchmark
+    :param baseline: The baseline metrics of the benchmark
+    :param tolerance: The allowed regression as a fraction eq. 0.25 for 25%
+    :return: A list of regression descriptions, empty when there are no regressions
+    """
+    regressions = []
+    for metric, min_difference in compared_metrics.items():
+        if metric not in baseline:
+            continue
+        limit = baseline[metric] * (1 + tolerance)
+        if result[metric] > limit and result[metric] - baseline[metric] > min_difference:
+            regressions.append(f"{metric} {result[metric]:.2f} > {baseline[metric]:.2f}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the ApiHandler against a fake ACA-Py admin API")
+    parser.add_argument("--sizes", default="10,1000,100000",
+                        help="Comma separated dataset sizes (amount of connections and proof records)")
+    parser.add_argument("--latency", type=float, default=0.0, help="The latency of every request in milliseconds")
+    parser.add_argument("--iterations", type=int, default=50, help="The maximum amount of timed calls per benchmark")
+    parser.add_argument("--max-time", type=float, default=5.0, help="The maximum amount of seconds per benchmark")
+    parser.add_argument("--filter", default="", help="Only run the benchmarks containing this text")
+    parser.add_argument("--baseline", default=baseline_file, help="The baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare the results with the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="The allowed regression as a fraction")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    key = f"latency={args.latency:g}ms"
+    results = {}
+    regressions = []
+    print(f"{'size':>7} {'benchmark':<34} {'calls':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} "
+          f"{'peak KiB':>9}")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        # The fake agent runs in a separate process so it does not share the GIL (and the traced memory) with the client
+        process, ports = fake_agent.spawn(connections=size, latency=args.latency)
+        try:
+            api = ApiHandler("localhost", ports["agent"])
+            # Sample a record of the dataset
+            connection = api.get_connections(state="active")["results"][0]
+            pres_ex_id = api.get_proof_records(state="presentation_received")[0]["pres_ex_id"]
+            ctx = {
+                "conn_id": connection["connection_id"],
+                "alias": connection["alias"],
+                "bsn": ApiHandler.bsn_from_alias(connection["alias"]),
+                "pres_ex_id": pres_ex_id
+            }
+            results[str(size)] = {}
+            for benchmark in create_benchmarks(ctx):
+                if args.filter not in benchmark.name:
+                    continue
+                result = run_benchmark(api, benchmark, args.iterations, args.max_time)
+                results[str(size)][benchmark.name] = result
+                baseline = baselines.get(key, {}).get(str(size), {}).get(benchmark.name)
+                found = compare(result, baseline, args.tolerance) if args.compare and baseline else []
+                regressions += [f"{size} {benchmark.name}: {regression}" for regression in found]
+                print(f"{size:>7} {benchmark.name:<34} {result['calls']:>5} {result['p50_ms']:>9.2f} "
+                      f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['throughput']:>9.1f} "
+                      f"{result['peak_kib']:>9.1f}{'  REGRESSION' if found else ''}", flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({key: results}, f, indent=2)
+    if args.save_baseline:
+        # Only the measured sizes and benchmarks are replaced
+        for size, benchmarks in results.items():
+            baselines.setdefault(key, {}).setdefault(size, {}).update(benchmarks)
+        baselines["_meta"] = {"python": platform.python_version(), "machine": platform.machine(),
+                              "saved_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) compared to the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # Run from the project root: python -m tests.benchmark_api_handler [--compare] [--save-baseline]
+    sys.exit(main())
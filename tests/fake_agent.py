@@ -0,0 +1,550 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import subprocess
+import argparse
+import datetime
+import base64
+import threading
+import logging
+import socket
+import json
+import time
+import uuid
+import sys
+import os
+import re
+
+# Record types of the generated proof records
+record_types = ("NAW", "MEDICATIE", "ALLERGIE")
+
+# Distribution of the states of the generated proof records
+proof_states = ("verified", "verified", "presentation_received", "request_sent")
+
+
+def timestamp(offset: float = 0) -> str:
+    """
+    Create an ACA-Py style timestamp
+    :param offset: Amount of seconds added to the current time
+    :return: The timestamp as a str, eq. 2020-11-12 10:11:12.123456Z
+    """
+    return f"{datetime.datetime.utcnow() + datetime.timedelta(seconds=offset)}Z"
+
+
+class FakeNetwork:
+    def __init__(self):
+        """
+        FakeNetwork constructor, delivers the messages between the fake agents of the same process
+        (invitations, connection requests, proof requests and presentations)
+        NOTE: Acquire the network lock before the lock of an agent
+        """
+        self.lock = threading.RLock()
+        # invitation key -> (agent state, connection id) of the inviter
+        self.invitations = {}
+        # (agent state, connection id) -> (agent state, connection id) of the other side of the connection
+        self.peers = {}
+        # thread id -> [(agent state, presentation exchange id),...] of both sides of a proof exchange
+        self.threads = {}
+
+    def pair(self, inviter: tuple, invitee: tuple) -> None:
+        """
+        Pair the two sides of a connection
+        :param inviter: (agent state, connection id) of the inviter
+        :param invitee: (agent state, connection id) of the invitee
+        :return: None
+        """
+        with self.lock:
+            self.peers[inviter] = invitee
+            self.peers[invitee] = inviter
+
+    def peer(self, state: "FakeAgentState", conn_id: str) -> tuple:
+        """
+        Get the other side of a connection
+        :param state: The agent state of this side
+        :param conn_id: The connection id of this side
+        :return: (agent state, connection id) of the other side, (None, None) if the connection is not paired
+        """
+        with self.lock:
+            return self.peers.get((state, conn_id), (None, None))
+
+
+class FakeAgentState:
+    def __init__(self, latency: float = 0.0, label: str = "Fake_Agent", network: FakeNetwork = None):
+        """
+        FakeAgentState constructor, the in-memory records of the fake ACA-Py admin API
+        :param latency: The amount of seconds every request is delayed (simulated network/agent latency)
+        :param label: The agent name
+        :param network: The network shared with the other fake agents (optional, the agent is on its own)
+        """
+        self.latency = latency
+        self.label = label
+        self.network = network or FakeNetwork()
+        self.lock = threading.RLock()
+        self.connections = {}
+        self.proof_records = {}
+        self.schema_ids = []
+        self.calls = 0
+        # Serialized listing responses keyed by path and query, cleared on every change so the benchmarks measure the
+        # client instead of the serialization inside the fake agent
+        self.__listings = {}
+
+    def changed(self) -> None:
+        """
+        Clear the serialized listing responses, call after every change of the records
+        :return: None
+        """
+        self.__listings.clear()
+
+    def listing(self, path: str, records: dict, query: dict) -> bytes:
+        """
+        Get the serialized listing of the records that match the query
+        :param path: The path of the listing, used as cache key
+        :param records: The records to filter
+        :param query: The query parameters, every parameter must match the record
+        :return: The response body
+        """
+        key = (path,) + tuple(sorted(query.items()))
+        with self.lock:
+            if key not in self.__listings:
+                results = [record for record in records.values() if all(record.get(k) == v for k, v in query.items())]
+                self.__listings[key] = json.dumps({"results": results}).encode("utf-8")
+            return self.__listings[key]
+
+    def add_connection(self, alias: str, state: str = "active", auto_accept: bool = True) -> str:
+        """
+        Add a connection
+        :param alias: The alias of the connection
+        :param state: The state of the connection
+        :param auto_accept: Accept the connection handshake automatically?
+        :return: The connection id
+        """
+        conn_id = str(uuid.uuid4())
+        with self.lock:
+            self.connections[conn_id] = {
+                "connection_id": conn_id,
+                "alias": alias,
+                "state": state,
+                "their_role": "invitee",
+                "routing_state": "none",
+                "accept": "auto" if auto_accept else "manual",
+                "invitation_mode": "once",
+                "created_at": timestamp(),
+                "updated_at": timestamp()
+            }
+            self.changed()
+        return conn_id
+
+    def update(self, records: dict, record_id: str, **fields) -> dict:
+        """
+        Update a connection or presentation exchange record
+        :param records: The connections or proof_records dict
+        :param record_id: The connection id or presentation exchange id
+        :param fields: The changed fields
+        :return: The updated record
+        """
+        with self.lock:
+            records[record_id].update(fields, updated_at=timestamp())
+            self.changed()
+            return records[record_id]
+
+    @staticmethod
+    def presentation(attributes: dict) -> dict:
+        """
+        Create the presentation of revealed attributes
+        :param attributes: The revealed attributes, {referent: raw value}
+        :return: The presentation as a dict
+        """
+        return {
+            "requested_proof": {
+                "revealed_attrs": {key: {"sub_proof_index": 0, "raw": value, "encoded": str(len(value))}
+                                   for key, value in attributes.items()}
+            }
+        }
+
+    def add_proof_record(self, conn_id: str, state: str, name: str = "NAW", attributes: dict = None,
+                         role: str = "verifier", thread_id: str = None, presentation_request: dict = None) -> str:
+        """
+        Add a presentation exchange record
+        :param conn_id: The connection id of the record
+        :param state: The state of the record
+        :param name: The record type (eq. NAW)
+        :param attributes: The revealed attributes, only used when the presentation is received or verified
+        :param role: The role of the agent, verifier or prover
+        :param thread_id: The thread id shared by both sides of the exchange (optional, a new thread is started)
+        :param presentation_request: The proof request (optional, an empty request with the name is used)
+        :return: The presentation exchange id
+        """
+        pres_ex_id = str(uuid.uuid4())
+        record = {
+            "presentation_exchange_id": pres_ex_id,
+            "connection_id": conn_id,
+            "thread_id": thread_id or str(uuid.uuid4()),
+            "initiator": "self" if role == "verifier" else "external",
+            "role": role,
+            "state": state,
+            "created_at": timestamp(),
+            "updated_at": timestamp(),
+            "presentation_request": presentation_request or {
+                "name": f"{name}:Benchmark", "version": "1.0", "requested_attributes": {}}
+        }
+        if state in ("presentation_received", "verified"):
+            record["presentation"] = self.presentation(
+                attributes or {"voornaam": "Jan", "achternaam": "Jansen", "woonplaats": "Groningen"})
+        if state == "verified":
+            record["verified"] = "true"
+        with self.lock:
+            self.proof_records[pres_ex_id] = record
+            self.changed()
+        with self.network.lock:
+            self.network.threads.setdefault(record["thread_id"], []).append((self, pres_ex_id))
+        return pres_ex_id
+
+    def accept_invitation(self, conn_id: str) -> None:
+        """
+        Accept a received invitation, the connection request is delivered to the inviter
+        :param conn_id: The connection id of the invitee
+        :return: None
+        """
+        with self.network.lock:
+            self.update(self.connections, conn_id, state="request")
+            inviter, inviter_conn_id = self.network.peer(self, conn_id)
+            if inviter is None or inviter_conn_id not in inviter.connections:
+                return
+            inviter.update(inviter.connections, inviter_conn_id, state="request")
+            if inviter.connections[inviter_conn_id]["accept"] == "auto":
+                inviter.accept_request(inviter_conn_id)
+
+    def accept_request(self, conn_id: str) -> None:
+        """
+        Accept a connection request, both sides of the connection become active
+        :param conn_id: The connection id of the inviter
+        :return: None
+        """
+        with self.network.lock:
+            self.update(self.connections, conn_id, state="active")
+            invitee, invitee_conn_id = self.network.peer(self, conn_id)
+            if invitee is not None and invitee_conn_id in invitee.connections:
+                invitee.update(invitee.connections, invitee_conn_id, state="active")
+
+    def send_request(self, conn_id: str, proof_request: dict) -> str:
+        """
+        Send a proof request, the request is delivered to the other side of the connection
+        :param conn_id: The connection id
+        :param proof_request: The proof request
+        :return: The presentation exchange id
+        """
+        with self.network.lock:
+            pres_ex_id = self.add_proof_record(conn_id, state="request_sent", presentation_request=proof_request)
+            prover, prover_conn_id = self.network.peer(self, conn_id)
+            if prover is not None:
+                prover.add_proof_record(prover_conn_id, state="request_received", role="prover",
+                                        thread_id=self.proof_records[pres_ex_id]["thread_id"],
+                                        presentation_request=proof_request)
+            return pres_ex_id
+
+    def send_presentation(self, pres_ex_id: str, presentation: dict) -> dict:
+        """
+        Send a presentation, the presentation is delivered to the verifier
+        The revealed values are the self attested attributes or a generated value
+        :param pres_ex_id: The presentation exchange id of the prover
+        :param presentation: The send presentation payload
+        :return: The updated exchange record of the prover
+        """
+        with self.network.lock:
+            record = self.proof_records[pres_ex_id]
+            requested = record["presentation_request"].get("requested_attributes", {})
+            self_attested = presentation.get("self_attested_attributes") or {}
+            attributes = {
+                referent: self_attested.get(referent, f"{self.label} {requested.get(referent, {}).get('name', referent)}")
+                for referent in list(presentation.get("requested_attributes") or {}) + list(self_attested)
+            }
+            record = self.update(self.proof_records, pres_ex_id, state="presentation_sent",
+                                 presentation=self.presentation(attributes))
+            for other, other_pres_ex_id in self.network.threads.get(record["thread_id"], []):
+                if other is not self and other_pres_ex_id in other.proof_records:
+                    other.update(other.proof_records, other_pres_ex_id, state="presentation_received",
+                                 presentation=self.presentation(attributes))
+            return record
+
+    def seed(self, connections: int, proof_records: int = None) -> None:
+        """
+        Replace the records by a generated dataset
+        :param connections: The amount of active connections
+        :param proof_records: The amount of proof records, divided over the connections (default same as connections)
+        :return: None
+        """
+        proof_records = connections if proof_records is None else proof_records
+        with self.lock:
+            self.connections.clear()
+            self.proof_records.clear()
+            self.changed()
+        conn_ids = [self.add_connection(f"Patient {i} Benchmark {100000000 + i}") for i in range(connections)]
+        for i in range(proof_records if conn_ids else 0):
+            self.add_proof_record(conn_ids[i % len(conn_ids)], state=proof_states[i % len(proof_states)],
+                                  name=record_types[(i // len(proof_states)) % len(record_types)])
+
+
+class FakeAgentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The headers and body are written separately, without TCP_NODELAY every response waits for a delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    # Set by FakeAgent
+    state = None
+
+    def log_message(self, format, *args):
+        # Keep the benchmark output clean
+        pass
+
+    def setup(self):
+        super(FakeAgentHandler, self).setup()
+        # Tracked so stop() can close the keep-alive connections
+        with self.server.connections_lock:
+            self.server.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.connections_lock:
+            self.server.connections.discard(self.connection)
+        super(FakeAgentHandler, self).finish()
+
+    def __send(self, body, status: int = 200) -> None:
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __parse(self) -> tuple:
+        with self.state.lock:
+            self.state.calls += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        return url.path.rstrip("/"), query, body
+
+    def do_GET(self):
+        path, query, _ = self.__parse()
+        state = self.state
+        if path == "/status":
+            return self.__send({"label": state.label, "version": "0.5.6"})
+        if path == "/connections":
+            return self.__send(state.listing(path, state.connections, query))
+        if path == "/present-proof/records":
+            return self.__send(state.listing(path, state.proof_records, query))
+        if path == "/schemas/created":
+            return self.__send({"schema_ids": state.schema_ids})
+        if path == "/credentials":
+            return self.__send({"results": []})
+        match = re.match(r"^/connections/([^/]+)$", path)
+        if match and match.group(1) in state.connections:
+            return self.__send(state.connections[match.group(1)])
+        match = re.match(r"^/present-proof/records/([^/]+)$", path)
+        if match and match.group(1) in state.proof_records:
+            return self.__send(state.proof_records[match.group(1)])
+        self.__send({}, 404)
+
+    def do_POST(self):
+        path, query, body = self.__parse()
+        state = self.state
+        if path == "/connections/create-invitation":
+            conn_id = state.add_connection(query.get("alias", ""), state="invitation",
+                                           auto_accept=query.get("auto_accept") == "true")
+            key = str(uuid.uuid4())
+            with state.network.lock:
+                state.network.invitations[key] = (state, conn_id)
+            # Only str values, the ApiHandler decodes the invitation using ast.literal_eval
+            invitation = {
+                "@type": "did:sov:BzCbsNYhMrjHiqZDTUASHg;spec/connections/1.0/invitation",
+                "@id": key,
+                "label": state.label,
+                "recipientKeys": [key],
+                "serviceEndpoint": f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+            }
+            encoded = base64.b64encode(json.dumps(invitation).encode("utf-8")).decode("utf-8")
+            return self.__send({"connection_id": conn_id, "invitation": invitation,
+                                "invitation_url": f"http://localhost?c_i={encoded}"})
+        if path == "/connections/receive-invitation":
+            key = (body.get("recipientKeys") or [None])[0]
+            with state.network.lock:
+                inviter = state.network.invitations.pop(key, None)
+                if inviter is None:
+                    return self.__send({"message": "Unknown invitation"}, 400)
+                conn_id = state.add_connection(query.get("alias", ""), state="invitation",
+                                               auto_accept=query.get("auto_accept") == "true")
+                state.network.pair(inviter, (state, conn_id))
+                if query.get("auto_accept") == "true":
+                    state.accept_invitation(conn_id)
+            return self.__send(state.connections[conn_id])
+        if path == "/present-proof/send-request":
+            if body.get("connection_id") not in state.connections:
+                return self.__send({"message": "Unknown connection"}, 400)
+            pres_ex_id = state.send_request(body["connection_id"], body["proof_request"])
+            return self.__send(state.proof_records[pres_ex_id])
+        if path == "/issue-credential/send":
+            if body.get("connection_id") not in state.connections:
+                return self.__send({"message": "Unknown connection"}, 400)
+            return self.__send({"credential_exchange_id": str(uuid.uuid4()), "state": "offer_sent"})
+        if path == "/schemas":
+            schema_id = f"Fake:2:{body['schema_name']}:{body['schema_version']}"
+            with state.lock:
+                if schema_id not in state.schema_ids:
+                    state.schema_ids.append(schema_id)
+            return self.__send({"schema_id": schema_id, "schema": {
+                "id": schema_id, "name": body["schema_name"], "version": body["schema_version"]}})
+        if path == "/credential-definitions":
+            return self.__send({"credential_definition_id": f"Fake:3:CL:{body['schema_id']}:{body['tag']}"})
+        match = re.match(r"^/connections/([^/]+)/(accept-invitation|accept-request)$", path)
+        if match and match.group(1) in state.connections:
+            if match.group(2) == "accept-invitation":
+                state.accept_invitation(match.group(1))
+            else:
+                state.accept_request(match.group(1))
+            return self.__send(state.connections[match.group(1)])
+        match = re.match(r"^/present-proof/records/([^/]+)/send-presentation$", path)
+        if match and match.group(1) in state.proof_records:
+            return self.__send(state.send_presentation(match.group(1), body))
+        match = re.match(r"^/present-proof/records/([^/]+)/verify-presentation$", path)
+        if match and match.group(1) in state.proof_records:
+            with state.lock:
+                record = state.proof_records[match.group(1)]
+                record.update({"state": "verified", "verified": "true", "updated_at": timestamp()})
+                state.changed()
+            return self.__send(record)
+        self.__send({}, 404)
+
+    def do_DELETE(self):
+        path, _, _ = self.__parse()
+        state = self.state
+        match = re.match(r"^/(connections|present-proof/records)/([^/]+)$", path)
+        if match:
+            records = state.connections if match.group(1) == "connections" else state.proof_records
+            with state.lock:
+                if records.pop(match.group(2), None) is None:
+                    return self.__send({}, 404)
+                state.changed()
+            return self.__send({})
+        self.__send({}, 404)
+
+
+class FakeAgent:
+    def __init__(self, host: str = "localhost", port: int = 0, latency: float = 0.0, label: str = "Fake_Agent",
+                 network: FakeNetwork = None):
+        """
+        FakeAgent constructor, an in-process stand-in for the ACA-Py admin API used by the benchmarks and load tests
+        Only the endpoints used by the ApiHandler are implemented, agents that share a network can connect to each
+        other and exchange proof requests and presentations
+        :param host: The host to listen on
+        :param port: The port to listen on, 0 picks a free port
+        :param latency: The amount of seconds every request is delayed (simulated network/agent latency)
+        :param label: The agent name
+        :param network: The network shared with the other fake agents (optional, the agent is on its own)
+        """
+        self.state = FakeAgentState(latency=latency, label=label, network=network)
+        handler = type("Handler", (FakeAgentHandler,), {"state": self.state})
+        self.__server = ThreadingHTTPServer((host, port), handler)
+        self.__server.daemon_threads = True
+        # The open (keep-alive) connections, see FakeAgentHandler.setup
+        self.__server.connections = set()
+        self.__server.connections_lock = threading.Lock()
+        self.__thread = None
+
+    @property
+    def host(self) -> str:
+        return self.__server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    def start(self) -> "FakeAgent":
+        """
+        Start the fake agent in a background thread
+        :return: The fake agent
+        """
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop the fake agent, the open keep-alive connections are closed so the clients notice the outage
+        :return: None
+        """
+        self.__server.shutdown()
+        self.__server.server_close()
+        with self.__server.connections_lock:
+            connections = list(self.__server.connections)
+        for connection in connections:
+            try:
+                # Wakes up the handler thread that is waiting for the next request on this connection
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def serve_forever(self) -> None:
+        """
+        Run the fake agent in the current thread (blocking)
+        :return: None
+        """
+        self.__server.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def spawn(connections: int = 10, proof_records: int = None, latency: float = 0.0, wallets: int = 0) -> tuple:
+    """
+    Start the fake agent (and wallets) in a separate process, so it does not share the GIL with the client
+    :param connections: The amount of active connections
+    :param proof_records: The amount of proof records (default same as connections)
+    :param latency: The latency of every request in milliseconds
+    :param wallets: The amount of (patient) wallet agents
+    :return: A tuple containing the process and the ports: {"agent": port, "wallets": [port,...]}
+    """
+    command = [sys.executable, "-m", "tests.fake_agent", "--port", "0", "--connections", str(connections),
+               "--latency", str(latency), "--wallets", str(wallets)]
+    if proof_records is not None:
+        command += ["--proof-records", str(proof_records)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(command, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    # The ports are written once the dataset is seeded and the agents are listening
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise RuntimeError(f"The fake agent stopped unexpectedly ({process.returncode})")
+    return process, json.loads(line)
+
+
+if __name__ == "__main__":
+    # Run the fake agent as a separate process, eq. python -m tests.fake_agent --port 7001 --connections 1000
+    # The ports are written to stdout as JSON: {"agent": port, "wallets": [port,...]}
+    parser = argparse.ArgumentParser(description="Fake ACA-Py admin API")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=7001, help="The port of the agent, 0 picks a free port")
+    parser.add_argument("--connections", type=int, default=10, help="The amount of active connections")
+    parser.add_argument("--proof-records", type=int, default=None, help="The amount of proof records")
+    parser.add_argument("--latency", type=float, default=0.0, help="The latency of every request in milliseconds")
+    parser.add_argument("--wallets", type=int, default=0,
+                        help="The amount of (patient) wallet agents that can connect to the agent, on free ports")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    network = FakeNetwork()
+    agent = FakeAgent(args.host, args.port, latency=args.latency / 1000, network=network)
+    agent.state.seed(args.connections, args.proof_records)
+    wallets = [FakeAgent(args.host, 0, latency=args.latency / 1000, label=f"Wallet_{i}", network=network)
+               for i in range(args.wallets)]
+    for wallet in wallets:
+        wallet.start()
+    logging.info(f"Fake agent listening on http://{agent.host}:{agent.port} with {len(agent.state.connections)} "
+                 f"connection(s), {len(agent.state.proof_records)} proof record(s) and {len(wallets)} wallet(s)")
+    print(json.dumps({"agent": agent.port, "wallets": [wallet.port for wallet in wallets]}), flush=True)
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
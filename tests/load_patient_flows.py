@@ -0,0 +1,235 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import json
+import time
+import sys
+
+from library.api_handler import ApiHandler, states
+from helpers.requested_attribute_generator import generate_requested_attributes
+from schemas.naw import naw
+from tests import fake_agent
+
+# The stages of a patient flow, in order
+stages = (
+    "create_invitation",
+    "receive_invitation",
+    "accept_invitation",
+    "accept_request",
+    "active",
+    "send_proof_request",
+    "send_presentation",
+    "verify_presentation",
+)
+
+
+class PatientFlow:
+    def __init__(self, desktop: ApiHandler, wallet: ApiHandler, patient: int, template: list,
+                 poll_interval: float = 0.01, timeout: float = 30.0):
+        """
+        PatientFlow constructor, walks a single simulated patient (wallet) through the connection and proof flow
+        :param desktop: The ApiHandler of the desktop (care provider) agent
+        :param wallet: The ApiHandler of the patient wallet agent
+        :param patient: The number of the patient, used to create an unique alias
+        :param template: The proof request template (see ApiHandler.build_proof_request_template)
+        :param poll_interval: The amount of seconds between the state checks
+        :param timeout: The maximum amount of seconds to wait for a state
+        """
+        self.desktop = desktop
+        self.wallet = wallet
+        self.alias = f"Patient {patient} Load {200000000 + patient}"
+        self.template = template
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        # stage -> duration in seconds
+        self.durations = {}
+
+    def __wait(self, check):
+        """
+        Poll until check returns a value
+        :param check: Function that returns the value, or None when the state is not reached yet
+        :return: The value
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            value = check()
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                raise TimeoutError("The state was not reached in time")
+            time.sleep(self.poll_interval)
+
+    def __stage(self, stage: str, function, *args, **kwargs):
+        """
+        Execute and time a stage
+        :param stage: The name of the stage (see stages)
+        :param function: The function to execute
+        :return: The return value of the function
+        """
+        started = time.perf_counter()
+        value = function(*args, **kwargs)
+        self.durations[stage] = time.perf_counter() - started
+        return value
+
+    def __state_reached(self, api: ApiHandler, conn_id: str, state: str):
+        return True if api.get_connection_state(conn_id) == states[state] else None
+
+    def __proof_record(self, api: ApiHandler, conn_id: str, state: str, role: str):
+        records = api.get_proof_records(state=state, role=role, conn_id=conn_id)
+        return records[0]["pres_ex_id"] if records else None
+
+    def run(self) -> dict:
+        """
+        Execute the flow
+        :return: The durations of the stages in seconds
+        """
+        desktop_conn_id, invitation = self.__stage(
+            "create_invitation", self.desktop.create_invitation, alias=self.alias, multi_use=False, auto_accept=False)
+        wallet_conn_id = self.__stage(
+            "receive_invitation", self.wallet.receive_invitation, invitation_url=invitation, alias="Desktop",
+            auto_accept=False)
+        self.__stage("accept_invitation", self.wallet.accept_invitation, wallet_conn_id)
+
+        def accept_request():
+            # The desktop accepts the connection request once it is received
+            self.__wait(lambda: self.__state_reached(self.desktop, desktop_conn_id, "request"))
+            self.desktop.accept_request(desktop_conn_id)
+        self.__stage("accept_request", accept_request)
+        self.__stage("active", self.__wait, lambda: self.__state_reached(self.wallet, wallet_conn_id, "active"))
+        pres_ex_id = self.__stage(
+            "send_proof_request", self.desktop.send_proof_request_from_template, self.template, desktop_conn_id,
+            name="NAW", comment="Load test")
+
+        def send_presentation():
+            # The wallet answers the received proof request, the desktop waits for the presentation
+            request_id = self.__wait(lambda: self.__proof_record(
+                self.wallet, wallet_conn_id, "request_received", "prover"))
+            self.wallet.send_presentation(
+                request_id, requested_attributes={referent: {"cred_id": "load", "revealed": True}
+                                                  for referent in naw["attributes"]},
+                requested_predicates={}, self_attested_attributes={})
+            self.__wait(lambda: self.__proof_record(self.desktop, desktop_conn_id, "presentation_received", "verifier"))
+        self.__stage("send_presentation", send_presentation)
+        self.__stage("verify_presentation", self.desktop.verify_presentation, pres_ex_id)
+        return self.durations
+
+
+def summarize(durations: list) -> dict:
+    """
+    Summarize the durations of a stage
+    :param durations: The durations in seconds
+    :return: A dict with: count, p50_ms, p95_ms, p99_ms and max_ms
+    """
+    durations = sorted(durations)
+    if not durations:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+    def percentile(p):
+        return round(durations[min(len(durations) - 1, int(round(p / 100 * (len(durations) - 1))))] * 1000, 3)
+    return {"count": len(durations), "p50_ms": percentile(50), "p95_ms": percentile(95), "p99_ms": percentile(99),
+            "max_ms": round(durations[-1] * 1000, 3)}
+
+
+def run_scenario(patients: int, concurrency: int, wallets: int, latency: float, poll_interval: float,
+                 timeout: float) -> dict:
+    """
+    Drive the simulated patients concurrently through the full flow against the fake agents
+    :param patients: The amount of simulated patients (flows)
+    :param concurrency: The amount of flows that are executed at the same time
+    :param wallets: The amount of fake wallet agents the patients are divided over
+    :param latency: The latency of every request in milliseconds
+    :param poll_interval: The amount of seconds between the state checks
+    :param timeout: The maximum amount of seconds to wait for a state
+    :return: The report as a dict with: flows, completed, failed, errors, elapsed, flows_per_second and stages
+    """
+    process, ports = fake_agent.spawn(connections=0, latency=latency, wallets=wallets)
+    try:
+        # Every flow needs a keep-alive connection, shared by the patients of the same wallet
+        desktop = ApiHandler("localhost", ports["agent"], pool_maxsize=concurrency)
+        wallet_apis = [ApiHandler("localhost", port, pool_maxsize=concurrency) for port in ports["wallets"]]
+        template = ApiHandler.build_proof_request_template(generate_requested_attributes(naw))
+        results = {stage: [] for stage in stages}
+        results["flow"] = []
+        errors = {}
+
+        def run_flow(patient: int):
+            flow = PatientFlow(desktop, wallet_apis[patient % len(wallet_apis)], patient, template,
+                               poll_interval=poll_interval, timeout=timeout)
+            started = time.perf_counter()
+            flow.run()
+            return time.perf_counter() - started, flow.durations
+
+        started = time.perf_counter()
+        completed = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(run_flow, patient) for patient in range(patients)]
+            for future in as_completed(futures):
+                try:
+                    duration, durations = future.result()
+                except Exception as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    continue
+                completed += 1
+                results["flow"].append(duration)
+                for stage, stage_duration in durations.items():
+                    results[stage].append(stage_duration)
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "flows": patients,
+        "completed": completed,
+        "failed": patients - completed,
+        "errors": errors,
+        "elapsed": round(elapsed, 3),
+        "flows_per_second": round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": {stage: summarize(durations) for stage, durations in results.items()}
+    }
+
+
+def positive_int(value: str) -> int:
+    """
+    Argparse type of the options that need at least one (patient, flow or wallet)
+    :param value: The option value
+    :return: The value as a int
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Drive simulated patient wallets through the connection and proof "
+                                                 "flow against fake ACA-Py agents")
+    parser.add_argument("--patients", type=positive_int, default=200, help="The amount of simulated patients (flows)")
+    parser.add_argument("--concurrency", type=positive_int, default=16, help="The amount of flows executed at the same time")
+    parser.add_argument("--wallets", type=positive_int, default=4, help="The amount of fake wallet agents")
+    parser.add_argument("--latency", type=float, default=0.0, help="The latency of every request in milliseconds")
+    parser.add_argument("--poll-interval", type=float, default=0.01,
+                        help="The amount of seconds between the state checks")
+    parser.add_argument("--timeout", type=float, default=30.0, help="The maximum amount of seconds to wait for a state")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    print(f"Running {args.patients} patient flow(s), {args.concurrency} at the same time, over {args.wallets} "
+          f"wallet(s) with {args.latency:g} ms latency", flush=True)
+    report = run_scenario(args.patients, args.concurrency, args.wallets, args.latency, args.poll_interval,
+                          args.timeout)
+    print(f"{'stage':<22} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, summary in report["stages"].items():
+        print(f"{stage:<22} {summary['count']:>6} {summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} "
+              f"{summary['p99_ms']:>9.2f} {summary['max_ms']:>9.2f}")
+    print(f"{report['completed']} of {report['flows']} flow(s) completed in {report['elapsed']:.1f} seconds "
+          f"({report['flows_per_second']:.2f} flows/s)")
+    if report["errors"]:
+        print(f"Errors: {', '.join(f'{error} ({count})' for error, count in report['errors'].items())}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    # Run from the project root: python -m tests.load_patient_flows --patients 1000 --concurrency 32
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import unittest
+import logging
+
+from library.agent_pool import AgentPool, HashRing, PartialResultError, UnknownConnectionError
+from library.api_handler import ApiHandler
+from tests.fake_agent import FakeAgent, FakeNetwork
+
+
+def alias(patient: int) -> str:
+    return f"Patient {patient} Pool {100000000 + patient}"
+
+
+class HashRingTest(unittest.TestCase):
+    keys = [str(100000000 + i) for i in range(2000)]
+
+    def assignment(self, ring: HashRing) -> dict:
+        return {key: ring.get(key) for key in self.keys}
+
+    def test_empty(self):
+        self.assertIsNone(HashRing().get("100000000"))
+
+    def test_stable(self):
+        first, second = HashRing(), HashRing()
+        for node in ("a", "b", "c"):
+            first.add(node)
+        # The insertion order does not matter
+        for node in ("c", "a", "b"):
+            second.add(node)
+        self.assertEqual(self.assignment(first), self.assignment(second))
+
+    def test_add_moves_keys_to_the_new_node_only(self):
+        ring = HashRing()
+        for node in ("a", "b", "c"):
+            ring.add(node)
+        before = self.assignment(ring)
+        ring.add("d")
+        after = self.assignment(ring)
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertTrue(all(after[key] == "d" for key in moved))
+        # About a quarter of the keys move to the fourth node
+        self.assertGreater(len(moved), len(self.keys) * 0.1)
+        self.assertLess(len(moved), len(self.keys) * 0.4)
+
+    def test_remove_restores_the_assignment(self):
+        ring = HashRing()
+        for node in ("a", "b", "c"):
+            ring.add(node)
+        before = self.assignment(ring)
+        ring.add("d")
+        ring.remove("d")
+        self.assertEqual(before, self.assignment(ring))
+
+    def test_every_node_receives_keys(self):
+        ring = HashRing()
+        for node in ("a", "b", "c"):
+            ring.add(node)
+        counts = {}
+        for node in self.assignment(ring).values():
+            counts[node] = counts.get(node, 0) + 1
+        self.assertEqual({"a", "b", "c"}, set(counts))
+        self.assertTrue(all(count > len(self.keys) * 0.15 for count in counts.values()))
+
+
+class AgentPoolTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.network = FakeNetwork()
+        self.agents = {name: FakeAgent(label=name, network=self.network).start() for name in ("a", "b", "c")}
+        self.pool = AgentPool({name: self.api(agent) for name, agent in self.agents.items()})
+
+    def tearDown(self):
+        for agent in self.agents.values():
+            agent.stop()
+        logging.disable(logging.NOTSET)
+
+    @staticmethod
+    def api(agent: FakeAgent) -> ApiHandler:
+        # Fail fast, the outage tests stop agents
+        return ApiHandler(agent.host, agent.port, max_retries=0, failure_threshold=1)
+
+    def owning_agent(self, conn_id: str) -> str:
+        return next(name for name, agent in self.agents.items() if conn_id in agent.state.connections)
+
+    def invite(self, patients: int) -> dict:
+        return {alias(i): self.pool.create_invitation(alias(i), multi_use=False, auto_accept=True)[0]
+                for i in range(patients)}
+
+    def test_new_patients_are_placed_on_the_ring_owner(self):
+        for patient_alias, conn_id in self.invite(30).items():
+            name, _ = self.pool.agent_for_patient(patient_alias)
+            self.assertEqual(self.pool.owner(AgentPool.patient_key(patient_alias)), name)
+            self.assertEqual(name, self.owning_agent(conn_id))
+        self.assertEqual(3, len({self.owning_agent(conn_id) for conn_id in self.invite(30).values()}))
+
+    def test_existing_patients_stay_on_their_agent(self):
+        # The patient is connected to another agent than the ring assigns
+        patient_alias = alias(1)
+        owner = self.pool.owner(AgentPool.patient_key(patient_alias))
+        other = next(name for name in self.agents if name != owner)
+        conn_id = self.agents[other].state.add_connection(patient_alias)
+        self.pool.refresh_placements()
+        self.assertEqual(other, self.pool.agent_for_patient(patient_alias)[0])
+        self.assertEqual(conn_id, self.pool.get_connection_id_by_bsn(AgentPool.patient_key(patient_alias)))
+
+    def test_connection_and_record_ids_are_routed_to_their_agent(self):
+        conn_ids = self.invite(12)
+        # A new pool has no lookup tables, the ids are looked up on every agent
+        pool = AgentPool({name: self.api(agent) for name, agent in self.agents.items()})
+        for patient_alias, conn_id in conn_ids.items():
+            name = self.owning_agent(conn_id)
+            self.assertEqual(patient_alias, pool.get_connection(conn_id)["alias"])
+            pres_ex_id = self.agents[name].state.add_proof_record(conn_id, state="presentation_received")
+            calls = {other: agent.state.calls for other, agent in self.agents.items() if other != name}
+            pool.verify_presentation(pres_ex_id)
+            pool.verify_presentation(pres_ex_id)
+            self.assertEqual("verified", self.agents[name].state.proof_records[pres_ex_id]["state"])
+            # Only the first lookup asks the other agents
+            self.assertTrue(all(agent.state.calls - calls[other] <= 1
+                                for other, agent in self.agents.items() if other != name))
+
+    def test_unknown_ids(self):
+        self.assertIsNone(self.pool.get_connection("unknown"))
+        self.assertIsNone(self.pool.get_proof_record("unknown"))
+        with self.assertRaises(UnknownConnectionError):
+            self.pool.accept_request("unknown")
+
+    def test_listings_are_merged(self):
+        conn_ids = self.invite(20)
+        for conn_id in conn_ids.values():
+            state = self.agents[self.owning_agent(conn_id)].state
+            state.update(state.connections, conn_id, state="active")
+            state.add_proof_record(conn_id, state="request_sent")
+        received = next(iter(conn_ids.values()))
+        self.agents[self.owning_agent(received)].state.add_proof_record(received, state="presentation_received")
+        self.assertEqual(set(conn_ids.values()),
+                         {connection["connection_id"] for connection in self.pool.get_connections()["results"]})
+        self.assertEqual(set(conn_ids.values()),
+                         {connection["connection_id"] for connection in self.pool.iter_connections()})
+        self.assertEqual(sorted(conn_ids), sorted(self.pool.get_active_connection_aliases()))
+        self.assertEqual(21, len(self.pool.get_proof_records(state="")))
+        pending = self.pool.get_pending_work()
+        self.assertEqual(21, len(pending))
+        self.assertEqual("presentation_received", pending[0]["state"])
+
+    def test_unavailable_agent_is_reported(self):
+        conn_ids = self.invite(20)
+        self.agents["b"].stop()
+        with self.assertRaises(PartialResultError) as context:
+            self.pool.get_connections()
+        self.assertEqual(["b"], list(context.exception.failed))
+        self.assertEqual({conn_id for conn_id in conn_ids.values() if self.owning_agent(conn_id) != "b"},
+                         {connection["connection_id"] for connection in context.exception.result["results"]})
+        with self.assertRaises(PartialResultError):
+            list(self.pool.iter_connections())
+
+    def test_add_agent_rebalance_report(self):
+        conn_ids = self.invite(40)
+        self.agents["d"] = FakeAgent(label="d", network=self.network).start()
+        report = self.pool.add_agent("d", self.api(self.agents["d"]))
+        self.assertEqual(0, report["patients"]["d"])
+        self.assertEqual(40, sum(report["patients"].values()))
+        self.assertEqual([], report["unavailable"])
+        # The patients the ring now assigns to the new agent stay on their agent until they are connected again
+        moved = {AgentPool.patient_key(patient_alias) for patient_alias in conn_ids
+                 if self.pool.owner(AgentPool.patient_key(patient_alias)) == "d"}
+        self.assertTrue(moved)
+        self.assertEqual(moved, set(report["misplaced"]))
+        self.assertTrue(all(owner == "d" for _, owner in report["misplaced"].values()))
+        patient_alias = next(patient_alias for patient_alias in conn_ids
+                             if AgentPool.patient_key(patient_alias) in moved)
+        self.assertNotEqual("d", self.pool.agent_for_patient(patient_alias)[0])
+        self.assertTrue(self.pool.delete_connection(conn_ids[patient_alias]))
+        self.assertEqual("d", self.pool.agent_for_patient(patient_alias)[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
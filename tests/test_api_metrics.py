@@ -0,0 +1,110 @@
+import unittest
+import logging
+import json
+
+from library.api_handler import ApiHandler
+from library.api_metrics import ApiMetrics, prometheus_prefix
+from tests.fake_agent import FakeAgent
+
+
+class ApiMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = ApiMetrics()
+        self.metrics.record("get_connections", "GET", "/connections", 0.004, status=200, response_bytes=100)
+        self.metrics.record("get_connections", "GET", "/connections", 0.2, status=200, response_bytes=50)
+        self.metrics.record("get_connections", "GET", "/connections", 0.03, status=500)
+        self.metrics.record("delete_connection", "DELETE", "/connections/1", 20.0, error="ConnectTimeout",
+                            request_bytes=10)
+
+    def test_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(["delete_connection", "get_connections"], list(snapshot))
+        connections = snapshot["get_connections"]
+        self.assertEqual(3, connections["calls"])
+        # The error status code counts as an error
+        self.assertEqual(1, connections["errors"])
+        self.assertEqual({"200": 2, "500": 1}, connections["status_codes"])
+        self.assertEqual(150, connections["response_bytes"])
+        self.assertEqual(78.0, connections["latency_avg_ms"])
+        self.assertEqual(200.0, connections["latency_max_ms"])
+        # The upper bound of the bucket that contains the quantile
+        self.assertEqual(50.0, connections["latency_p50_ms"])
+        self.assertEqual(200.0, connections["latency_p95_ms"])
+        self.assertEqual(1, connections["latency_buckets"]["0.005"])
+        self.assertEqual(1, connections["latency_buckets"]["0.05"])
+        self.assertEqual(1, connections["latency_buckets"]["0.25"])
+        delete = snapshot["delete_connection"]
+        self.assertEqual((1, 1), (delete["calls"], delete["errors"]))
+        self.assertEqual({}, delete["status_codes"])
+        self.assertEqual({"ConnectTimeout": 1}, delete["error_types"])
+        self.assertEqual(1, delete["latency_buckets"]["+Inf"])
+        # The quantile of the +Inf bucket is the maximum latency
+        self.assertEqual(20000.0, delete["latency_p95_ms"])
+
+    def test_reset_keeps_the_hooks(self):
+        events = []
+        self.metrics.add_hook(events.append)
+        self.metrics.reset()
+        self.assertEqual({}, self.metrics.snapshot())
+        self.metrics.record("get_schemas", "GET", "/schemas/created", 0.01, status=200)
+        self.assertEqual(1, self.metrics.snapshot()["get_schemas"]["calls"])
+        self.assertEqual([{"endpoint": "get_schemas", "method": "GET", "path": "/schemas/created", "status": 200,
+                           "duration": 0.01, "request_bytes": 0, "response_bytes": 0, "error": None}], events)
+        self.metrics.remove_hook(events.append)
+        self.metrics.record("get_schemas", "GET", "/schemas/created", 0.01, status=200)
+        self.assertEqual(1, len(events))
+
+    def test_failing_hook_is_ignored(self):
+        def hook(event):
+            raise ValueError("Broken hook")
+
+        self.metrics.add_hook(hook)
+        logging.disable(logging.WARNING)
+        try:
+            self.metrics.record("get_schemas", "GET", "/schemas/created", 0.01, status=200)
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertEqual(1, self.metrics.snapshot()["get_schemas"]["calls"])
+
+    def test_json_export(self):
+        self.assertEqual(self.metrics.snapshot(), json.loads(self.metrics.to_json()))
+
+    def test_prometheus_export(self):
+        lines = self.metrics.to_prometheus().splitlines()
+        self.assertIn(f'{prometheus_prefix}_requests_total{{endpoint="get_connections"}} 3', lines)
+        self.assertIn(f'{prometheus_prefix}_request_errors_total{{endpoint="delete_connection"}} 1', lines)
+        self.assertIn(f'{prometheus_prefix}_response_bytes_total{{endpoint="get_connections"}} 150', lines)
+        self.assertIn(f'{prometheus_prefix}_request_bytes_total{{endpoint="delete_connection"}} 10', lines)
+        # The buckets are cumulative
+        self.assertIn(f'{prometheus_prefix}_request_duration_seconds_bucket{{endpoint="get_connections",'
+                      f'le="0.05"}} 2', lines)
+        self.assertIn(f'{prometheus_prefix}_request_duration_seconds_bucket{{endpoint="get_connections",'
+                      f'le="+Inf"}} 3', lines)
+        self.assertIn(f'{prometheus_prefix}_request_duration_seconds_sum{{endpoint="get_connections"}} 0.234000',
+                      lines)
+        self.assertIn(f'{prometheus_prefix}_request_duration_seconds_count{{endpoint="delete_connection"}} 1', lines)
+
+
+class ApiHandlerMetricsTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.agent = FakeAgent().start()
+        self.api = ApiHandler(self.agent.host, self.agent.port, max_retries=0)
+
+    def tearDown(self):
+        self.agent.stop()
+        logging.disable(logging.NOTSET)
+
+    def test_requests_are_recorded(self):
+        self.agent.state.add_connection("Jan Jansen 123456789")
+        self.api.get_connections()
+        self.assertFalse(self.api.delete_connection("unknown", delete_records=False))
+        snapshot = self.api.metrics.snapshot()
+        self.assertEqual({"200": 1}, snapshot["get_connections"]["status_codes"])
+        self.assertGreater(snapshot["get_connections"]["response_bytes"], 0)
+        self.assertEqual({"404": 1}, snapshot["delete_connection"]["status_codes"])
+        self.assertEqual(1, snapshot["delete_connection"]["errors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import asyncio
+import logging
+import time
+
+from library.async_api_handler import AsyncApiHandler
+from tests.fake_agent import FakeAgent
+
+latency = 0.2
+
+
+class AsyncApiHandlerTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.agent = FakeAgent(latency=latency).start()
+
+    def tearDown(self):
+        self.agent.stop()
+        logging.disable(logging.NOTSET)
+
+    def test_concurrency_limit_survives_set_url(self):
+        async def scenario():
+            async with AsyncApiHandler(self.agent.host, self.agent.port, concurrency=1, backoff_factor=0) as api:
+                started = time.perf_counter()
+                first = [asyncio.ensure_future(api.get_connections()) for _ in range(2)]
+                await asyncio.sleep(latency / 2)
+                # Recreates the session while a request is in flight and another one is waiting
+                await api.set_url(self.agent.host, self.agent.port)
+                second = [asyncio.ensure_future(api.get_connections()) for _ in range(2)]
+                results = await asyncio.gather(*first, *second)
+                return results, time.perf_counter() - started
+
+        results, elapsed = asyncio.run(scenario())
+        self.assertEqual([{"results": []}] * 4, results)
+        # The requests are still executed one at a time
+        self.assertGreaterEqual(elapsed, 4 * latency)
+
+    def test_semaphore_per_event_loop(self):
+        api = AsyncApiHandler(self.agent.host, self.agent.port, concurrency=1)
+        # Every asyncio.run creates a new event loop, the handler keeps working
+        for _ in range(2):
+            self.assertEqual({"results": []}, asyncio.run(api.get_connections()))
+            asyncio.run(api.close())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import threading
+import logging
+import time
+
+from library.api_handler import ApiHandler
+from library.batch_issuance import BatchIssuance
+from library.rate_limiter import RateLimiter
+from tests.fake_agent import FakeAgent
+
+schema = {"id": "Fake:2:naw:1.0", "name": "naw", "version": "1.0"}
+cred_def_id = "Fake:3:CL:1:naw"
+rate = 20.0
+
+
+def attributes(name: str) -> list:
+    return [{"name": "naam", "value": name}]
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_burst_is_not_delayed(self):
+        limiter = RateLimiter(rate, burst=3)
+        self.assertEqual([0.0, 0.0, 0.0], [limiter.acquire() for _ in range(3)])
+        self.assertAlmostEqual(1 / rate, limiter.acquire(), delta=0.01)
+
+    def test_tokens_are_refilled(self):
+        limiter = RateLimiter(rate)
+        limiter.acquire()
+        time.sleep(1 / rate)
+        self.assertEqual(0.0, limiter.acquire())
+
+    def test_concurrent_requests_are_spread(self):
+        limiter = RateLimiter(rate, burst=2)
+        started = time.monotonic()
+        threads = [threading.Thread(target=limiter.acquire) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The burst passes at once, the other six requests wait for a token each
+        self.assertGreaterEqual(time.monotonic() - started, 6 / rate - 0.01)
+
+
+class BatchIssuanceTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.agent = FakeAgent(latency=0.05).start()
+        self.api = ApiHandler(self.agent.host, self.agent.port, max_retries=0)
+        self.conn_ids = [self.agent.state.add_connection(f"Patient {i} Issuance {100000000 + i}") for i in range(8)]
+
+    def tearDown(self):
+        self.agent.stop()
+        logging.disable(logging.NOTSET)
+
+    def test_credentials_are_issued_concurrently(self):
+        batch = BatchIssuance(self.api, cred_def_id, schema, max_workers=4)
+        report = batch.run([(conn_id, attributes(conn_id)) for conn_id in self.conn_ids])
+        self.assertEqual(self.conn_ids, [result["conn_id"] for result in report["results"]])
+        self.assertTrue(all(result["issued"] and result["credential_exchange_id"] for result in report["results"]))
+        self.assertEqual({"total": 8, "issued": 8, "failed": 0},
+                         {key: report["metrics"][key] for key in ("total", "issued", "failed")})
+        # Two rounds of four requests instead of eight sequential requests
+        self.assertLess(report["metrics"]["elapsed"], 8 * self.agent.state.latency)
+
+    def test_failures_are_reported(self):
+        items = [(conn_id, attributes(conn_id)) for conn_id in self.conn_ids[:2]] + [("unknown", attributes("x"))]
+        report = BatchIssuance(self.api, cred_def_id, schema).run(items)
+        self.assertEqual([True, True, False], [result["issued"] for result in report["results"]])
+        self.assertEqual("The credential exchange was not created", report["results"][2]["error"])
+        self.assertEqual(1, report["metrics"]["failed"])
+
+    def test_unreachable_agent(self):
+        self.agent.stop()
+        report = BatchIssuance(self.api, cred_def_id, schema).run([(self.conn_ids[0], attributes("x"))])
+        self.assertFalse(report["results"][0]["issued"])
+        self.assertIsNotNone(report["results"][0]["error"])
+        self.assertEqual(0.0, report["metrics"]["throughput"])
+
+    def test_rate_limit(self):
+        batch = BatchIssuance(self.api, cred_def_id, schema, max_workers=2, rate_limit=rate)
+        report = batch.run([(conn_id, attributes(conn_id)) for conn_id in self.conn_ids])
+        self.assertEqual(8, report["metrics"]["issued"])
+        # The burst equals max_workers, the other six credentials wait for a token each
+        self.assertGreaterEqual(report["metrics"]["elapsed"], 6 / rate - 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import logging
+
+from library.api_handler import ApiHandler
+from library.bulk_proof_request import BulkProofRequest
+from tests.fake_agent import FakeAgent
+
+requested_attributes = {"0_naam_uuid": {"name": "naam"}}
+
+
+class BulkProofRequestTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.agent = FakeAgent(latency=0.05).start()
+        self.api = ApiHandler(self.agent.host, self.agent.port, max_retries=0)
+        self.conn_ids = [self.agent.state.add_connection(f"Patient {i} Cohort {100000000 + i}") for i in range(8)]
+
+    def tearDown(self):
+        self.agent.stop()
+        logging.disable(logging.NOTSET)
+
+    def job(self, **kwargs) -> BulkProofRequest:
+        return BulkProofRequest(self.api, "NAW", requested_attributes, "Onderzoek", **kwargs)
+
+    def test_proof_requests_are_sent_concurrently(self):
+        job = self.job(max_workers=4)
+        report = job.run(self.conn_ids)
+        self.assertEqual(sorted(self.conn_ids), sorted(report))
+        self.assertTrue(all(outcome["sent"] and outcome["error"] is None for outcome in report.values()))
+        self.assertEqual({conn_id: outcome["pres_ex_id"] for conn_id, outcome in report.items()}, job.pres_ex_ids)
+        self.assertEqual((8, 8), (job.total, job.done))
+        records = self.agent.state.proof_records
+        for conn_id, pres_ex_id in job.pres_ex_ids.items():
+            self.assertEqual(conn_id, records[pres_ex_id]["connection_id"])
+            self.assertEqual("NAW:Onderzoek", records[pres_ex_id]["presentation_request"]["name"])
+
+    def test_concurrency_is_bounded(self):
+        in_flight = []
+        peak = []
+        send = self.api.send_proof_request_from_template
+
+        def counting_send(*args, **kwargs):
+            in_flight.append(None)
+            peak.append(len(in_flight))
+            try:
+                return send(*args, **kwargs)
+            finally:
+                in_flight.pop()
+
+        self.api.send_proof_request_from_template = counting_send
+        self.job(max_workers=3).run(self.conn_ids)
+        self.assertEqual(3, max(peak))
+
+    def test_failures_do_not_stop_the_cohort(self):
+        report = self.job().run(self.conn_ids[:3] + ["unknown"])
+        self.assertEqual(3, sum(1 for outcome in report.values() if outcome["sent"]))
+        self.assertFalse(report["unknown"]["sent"])
+        self.assertIsNone(report["unknown"]["pres_ex_id"])
+        self.assertIsNotNone(report["unknown"]["error"])
+
+    def test_cancel_skips_the_pending_requests(self):
+        job = self.job(max_workers=1)
+        outcomes = []
+        for outcome in job.iter_run(self.conn_ids):
+            outcomes.append(outcome)
+            job.cancel()
+        self.assertTrue(job.cancelled())
+        self.assertEqual(8, len(outcomes))
+        # The request that was already queued inside the executor might still be sent
+        self.assertLessEqual(len(job.pres_ex_ids), 2)
+        self.assertEqual(len(job.pres_ex_ids), len(self.agent.state.proof_records))
+        self.assertTrue(all(outcome["error"] == "Cancelled" for outcome in outcomes if not outcome["sent"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
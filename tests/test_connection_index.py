@@ -0,0 +1,73 @@
+import unittest
+import logging
+import time
+
+from library.api_handler import ApiHandler
+from library.webhook_listener import WebhookListener
+from tests.fake_agent import FakeAgent
+
+index_ttl = 0.1
+alias = "Jan Jansen 123456789"
+bsn = "123456789"
+
+
+class ConnectionIndexTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.agent = FakeAgent().start()
+        self.api = ApiHandler(self.agent.host, self.agent.port, max_retries=0, index_ttl=index_ttl)
+        # Bound, but the fake agent never sends webhooks to it (ACA-Py started without --webhook-url)
+        self.webhooks = WebhookListener(self.api, port=0)
+        self.assertTrue(self.webhooks.start())
+
+    def tearDown(self):
+        self.webhooks.stop()
+        self.agent.stop()
+        logging.disable(logging.NOTSET)
+
+    def test_bound_listener_is_not_receiving(self):
+        self.assertTrue(self.webhooks.isRunning())
+        self.assertFalse(self.webhooks.isReceiving())
+
+    def test_connection_of_another_client_is_found(self):
+        self.assertIsNone(self.api.get_connection_by_alias(alias))
+        self.assertIsNone(self.api.get_connection_id_by_bsn(bsn))
+        conn_id = self.agent.state.add_connection(alias)
+        # A missing alias is retrieved again immediately, the BSN index once it is older than the TTL
+        self.assertEqual(conn_id, self.api.get_connection_by_alias(alias)["connection_id"])
+        time.sleep(index_ttl * 2)
+        self.assertEqual(conn_id, self.api.get_connection_id_by_bsn(bsn))
+
+    def test_deleted_connection_no_longer_resolves(self):
+        conn_id = self.agent.state.add_connection(alias)
+        self.agent.state.update(self.agent.state.connections, conn_id, state="active")
+        self.assertEqual(conn_id, self.api.get_connection_by_alias(alias)["connection_id"])
+        self.assertEqual(conn_id, self.api.get_connection_id_by_bsn(bsn))
+        self.assertEqual(alias, self.api.get_alias_by_conn_id(conn_id))
+        # Deleted by another client
+        ApiHandler(self.agent.host, self.agent.port, max_retries=0).delete_connection(conn_id)
+        time.sleep(index_ttl * 2)
+        self.assertIsNone(self.api.get_connection_by_alias(alias))
+        self.assertIsNone(self.api.get_connection_id_by_bsn(bsn))
+        self.assertIsNone(self.api.get_alias_by_conn_id(conn_id))
+        self.assertIsNone(self.api.get_connection(conn_id))
+
+    def test_index_is_trusted_once_webhooks_are_received(self):
+        conn_id = self.agent.state.add_connection(alias)
+        self.webhooks.handleEvent("connections", self.agent.state.connections[conn_id])
+        self.assertTrue(self.webhooks.isReceiving())
+        self.api.get_connection_by_alias(alias)
+        calls = self.agent.state.calls
+        time.sleep(index_ttl * 2)
+        self.assertEqual(conn_id, self.api.get_connection_by_alias(alias)["connection_id"])
+        self.assertEqual(conn_id, self.api.get_connection_id_by_bsn(bsn))
+        self.assertEqual(calls, self.agent.state.calls)
+        # Stopping the listener restores the revalidation
+        self.webhooks.stop()
+        self.assertFalse(self.webhooks.isReceiving())
+        self.api.get_connection_by_alias(alias)
+        self.assertGreater(self.agent.state.calls, calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
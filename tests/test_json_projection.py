@@ -0,0 +1,110 @@
+import unittest
+from unittest import mock
+import logging
+import json
+import io
+
+import library.api_handler
+import library.json_projection
+from library.api_handler import ApiHandler, proof_record_projection
+from library.json_projection import compile_fields, parse_results, project, project_items, loads
+from tests.fake_agent import FakeAgent
+
+# The optional backends that are installed, the tests of a missing backend are skipped
+simdjson = library.json_projection.simdjson
+orjson = library.json_projection.orjson
+ijson = library.api_handler.ijson
+
+results = [
+    {"connection_id": "1", "state": "verified", "score": 1.5, "tags": ["a", "b"],
+     "presentation_request": {"name": "NAW:Onderzoek", "version": "1.0", "requested_attributes": {"x": {}}}},
+    {"connection_id": "2", "state": "request_sent", "presentation_request": {"version": "1.0"}},
+    {"connection_id": "3", "presentation_request": "not an object"},
+]
+body = json.dumps({"results": results}).encode("utf-8")
+tree = compile_fields(("state", "score", "tags", "presentation_request.name"))
+projected = [
+    {"state": "verified", "score": 1.5, "tags": ["a", "b"], "presentation_request": {"name": "NAW:Onderzoek"}},
+    {"state": "request_sent", "presentation_request": {}},
+    {},
+]
+
+
+class CompileFieldsTest(unittest.TestCase):
+    def test_tree(self):
+        self.assertEqual({"state": None, "presentation_request": {"name": None, "version": None}},
+                         compile_fields(("state", "presentation_request.name", "presentation_request.version")))
+
+    def test_parent_includes_its_children(self):
+        expected = {"presentation": None}
+        self.assertEqual(expected, compile_fields(("presentation", "presentation.requested_proof.revealed_attrs")))
+        self.assertEqual(expected, compile_fields(("presentation.requested_proof", "presentation")))
+
+
+class ParseResultsTest(unittest.TestCase):
+    def backend(self, simdjson_module, orjson_module):
+        """
+        Select the backends of json_projection for the duration of the test
+        """
+        for name, module in (("simdjson", simdjson_module), ("orjson", orjson_module)):
+            patcher = mock.patch.object(library.json_projection, name, module)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def check(self) -> None:
+        self.assertEqual(projected, parse_results(body, tree))
+        self.assertEqual(results, parse_results(body))
+        self.assertEqual({"results": []}, loads(b'{"results": []}'))
+        self.assertEqual([], parse_results(b'{"results": []}', tree))
+
+    @unittest.skipIf(simdjson is None, "pysimdjson is not installed")
+    def test_simdjson(self):
+        self.backend(simdjson, None)
+        self.check()
+        # Every thread keeps its own parser, a second parse must not invalidate the previous results
+        first = parse_results(body, tree)
+        parse_results(b'{"results": [{"state": "abandoned"}]}', tree)
+        self.assertEqual(projected, first)
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson(self):
+        self.backend(None, orjson)
+        self.check()
+
+    def test_stdlib(self):
+        self.backend(None, None)
+        self.check()
+
+    @unittest.skipIf(ijson is None, "ijson is not installed")
+    def test_ijson(self):
+        items = ijson.items(io.BytesIO(body), "results.item", use_float=True)
+        self.assertEqual(projected, list(project_items(items, tree)))
+        self.assertEqual(results, list(project_items(ijson.items(io.BytesIO(body), "results.item", use_float=True))))
+
+
+class ApiHandlerProjectionTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.agent = FakeAgent().start()
+        self.api = ApiHandler(self.agent.host, self.agent.port, max_retries=0)
+        conn_id = self.agent.state.add_connection("Jan Jansen 123456789")
+        self.agent.state.add_proof_record(conn_id, state="verified", attributes={"voornaam": "Jan"})
+        self.agent.state.add_proof_record(conn_id, state="request_sent", name="MEDICATIE")
+
+    def tearDown(self):
+        self.agent.stop()
+        logging.disable(logging.NOTSET)
+
+    def test_every_path_returns_the_same_records(self):
+        expected = [self.api.format_proof_record(project(record, proof_record_projection))
+                    for record in self.agent.state.proof_records.values()]
+        paths = [(ijson, None, None), (None, simdjson, None), (None, None, orjson), (None, None, None)]
+        for ijson_module, simdjson_module, orjson_module in paths:
+            with mock.patch.object(library.api_handler, "ijson", ijson_module), \
+                    mock.patch.object(library.json_projection, "simdjson", simdjson_module), \
+                    mock.patch.object(library.json_projection, "orjson", orjson_module):
+                self.assertEqual(expected, self.api.get_proof_records(state="", role=""))
+
+
+if __name__ == "__main__":
+    unittest.main()
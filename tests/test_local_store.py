@@ -0,0 +1,110 @@
+import unittest
+import tempfile
+import sqlite3
+import logging
+import shutil
+import os
+
+from cryptography.fernet import Fernet
+
+from library.api_handler import ApiHandler
+from library.local_store import LocalStore
+
+
+class LocalStoreTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "store.db")
+        self.key = Fernet.generate_key()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        logging.disable(logging.NOTSET)
+
+    def store(self, namespace: str = "http://a:1") -> LocalStore:
+        store = LocalStore(self.path, key=self.key, namespace=namespace)
+        self.addCleanup(store.close)
+        return store
+
+    def fill(self, store: LocalStore) -> None:
+        store.save_connections([{"connection_id": "c1", "alias": "Jan Jansen 123456789", "state": "active"}])
+        store.save_records("c1", {"NAW": {"naam": "Jan"}})
+        store.save_schema_id("naw", "1.0", "A:2:naw:1.0")
+        store.save_credential_definition_id("A:2:naw:1.0", "default", "A:3:CL:1:default")
+
+    def test_namespaces_are_separated(self):
+        self.fill(self.store("http://a:1"))
+        other = self.store("http://b:1")
+        self.assertEqual([], other.get_connections())
+        self.assertEqual({}, other.get_records("c1"))
+        self.assertEqual({}, other.get_schema_ids())
+        self.assertIsNone(other.get_credential_definition_id("A:2:naw:1.0", "default"))
+        other.set_namespace("http://a:1")
+        self.assertEqual(["Jan Jansen 123456789"], other.get_active_connection_aliases())
+        self.assertEqual({("naw", "1.0"): "A:2:naw:1.0"}, other.get_schema_ids())
+
+    def test_clear_only_clears_the_namespace(self):
+        store = self.store("http://a:1")
+        self.fill(store)
+        store.set_namespace("http://b:1")
+        self.fill(store)
+        store.clear()
+        self.assertEqual({}, store.get_schema_ids())
+        store.set_namespace("http://a:1")
+        self.assertEqual({("naw", "1.0"): "A:2:naw:1.0"}, store.get_schema_ids())
+        self.assertEqual({"NAW": {"naam": "Jan"}}, store.get_records("c1"))
+
+    def test_set_url_selects_and_clears_the_namespace(self):
+        store = self.store("")
+        api = ApiHandler("a", 1, store=store)
+        self.assertEqual("http://a:1", store.namespace)
+        self.fill(store)
+        # Testing the same url again keeps the rows
+        api.set_url("a", 1)
+        self.assertEqual({("naw", "1.0"): "A:2:naw:1.0"}, store.get_schema_ids())
+        api.set_url("b", 1)
+        self.assertEqual("http://b:1", store.namespace)
+        self.fill(store)
+        # Selecting a url again clears its rows, the instance might have been reset in the meantime
+        api.set_url("a", 1)
+        self.assertEqual({}, store.get_schema_ids())
+        store.set_namespace("http://b:1")
+        self.assertEqual({("naw", "1.0"): "A:2:naw:1.0"}, store.get_schema_ids())
+
+    def test_key_file_is_kept_apart_from_the_database(self):
+        key_path = os.path.join(self.directory, "config", "store.key")
+        # A key file next to the database (previous versions) is moved
+        legacy_key = Fernet.generate_key()
+        with open(os.path.join(self.directory, "store.key"), "wb") as f:
+            f.write(legacy_key)
+        environment = os.environ.pop("MNNU_STORE_KEY", None)
+        try:
+            store = LocalStore(self.path, key_path=key_path)
+            store.save_schema_id("naw", "1.0", "A:2:naw:1.0")
+            store.close()
+            self.assertFalse(os.path.exists(os.path.join(self.directory, "store.key")))
+            with open(key_path, "rb") as f:
+                self.assertEqual(legacy_key, f.read())
+            store = LocalStore(self.path, key_path=key_path)
+            self.assertEqual({("naw", "1.0"): "A:2:naw:1.0"}, store.get_schema_ids())
+            store.close()
+        finally:
+            if environment is not None:
+                os.environ["MNNU_STORE_KEY"] = environment
+
+    def test_rows_of_an_older_version_are_dropped(self):
+        db = sqlite3.connect(self.path)
+        db.execute("CREATE TABLE schemas (schema_name TEXT NOT NULL, schema_version TEXT NOT NULL, "
+                   "data BLOB NOT NULL, PRIMARY KEY (schema_name, schema_version))")
+        db.execute("INSERT INTO schemas VALUES ('naw', '1.0', 'x')")
+        db.commit()
+        db.close()
+        store = self.store()
+        self.assertEqual({}, store.get_schema_ids())
+        store.save_schema_id("naw", "1.0", "A:2:naw:1.0")
+        self.assertEqual({("naw", "1.0"): "A:2:naw:1.0"}, store.get_schema_ids())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+import logging
+import shutil
+import json
+import os
+
+from library.api_handler import ApiHandler
+from library.offboarding import Offboarding
+from tests.fake_agent import FakeAgent
+
+
+class OffboardingTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.directory = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.directory, "offboarding.journal")
+        self.agent = FakeAgent().start()
+        self.api = ApiHandler(self.agent.host, self.agent.port, max_retries=0)
+        self.conn_ids = [self.agent.state.add_connection(f"Patient {i} Offboarding {100000000 + i}")
+                         for i in range(4)]
+        for conn_id in self.conn_ids:
+            for state in ("verified", "request_sent"):
+                self.agent.state.add_proof_record(conn_id, state=state)
+
+    def tearDown(self):
+        self.agent.stop()
+        shutil.rmtree(self.directory)
+        logging.disable(logging.NOTSET)
+
+    def journal(self) -> list:
+        with open(self.journal_path, "r") as f:
+            return [json.loads(line)["connection_id"] for line in f]
+
+    def offboarding(self) -> Offboarding:
+        return Offboarding(self.api, journal_path=self.journal_path, max_workers=4)
+
+    def test_connections_and_records_are_deleted(self):
+        report = self.offboarding().run(self.conn_ids)
+        for conn_id in self.conn_ids:
+            self.assertEqual({"deleted": True, "records_deleted": 2, "resumed": False, "errors": []}, report[conn_id])
+        self.assertEqual({}, self.agent.state.connections)
+        self.assertEqual({}, self.agent.state.proof_records)
+        self.assertEqual(sorted(self.conn_ids), sorted(self.journal()))
+
+    def test_journaled_connections_are_skipped(self):
+        self.offboarding().run(self.conn_ids[:2])
+        calls = self.agent.state.calls
+        report = self.offboarding().run(self.conn_ids)
+        for conn_id in self.conn_ids[:2]:
+            self.assertEqual({"deleted": True, "records_deleted": 0, "resumed": True, "errors": []}, report[conn_id])
+        for conn_id in self.conn_ids[2:]:
+            self.assertTrue(report[conn_id]["deleted"])
+            self.assertFalse(report[conn_id]["resumed"])
+        # One listing, two record deletions and one connection deletion per remaining patient
+        self.assertEqual(4 * 2, self.agent.state.calls - calls)
+        self.assertEqual(sorted(self.conn_ids), sorted(self.journal()))
+
+    def test_connection_deleted_before_it_was_journaled(self):
+        # The previous run was interrupted after the deletion of the connection, before the journal was written
+        ApiHandler(self.agent.host, self.agent.port, max_retries=0).delete_connection(self.conn_ids[0])
+        report = self.offboarding().run(self.conn_ids[:1])
+        self.assertEqual({"deleted": True, "records_deleted": 0, "resumed": False, "errors": []},
+                         report[self.conn_ids[0]])
+        self.assertEqual(self.conn_ids[:1], self.journal())
+
+    def test_incomplete_journal_line_is_ignored(self):
+        with open(self.journal_path, "w") as f:
+            f.write(json.dumps({"step": "connection", "connection_id": self.conn_ids[0]}) + "\n")
+            f.write('{"step": "connection", "connection_id": "' + self.conn_ids[1][:8])
+        report = self.offboarding().run(self.conn_ids[:2])
+        self.assertTrue(report[self.conn_ids[0]]["resumed"])
+        self.assertFalse(report[self.conn_ids[1]]["resumed"])
+        self.assertTrue(report[self.conn_ids[1]]["deleted"])
+        self.assertNotIn(self.conn_ids[1], self.agent.state.connections)
+        # The first connection was not touched again
+        self.assertIn(self.conn_ids[0], self.agent.state.connections)
+        # The incomplete line is replaced by the entry of the resumed connection
+        self.assertEqual(self.conn_ids[:2], self.journal())
+
+    def test_without_journal(self):
+        report = Offboarding(self.api).run(self.conn_ids[:1])
+        self.assertTrue(report[self.conn_ids[0]]["deleted"])
+        self.assertFalse(os.path.exists(self.journal_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
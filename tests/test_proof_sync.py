@@ -0,0 +1,121 @@
+import unittest
+import logging
+
+import library.api_handler
+from library.api_handler import ApiHandler
+from library.proof_sync import ProofRecordSync
+from tests.fake_agent import FakeAgent
+
+
+def record(pres_ex_id: str, updated_at: str, state: str = "verified") -> dict:
+    return {"presentation_exchange_id": pres_ex_id, "updated_at": updated_at, "state": state}
+
+
+class ProofRecordSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.records = []
+        self.fetches = 0
+        self.parsed = []
+        self.sync = ProofRecordSync(self.fetch, parse=self.parse, matches=lambda r: r["state"] == "verified")
+
+    def fetch(self) -> list:
+        self.fetches += 1
+        return list(self.records)
+
+    def parse(self, r: dict) -> str:
+        self.parsed.append(r["presentation_exchange_id"])
+        return f"{r['presentation_exchange_id']}@{r['updated_at']}"
+
+    def test_first_sync_adds_every_record(self):
+        self.records = [record("a", "1"), record("b", "1")]
+        self.assertEqual({"added": ["a@1", "b@1"], "updated": [], "removed": []}, self.sync.sync())
+        self.assertEqual(["a@1", "b@1"], self.sync.values())
+
+    def test_deltas(self):
+        self.records = [record("a", "1"), record("b", "1")]
+        self.sync.sync()
+        self.parsed.clear()
+        self.records = [record("a", "2"), record("c", "1")]
+        self.assertEqual({"added": ["c@1"], "updated": ["a@2"], "removed": ["b"]}, self.sync.sync())
+        # Only the changed records are parsed
+        self.assertEqual(["a", "c"], self.parsed)
+        self.assertEqual({"added": [], "updated": [], "removed": []}, self.sync.sync())
+
+    def test_older_record_is_ignored(self):
+        self.records = [record("a", "2")]
+        self.sync.sync()
+        self.assertEqual({"added": [], "updated": [], "removed": []}, self.sync.apply_event(record("a", "1")))
+        self.assertEqual(["a@2"], self.sync.values())
+
+    def test_max_age_skips_the_fetch(self):
+        self.sync.sync()
+        self.sync.sync(max_age=60)
+        self.assertEqual(1, self.fetches)
+        self.sync.sync(max_age=0)
+        self.assertEqual(2, self.fetches)
+
+    def test_events(self):
+        self.assertEqual(["a@1"], self.sync.apply_event(record("a", "1"))["added"])
+        # The record no longer matches once its state changes
+        self.assertEqual(["a"], self.sync.apply_event(record("a", "2", state="abandoned"))["removed"])
+        self.assertEqual([], self.sync.values())
+        self.sync.apply_event(record("b", "1"))
+        self.assertTrue(self.sync.remove("b"))
+        self.assertFalse(self.sync.remove("b"))
+
+
+class ProofSyncCacheTest(unittest.TestCase):
+    cache_size = 3
+
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.previous_cache_size = library.api_handler.proof_sync_cache_size
+        library.api_handler.proof_sync_cache_size = self.cache_size
+        self.agent = FakeAgent().start()
+        self.api = ApiHandler(self.agent.host, self.agent.port, max_retries=0)
+        self.conn_ids = [self.agent.state.add_connection(f"Patient {i} Sync {100000000 + i}") for i in range(6)]
+        for conn_id in self.conn_ids:
+            self.agent.state.add_proof_record(conn_id, state="verified", attributes={"voornaam": conn_id})
+
+    def tearDown(self):
+        self.agent.stop()
+        library.api_handler.proof_sync_cache_size = self.previous_cache_size
+        logging.disable(logging.NOTSET)
+
+    def requests(self, call) -> int:
+        calls = self.agent.state.calls
+        call()
+        return self.agent.state.calls - calls
+
+    def test_least_recently_used_engine_is_dropped(self):
+        for conn_id in self.conn_ids[:self.cache_size]:
+            self.assertEqual({"NAW": {"voornaam": conn_id}}, self.api.get_verified_proof_records(conn_id))
+        # Kept engines are not retrieved again within max_age
+        self.assertEqual(0, self.requests(lambda: self.api.get_verified_proof_records(self.conn_ids[0], max_age=60)))
+        # The fourth engine drops the least recently used one (the second patient)
+        self.api.get_verified_proof_records(self.conn_ids[3])
+        self.assertEqual(0, self.requests(lambda: self.api.get_verified_proof_records(self.conn_ids[0], max_age=60)))
+        self.assertEqual(1, self.requests(lambda: self.api.get_verified_proof_records(self.conn_ids[1], max_age=60)))
+
+    def test_dropped_engine_synchronizes_from_scratch(self):
+        first = self.api.sync_proof_records("verified", conn_id=self.conn_ids[0])
+        self.assertEqual(1, len(first["added"]))
+        self.assertEqual([], self.api.sync_proof_records("verified", conn_id=self.conn_ids[0])["added"])
+        for conn_id in self.conn_ids[1:]:
+            self.api.sync_proof_records("verified", conn_id=conn_id)
+        self.assertEqual(first["added"], self.api.sync_proof_records("verified", conn_id=self.conn_ids[0])["added"])
+
+    def test_events_reach_the_kept_engines(self):
+        conn_id = self.conn_ids[0]
+        self.api.get_verified_proof_records(conn_id)
+        pres_ex_id = self.agent.state.add_proof_record(conn_id, state="verified", name="MEDICATIE",
+                                                       attributes={"naam": "paracetamol"})
+        self.api.apply_webhook_event("present_proof", self.agent.state.proof_records[pres_ex_id])
+        self.assertEqual({"NAW": {"voornaam": conn_id}, "MEDICATIE": {"naam": "paracetamol"}},
+                         self.api.get_verified_proof_records(conn_id, max_age=60))
+        self.api.delete_proof_record(pres_ex_id)
+        self.assertEqual({"NAW": {"voornaam": conn_id}}, self.api.get_verified_proof_records(conn_id, max_age=60))
+
+
+if __name__ == "__main__":
+    unittest.main()
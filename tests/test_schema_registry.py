@@ -0,0 +1,77 @@
+import unittest
+import tempfile
+import logging
+import shutil
+import os
+
+from cryptography.fernet import Fernet
+
+from library.api_handler import ApiHandler
+from library.local_store import LocalStore
+from library.schema_registry import SchemaRegistry
+from tests.fake_agent import FakeAgent
+
+schemas = {
+    "NAW": {"schema_name": "naw", "schema_version": "1.0", "attributes": ["naam"]},
+    "BSN": {"schema_name": "bsn", "schema_version": "2.0", "attributes": ["bsn"]},
+}
+
+
+class SchemaRegistryTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.directory = tempfile.mkdtemp()
+        self.key = Fernet.generate_key()
+        self.agent = FakeAgent().start()
+
+    def tearDown(self):
+        self.agent.stop()
+        shutil.rmtree(self.directory)
+        logging.disable(logging.NOTSET)
+
+    def store(self) -> LocalStore:
+        store = LocalStore(os.path.join(self.directory, "store.db"), key=self.key)
+        self.addCleanup(store.close)
+        return store
+
+    def api(self, agent: FakeAgent, store: LocalStore) -> ApiHandler:
+        return ApiHandler(agent.host, agent.port, max_retries=0, store=store)
+
+    def test_missing_schemas_are_created_once(self):
+        store = self.store()
+        registry = SchemaRegistry(self.api(self.agent, store), store)
+        ids = registry.ensure(schemas)
+        self.assertEqual({"NAW": "Fake:2:naw:1.0", "BSN": "Fake:2:bsn:2.0"}, ids)
+        self.assertEqual(sorted(ids.values()), sorted(self.agent.state.schema_ids))
+        # The ids are persisted and the existing schemas are not created again
+        store = self.store()
+        registry = SchemaRegistry(self.api(self.agent, store), store)
+        self.assertEqual("Fake:2:naw:1.0", registry.get_schema_id("naw", "1.0"))
+        self.assertEqual(ids, registry.ensure(schemas))
+        self.assertEqual(2, len(self.agent.state.schema_ids))
+
+    def test_reset_agent_gets_its_schemas(self):
+        store = self.store()
+        SchemaRegistry(self.api(self.agent, store), store).ensure(schemas)
+        # The ACA-Py instance is reset at the same url, the stored ids are outdated
+        self.agent.state.schema_ids.clear()
+        store = self.store()
+        SchemaRegistry(self.api(self.agent, store), store).ensure(schemas)
+        self.assertEqual(["Fake:2:bsn:2.0", "Fake:2:naw:1.0"], sorted(self.agent.state.schema_ids))
+
+    def test_other_agent_gets_its_schemas(self):
+        store = self.store()
+        api = self.api(self.agent, store)
+        registry = SchemaRegistry(api, store)
+        registry.ensure(schemas)
+        # Another ACA-Py instance is selected inside the settings
+        other = FakeAgent().start()
+        self.addCleanup(other.stop)
+        api.set_url(other.host, other.port)
+        self.assertIsNone(registry.get_schema_id("naw", "1.0"))
+        registry.ensure(schemas)
+        self.assertEqual(["Fake:2:bsn:2.0", "Fake:2:naw:1.0"], sorted(other.state.schema_ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import logging
+import time
+
+from library.api_handler import ApiHandler, AgentUnavailableError
+from library.status_monitor import StatusMonitor
+from tests.fake_agent import FakeAgent
+
+reset_timeout = 0.1
+
+
+class StatusMonitorTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.available = True
+        self.probes = 0
+        self.monitor = StatusMonitor(self.probe, ttl=60, failure_threshold=2, reset_timeout=reset_timeout)
+
+    def tearDown(self):
+        self.monitor.reset()
+        logging.disable(logging.NOTSET)
+
+    def probe(self) -> dict:
+        self.probes += 1
+        if not self.available:
+            raise ConnectionError("The agent is down")
+        return {"label": "Fake_Agent"}
+
+    def wait_for(self, state: str) -> None:
+        deadline = time.monotonic() + reset_timeout * 20
+        while self.monitor.state != state and time.monotonic() < deadline:
+            time.sleep(reset_timeout / 10)
+        self.assertEqual(state, self.monitor.state)
+
+    def test_status_is_cached(self):
+        self.assertEqual({"label": "Fake_Agent"}, self.monitor.get_status())
+        self.assertTrue(self.monitor.is_available())
+        self.assertEqual(1, self.probes)
+        self.monitor.get_status(force=True)
+        self.assertEqual(2, self.probes)
+
+    def test_opens_after_the_failure_threshold(self):
+        self.monitor.record_failure()
+        self.assertEqual("closed", self.monitor.state)
+        self.assertTrue(self.monitor.allow_request())
+        # A success resets the consecutive failures
+        self.monitor.record_success()
+        self.monitor.record_failure()
+        self.assertEqual("closed", self.monitor.state)
+        self.monitor.record_failure()
+        self.assertEqual("open", self.monitor.state)
+        self.assertFalse(self.monitor.allow_request())
+        # Fails fast without probing
+        probes = self.probes
+        self.assertFalse(self.monitor.is_available())
+        self.assertEqual(probes, self.probes)
+
+    def test_half_open_probe_closes_the_circuit(self):
+        self.available = False
+        self.monitor.record_failure()
+        self.monitor.record_failure()
+        self.assertEqual("open", self.monitor.state)
+        self.available = True
+        self.wait_for("closed")
+        self.assertTrue(self.monitor.is_available())
+
+    def test_failed_half_open_probe_opens_the_circuit_again(self):
+        self.available = False
+        self.monitor.record_failure()
+        self.monitor.record_failure()
+        # The first probe fails, the circuit opens again and is probed again later
+        deadline = time.monotonic() + reset_timeout * 20
+        while self.probes < 2 and time.monotonic() < deadline:
+            time.sleep(reset_timeout / 10)
+        self.assertGreaterEqual(self.probes, 2)
+        self.assertNotEqual("closed", self.monitor.state)
+        self.available = True
+        self.wait_for("closed")
+
+    def test_reset_closes_the_circuit(self):
+        self.monitor.record_failure()
+        self.monitor.record_failure()
+        self.monitor.reset()
+        self.assertEqual("closed", self.monitor.state)
+        self.assertTrue(self.monitor.allow_request())
+
+
+class ApiHandlerCircuitTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.agent = FakeAgent().start()
+
+    def tearDown(self):
+        self.agent.stop()
+        logging.disable(logging.NOTSET)
+
+    def test_requests_fail_fast_while_the_agent_is_down(self):
+        api = ApiHandler(self.agent.host, self.agent.port, max_retries=0, failure_threshold=2, reset_timeout=60)
+        self.assertTrue(api.test_connection())
+        self.assertEqual("Fake_Agent", api.get_agent_name())
+        self.agent.stop()
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                api.get_connections()
+        self.assertEqual("open", api.get_agent_state())
+        self.assertFalse(api.test_connection())
+        calls = api.metrics.snapshot()["get_connections"]["calls"]
+        with self.assertRaises(AgentUnavailableError):
+            api.get_connections()
+        # No request was sent, the attempt is recorded as unavailable
+        metrics = api.metrics.snapshot()["get_connections"]
+        self.assertEqual(calls + 1, metrics["calls"])
+        self.assertEqual(1, metrics["error_types"][AgentUnavailableError.__name__])
+        # Selecting the url again closes the circuit
+        self.agent = FakeAgent().start()
+        api.set_url(self.agent.host, self.agent.port)
+        self.assertEqual("closed", api.get_agent_state())
+        self.assertEqual({"results": []}, api.get_connections())
+
+
+if __name__ == "__main__":
+    unittest.main()